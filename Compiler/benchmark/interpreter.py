@@ -0,0 +1,113 @@
+'''Instructions per second of every VM engine on example_loop.m-style loops,
+for generic code and for code specialized after type checking.
+
+Run from the Compiler directory:
+    python benchmark/interpreter.py [iterations]
+'''
+
+import sys
+from io import StringIO
+from contextlib import redirect_stdout
+from time import perf_counter
+from typing import Any
+
+sys.path.append('src')
+
+from parser import Parser
+from lexer import Lexer
+from virtual_machine.code_generator import compile
+from virtual_machine.virtual_machine import VirtualMachine, Frame, engines
+from virtual_machine.dispatch import handlers, decode
+
+
+programs = {
+    'for': '''
+        a = 0;
+        v = [1, 2, 3, 4, 5];
+
+        for (i in 1:N) {
+            if (v[i % 5 + 1] == 0)
+                return v[i];
+
+            if (i == N - 1)
+                return a;
+
+            a += i;
+        }
+    ''',
+    'while': '''
+        a = 0;
+        i = 0;
+        v = [1, 2, 3, 4, 5];
+
+        while (i < N) {
+            if (v[i % 5 + 1] == 0)
+                return v[i];
+
+            a += i;
+            i += 1;
+        }
+
+        return a;
+    ''',
+}
+
+
+def build(source: str, typed: bool) -> list[Any]:
+    parser = Parser()
+    parser.parse(Lexer().tokenize(source))
+    parser.root.structurize()
+
+    if typed:
+        with redirect_stdout(StringIO()):
+            parser.root.content.check_types()
+
+    return compile(parser.root)
+
+
+def count_instructions(code: list[Any]) -> int:
+    opcodes, arguments = decode(code)
+    frame = Frame(VirtualMachine(), dict(), code)
+
+    n = len(opcodes)
+    i = 0
+    executed = 0
+
+    while i < n:
+        i = handlers[opcodes[i]](frame, arguments[i], i)
+        executed += 1
+
+    return executed
+
+
+def measure(code: list[Any], engine: str) -> float:
+    vm = VirtualMachine()
+    vm.load(code, engine=engine)
+
+    with redirect_stdout(StringIO()):
+        start = perf_counter()
+        vm.run()
+        
+        return perf_counter() - start
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    for name, source in programs.items():
+        print(f'{name} loop, {iterations} iterations')
+
+        baseline = None
+
+        for variant, typed in (('generic', False), ('typed', True)):
+            code = build(f'N = {iterations};\n' + source, typed)
+            executed = count_instructions(code)
+
+            print(f'  {variant}, {executed} instructions')
+
+            for engine in engines:
+                elapsed = measure(code, engine)
+                rate = executed / elapsed
+                baseline = baseline or elapsed
+
+                print(f'    {engine:<12}{elapsed:8.3f} s {rate / 1e6:8.3f} M instr/s {baseline / elapsed:6.2f}x')
@@ -0,0 +1,81 @@
+'''Seconds per matrix product of the blocked pure-Python kernel and of NumPy,
+for square compact matrices of sizes 1 to 2048, and the number of multiply-adds from which NumPy wins -
+`products.CROSSOVER`. Each product goes through `products.multiply`, buffers handed over & result included.
+Once a kernel took long enough that twice the size would exceed the budget, its larger sizes
+are skipped - the cubic pure-Python kernel cannot do 2048 in any reasonable time.
+
+Run from the Compiler directory:
+    python benchmark/products.py [budget in seconds]
+'''
+
+import sys
+import random
+from array import array
+from time import perf_counter
+from typing import Optional
+
+sys.path.append('src')
+
+import virtual_machine.ndarrays as ndarrays
+import virtual_machine.products as products
+from virtual_machine.compact import Matrix
+
+
+sizes = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048]
+
+crossovers = { 'blocked': float('inf'), 'numpy': 0 }  # forcing either kernel
+
+
+def measure(kernel: str, n: int, typecode: str) -> float:
+    left = Matrix(array(typecode, (random.random() for _ in range(n * n))), (n, n))
+    right = Matrix(array(typecode, (random.random() for _ in range(n * n))), (n, n))
+
+    products.CROSSOVER = crossovers[kernel]
+
+    best = float('inf')
+    spent = 0.0
+
+    while spent < 0.1:  # repeated while small, the best run counts
+        start = perf_counter()
+        products.multiply(left, right)
+        elapsed = perf_counter() - start
+
+        best = min(best, elapsed)
+        spent += elapsed
+
+    return best
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+
+    kernels = ['blocked']
+
+    if ndarrays.available:
+        kernels.append('numpy')
+    else:
+        print('NumPy is not installed, measuring the pure-Python kernel only')
+
+    times: dict[str, dict[int, Optional[float]]] = { kernel: dict() for kernel in kernels }
+
+    print(f'{"n":>6}' + ''.join(f'{kernel:>14}' for kernel in kernels))
+
+    for n in sizes:
+        row = f'{n:>6}'
+
+        for kernel in kernels:
+            previous = times[kernel].get(n // 2, 0.0)
+
+            if previous is None or previous * 8 > budget:  # cubic, twice the size takes 8 times as long
+                times[kernel][n] = None
+                row += f'{"-":>14}'
+                continue
+
+            times[kernel][n] = measure(kernel, n, 'd')
+            row += f'{times[kernel][n]:12.6f} s'
+
+        print(row)
+
+    if ndarrays.available:
+        crossover = next((n for n in sizes if times['blocked'][n] is not None and times['numpy'][n] < times['blocked'][n]), None)
+        print(f'numpy is faster from n = {crossover}, {crossover ** 3} multiply-adds' if crossover else 'numpy is faster at no measured size')
@@ -1,9 +1,22 @@
 from sys import argv
+from typing import Any
 from os.path import abspath
 from lexer import Lexer
 from parser import Parser
 from virtual_machine.code_generator import compile, disassemble
+from virtual_machine.code_object import assemble
+from virtual_machine.optimizer import optimize
+from syntax_tree.passes.folding import fold
+from syntax_tree.passes import inlining
 from virtual_machine.virtual_machine import VirtualMachine
+from virtual_machine import memoization
+import virtual_machine.tiering as tiering
+import virtual_machine.stdlib as std
+from virtual_machine.tracing import EventWriter
+from virtual_machine.profiling import Profile
+from virtual_machine.sampling import Sampler
+from python_backend import lowering
+from ast import unparse
 
 # import syntax_tree._observer.printer
 
@@ -13,7 +26,7 @@ from utilities.colors import ANSII
 def print_error() -> None:
     ansii_red = "\033[91m {}\033[00m"
     error = 'No input specified. '
-    usage = 'Usage: python main.py <path_to source>'
+    usage = 'Usage: python main.py <path_to source> [-O<level>] [--inline=<nodes>] [--memo[=<entries>]] [--arrays=list|compact|numpy] [--backend=vm|python] [--engine=<name>] [--threshold=<back-edges>] [--trace=<path>] [--profile[=<path>]] [--sample[=<ms>]]'
     
     print(ansii_red.format(error), usage, sep='', end='\n')
 
@@ -25,10 +38,72 @@ def read_source(path: str) -> str:
         return file.read()
 
 
+def parse_options(options: list[str]) -> dict[str, Any]:
+    parsed = {
+        'level': 0,
+        'inline': None,
+        'memo': 0,
+        'arrays': 'list',
+        'backend': 'vm',
+        'engine': 'match',
+        'threshold': tiering.THRESHOLD,
+        'trace': None,
+        'profile': None,
+        'sample': None,
+    }
+
+    for option in options:
+        match option:
+            case '-O':
+                parsed['level'] = 1
+
+            case level if level.startswith('-O') and level[2:].isdigit():
+                parsed['level'] = int(level[2:])
+
+            case budget if budget.startswith('--inline=') and budget[9:].isdigit():
+                parsed['inline'] = int(budget[9:])
+
+            case '--memo':
+                parsed['memo'] = memoization.SIZE
+
+            case memo if memo.startswith('--memo=') and memo[7:].isdigit():
+                parsed['memo'] = int(memo[7:])
+
+            case arrays if arrays.startswith('--arrays='):
+                parsed['arrays'] = arrays.removeprefix('--arrays=')
+
+            case backend if backend in ('--backend=vm', '--backend=python'):
+                parsed['backend'] = backend.removeprefix('--backend=')
+
+            case engine if engine.startswith('--engine='):  # match, dispatch, preallocated, threaded or tiered
+                parsed['engine'] = engine.removeprefix('--engine=')
+
+            case threshold if threshold.startswith('--threshold=') and threshold[12:].isdigit():  # of the tiered engine
+                parsed['threshold'] = int(threshold[12:])
+
+            case trace if trace.startswith('--trace='):
+                parsed['trace'] = trace.removeprefix('--trace=')
+
+            case '--profile':
+                parsed['profile'] = ''
+
+            case profile if profile.startswith('--profile='):
+                parsed['profile'] = profile.removeprefix('--profile=')
+
+            case '--sample':
+                parsed['sample'] = 1.0
+
+            case sample if sample.startswith('--sample='):
+                parsed['sample'] = float(sample.removeprefix('--sample='))
+
+    return parsed
+
+
 if __name__ == '__main__':
     match argv:
-        case [_, path, *_]:
+        case [_, path, *options]:
             source = read_source(path)
+            options = parse_options(options)
         case _:
             print_error()
             exit(-1)
@@ -44,17 +119,83 @@ if __name__ == '__main__':
     # print(*parser.root.actions, sep='\n')
 
     parser.root.structurize()
+
+    budget = options['inline']
+
+    if budget is None:  # on by default from -O2
+        budget = inlining.BUDGET if options['level'] >= 2 else 0
+
+    if budget > 0:
+        print(inlining.inline(parser.root, budget), end='\n\n')
+
+    if options['level'] > 0:
+        statistics = fold(parser.root)
+
     parser.root.content.check_types()
     parser.root.display()
+
+    if options['backend'] == 'python':
+        module, functions = lowering.lower(parser.root)
+        print('\n' + unparse(module) + '\n')
+
+        result = lowering.execute(module, functions, filename=path)
+
+        if result is not None:
+            print(f'Process finished with result {result}')
+
+        exit(0)
     
-    code = compile(parser.root)
+    std.use(options['arrays'])
+
+    lines = []
+
+    code, report = optimize(compile(parser.root, lines=lines), options['level'], lines=lines)
+    code = assemble(code, lines)
     
     print('\n' + disassemble(code))
 
-    vm = VirtualMachine()
-    vm.load(code, debug=False)
-    vm.run()
+    if options['level'] > 0:
+        print(f'folded {statistics.folded} expressions, propagated {statistics.propagated} constants')
+        print(report, end='\n\n')
 
-    # print(parser.root.superscopes)
+    vm = VirtualMachine(threshold=options['threshold'], memo_size=options['memo'])
+
+    if options['profile'] is not None:
+        profile = Profile()
+
+        vm.load(code, engine=options['engine'])
+        vm.run(profile=profile)
 
+        print('\n' + disassemble(code, profile))
 
+        if options['profile'] != '':  # <path>.json & <path>.folded for flamegraph tools
+            with open(options['profile'] + '.json', 'w') as file:
+                file.write(profile.to_json())
+
+            with open(options['profile'] + '.folded', 'w') as file:
+                file.write(profile.collapsed())
+
+    elif options['sample'] is not None:  # interval in milliseconds of CPU time
+        vm.load(code, engine=options['engine'])
+
+        with Sampler(options['sample'] / 1000) as sampler:
+            vm.run()
+
+        print('\n' + sampler.report(source))
+
+    elif options['trace'] is None:
+        vm.load(code, engine=options['engine'])
+        vm.run()
+
+    else:
+        with open(options['trace'], 'w') as trace:  # JSON lines, one per event
+            vm.load(code, engine=options['engine'], tracer=EventWriter(trace))
+            vm.run()
+
+    if options['memo'] > 0:
+        print(vm.memo)
+
+    if options['engine'] == 'tiered':
+        print(vm.tiering)
+
+    # print(parser.root.superscopes)
@@ -15,14 +15,15 @@ class Parser(sly.Parser):
 
     precedence = (
         ('right', ASSIGN, PLUS_ASSIGN, MINUS_ASSIGN, TIMES_ASSIGN, DIVIDE_ASSIGN, REMAINDER_ASSIGN),
-        ('nonassoc', ':'),
+        ('nonassoc', RANGE),  # `a:b` before a second ':' is the start of `a:step:b`
+        ('left', ':'),
         ('left', AND, OR, XOR),
         ('left', EQUAL, NOT_EQUAL, GREATER, GREATER_EQUAL, LOWER, LOWER_EQUAL),
         ('left', PLUS, MINUS, DOT_PLUS, DOT_MINUS),
         ('left', TIMES, DIVIDE, REMAINDER, DOT_TIMES, DOT_DIVIDE, DOT_REMAINDER),
         ('right', UMINUS, UNEG),
         ('left', TRANSPOSE),
-        ('left', CALL, SUBSCRIPT),  # may be obsolete, deleting considered
+        ('left', CALL, SUBSCRIPT, '(', '['),  # a call or subscript binds tighter than any operator before it
         ('nonassoc', SHORT_IF),
         ('nonassoc', ELSE)
     )
@@ -117,8 +118,28 @@ class Parser(sly.Parser):
             right=p[2]
         )
 
-    @_('expr ":" expr')
+    @staticmethod
+    def bounds(*bounds: Node) -> None:
+        if any(isinstance(bound, Range) for bound in bounds):  # `a:b:c:d` or `(1:3):10`
+            raise SyntaxError('A range cannot be a bound of another range')
+
+    @_('expr ":" expr ":" expr')  # ahead of `a:b`, sly prefers the earlier rule when `a:(b:c)` competes
     def expr(self, p: Production):
+        Parser.bounds(p[0], p[2], p[4])
+
+        return Range(
+            None,
+            None,
+            start=p[0],
+            end=p[4],
+            interval='step',
+            step=p[2]
+        )
+
+    @_('expr ":" expr %prec RANGE')
+    def expr(self, p: Production):
+        Parser.bounds(p[0], p[2])
+
         return Range(
             None,
             None,
@@ -211,7 +232,10 @@ class Parser(sly.Parser):
 
     @_('vector_list "," vector')
     def vector_list(self, p: Production):
-        return p.vector_list + [p.vector]
+        vectors = p.vector_list
+        vectors.append(p.vector)
+
+        return vectors
 
     @staticmethod
     def homogeneous_shape(vectors: List[Vector]) -> bool:
@@ -291,14 +315,33 @@ class Parser(sly.Parser):
             p.expr_list
         )
     
-    @_('expr "[" expr_list "]" %prec SUBSCRIPT')
+    @_('expr "[" index_list "]" %prec SUBSCRIPT')
     def expr(self, p: Production):
         return Subscription(
             None,
             None,
             p[0],
-            p.expr_list
+            p.index_list
         )
+
+    @_('index_list "," index')
+    def index_list(self, p: Production):
+        node = p.index_list
+        node.elements.append(p[2])  # `p.index` is sly's position of the production
+
+        return node
+
+    @_('index')
+    def index_list(self, p: Production):
+        return ExpressionList([p[0]])
+
+    @_('expr')
+    def index(self, p: Production):
+        return p.expr
+
+    @_('":"')
+    def index(self, p: Production):
+        return Colon(None, range_int32)  # the whole dimension
     
     #= DEFINITIONS =# 
 
@@ -310,23 +353,28 @@ class Parser(sly.Parser):
         
         return block
 
+    @staticmethod
+    def located(node: Node, p: Production) -> Node:
+        node.line = p.lineno  # of the statement's first token
+        return node
+
     # structs etc. belong here
 
     @_('FUNCTION ID "(" expr_list ")" statement')
     def function(self, p: Production):
         body = Parser.ensure_block(p.statement)
         
-        return Function(
+        return Parser.located(Function(
             p.ID,
             p.expr_list,
             body
-        )
+        ), p)
     
     #= STATEMENTS =#
 
     @_('expr ";"')
     def statement(self, p: Production):
-        return p.expr
+        return Parser.located(p.expr, p)
     
     @_('function')
     def statement(self, p: Production):
@@ -338,20 +386,20 @@ class Parser(sly.Parser):
 
     @_(*parenless_calls)
     def statement(self, p: Production):
-        return Call(
+        return Parser.located(Call(
             None,
             None,
             Identifier(p[0], p.lineno, function),
             p.expr_list
-        )
+        ), p)
 
     @_('RETURN expr_list ";"')
     def statement(self, p: Production):
-        return Return(
+        return Parser.located(Return(
             None,
             None,
             p.expr_list
-        )
+        ), p)
     
     loop_control = [
         'BREAK ";"',
@@ -360,10 +408,10 @@ class Parser(sly.Parser):
 
     @_(*loop_control)
     def statement(self, p: Production):
-        return Control(
+        return Parser.located(Control(
             p[0].lower(),
             None
-        )
+        ), p)
 
     assign_statement = [
         'expr ASSIGN expr ";"',
@@ -376,51 +424,51 @@ class Parser(sly.Parser):
 
     @_(*assign_statement)
     def statement(self, p: Production):
-        return Assignment(
+        return Parser.located(Assignment(
             p[1],
             p[0],
             p[2]
-        )
+        ), p)
 
     @_('IF "(" expr ")" statement %prec SHORT_IF')
     def statement(self, p: Production):
         body = Parser.ensure_block(p.statement)
         
-        return If(
+        return Parser.located(If(
             p.expr,
             body,
             Block([])
-        )
+        ), p)
     
     @_('IF "(" expr ")" statement ELSE statement')
     def statement(self, p: Production):
         body = Parser.ensure_block(p[4])
         else_body = Parser.ensure_block(p[6])
 
-        return If(
+        return Parser.located(If(
             p.expr,
             body,
             else_body
-        )
+        ), p)
 
     @_('WHILE "(" expr ")" statement')
     def statement(self, p: Production):
         body = Parser.ensure_block(p.statement)
 
-        return While(
+        return Parser.located(While(
             p.expr,
             body
-        )
+        ), p)
 
     @_('FOR "(" ID IN expr ")" statement')
     def statement(self, p: Production):
         body = Parser.ensure_block(p.statement)
 
-        return For(
+        return Parser.located(For(
             Identifier(p.ID, p.lineno),
             p.expr,
             body
-        )
+        ), p)
     
     @_('"{" statement_series "}"')
     def statement(self, p: Production):
@@ -432,5 +480,8 @@ class Parser(sly.Parser):
     
     @_('statement_series statement')
     def statement_series(self, p: Production):
-        return p.statement_series + [p.statement]
+        series = p.statement_series
+        series.append(p.statement)
+
+        return series
 
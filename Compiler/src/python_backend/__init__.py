@@ -0,0 +1 @@
+from python_backend import lowering
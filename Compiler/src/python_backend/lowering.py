@@ -0,0 +1,392 @@
+import ast
+import builtins
+from typing import Any, Callable
+from functools import singledispatch
+from syntax_tree.structure.nodes import *
+from semantics.types import int32, float64
+import virtual_machine.stdlib as std
+from virtual_machine import specialization
+
+#=
+# Ahead-of-time lowering of a structurized tree to a Python `ast.Module`.
+# The program becomes the body of one function, so its variables are CPython fast locals,
+# and the module goes through the built-in `compile()` instead of the bytecode VM.
+# Semantics follow the VM: subscripts are 1-based and applied last index first,
+# a range used as a value is an iterator, and operators without a plain Python equivalent
+# (broadcasts, the eager `and` & `or`, negation of collections) call `stdlib` itself.
+# Functions of the program become module-level functions, so calls may precede definitions
+# and see none of the program's variables. Builtins are called from `stdlib` as well.
+# =#
+
+ENTRY = '__program'
+
+native_binary: dict[str, ast.operator | ast.cmpop] = {
+    '+': ast.Add(),
+    '-': ast.Sub(),
+    '/': ast.Div(),
+    '%': ast.Mod(),
+    'xor': ast.BitXor(),
+    '==': ast.Eq(),
+    '!=': ast.NotEq(),
+    '<': ast.Lt(),
+    '>': ast.Gt(),
+    '<=': ast.LtE(),
+    '>=': ast.GtE(),
+}
+
+numeric = { int32, float64 }
+
+scalar_binary: dict[str, ast.operator] = {  # native between operands typed as numbers only
+    '*': ast.Mult(),  # of untyped values it may be a matrix product
+}
+
+operators = {
+    'binary': std.binary_ops,
+    'unary': std.unary_ops,
+    'subscript': { 'select': std.select, 'assign': std.assign },  # slices among the indices
+}
+
+
+class Lowering:
+    functions: dict[str, Callable]  # stdlib functions the module calls, by global name
+    names: dict[tuple[str, str], str]  # (arity, operator) -> global name
+    defined: set[str]  # functions of the program
+    temporaries: int
+
+    def __init__(self) -> None:
+        self.functions = dict()
+        self.names = dict()
+        self.defined = set()
+        self.temporaries = 0
+
+    def function(self, arity: str, operator: str) -> ast.Name:
+        if operator not in operators[arity]:
+            raise NotImplementedError(f'Unknown operator {operator}')
+
+        if (arity, operator) not in self.names:
+            name = f'__{arity}_{len(self.functions)}'
+
+            self.names[arity, operator] = name
+            self.functions[name] = operators[arity][operator]
+
+        return ast.Name(self.names[arity, operator], ast.Load())
+
+    def builtin(self, name: str) -> ast.Name:
+        if name not in std.builtins:
+            raise NotImplementedError(f'Unknown function {name}')
+
+        if ('builtin', name) not in self.names:
+            self.names['builtin', name] = f'__builtin_{name}'
+            self.functions[f'__builtin_{name}'] = std.builtins[name]
+
+        return ast.Name(self.names['builtin', name], ast.Load())
+
+    def temporary(self) -> str:
+        name = f'__temporary_{self.temporaries}'
+        self.temporaries += 1
+
+        return name
+
+
+def variable(name: str, context: ast.expr_context = ast.Load()) -> ast.Name:
+    return ast.Name(f'v_{name}', context)  # no clash with Python keywords, builtins & temporaries
+
+
+def function(name: str, parameters: list[str], body: list[ast.stmt]) -> ast.FunctionDef:
+    return ast.FunctionDef(
+        name=name,
+        args=ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(parameter) for parameter in parameters],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[]
+        ),
+        body=body,
+        decorator_list=[],
+    )
+
+
+def lower(node: Program) -> tuple[ast.Module, dict[str, Callable]]:
+    '''Module defining the program as function ENTRY, with the globals it needs.'''
+
+    lowering = Lowering()
+    lowering.defined = { definition.name for definition in definitions(node) }
+
+    defined = [
+        function(
+            f'f_{definition.name}',
+            [variable(argument.name).id for argument in definition.arguments.elements],
+            body(definition.body, lowering)
+        )
+        for definition in definitions(node)
+    ]
+
+    entry = function(ENTRY, [], statements(node.content, lowering) or [ast.Pass()])
+
+    module = ast.fix_missing_locations(ast.Module(body=[*defined, entry], type_ignores=[]))
+
+    return module, lowering.functions
+
+
+def execute(module: ast.Module, functions: dict[str, Callable], *, filename: str = '<program>') -> Any:
+    namespace = dict(functions)
+
+    exec(builtins.compile(module, filename, 'exec'), namespace)
+
+    return namespace[ENTRY]()
+
+
+def run(node: Program, *, filename: str = '<program>') -> Any:
+    return execute(*lower(node), filename=filename)
+
+
+@singledispatch
+def expression(node: Node, lowering: Lowering) -> ast.expr:
+    raise NotImplementedError(f'Not implemented for {node.__class__.__name__}')
+
+
+@expression.register
+def _(node: Identifier, lowering: Lowering) -> ast.expr:
+    return variable(node.name)
+
+
+@expression.register
+def _(node: Expression, lowering: Lowering) -> ast.expr:
+    return ast.Constant(node.value)
+
+
+@expression.register
+def _(node: Vector, lowering: Lowering) -> ast.expr:
+    return ast.List([expression(element, lowering) for element in node.elements], ast.Load())
+
+
+@expression.register
+def _(node: Matrix, lowering: Lowering) -> ast.expr:
+    return ast.List([expression(row, lowering) for row in node.rows], ast.Load())
+
+
+@expression.register
+def _(node: ExpressionList, lowering: Lowering) -> ast.expr:  # happens only in return
+    if len(node.elements) == 1:
+        return expression(node.elements[0], lowering)
+
+    return ast.List([expression(element, lowering) for element in node.elements], ast.Load())
+
+
+@expression.register
+def _(node: UnaryExpression, lowering: Lowering) -> ast.expr:
+    operand = expression(node.operand, lowering)
+
+    match node.operator:
+        case 'not':
+            return ast.UnaryOp(ast.Not(), operand)
+
+        case '-' if getattr(node.operand, 'type', None) in numeric:
+            return ast.UnaryOp(ast.USub(), operand)
+
+    return ast.Call(lowering.function('unary', node.operator), [operand], [])
+
+
+def binary(operator: str, left: ast.expr, right: ast.expr, lowering: Lowering, numbers: bool = False) -> ast.expr:
+    match native_binary.get(operator) or (scalar_binary.get(operator) if numbers else None):
+        case ast.operator() as op:
+            return ast.BinOp(left, op, right)
+
+        case ast.cmpop() as op:
+            return ast.Compare(left, [op], [right])
+
+    return ast.Call(lowering.function('binary', operator), [left, right], [])
+
+
+@expression.register
+def _(node: BinaryExpression, lowering: Lowering) -> ast.expr:
+    numbers = getattr(node.left, 'type', None) in numeric and getattr(node.right, 'type', None) in numeric
+
+    return binary(specialization.operator(node), expression(node.left, lowering), expression(node.right, lowering), lowering, numbers)
+
+
+def bounds(node: Range, lowering: Lowering) -> list[ast.expr]:  # start, end, step
+    step = ast.Constant(1) if node.step is None else expression(node.step, lowering)
+
+    return [expression(node.start, lowering), expression(node.end, lowering), step]
+
+
+def call(name: str, *args: ast.expr) -> ast.Call:
+    return ast.Call(ast.Name(name, ast.Load()), list(args), [])
+
+
+@expression.register
+def _(node: Call, lowering: Lowering) -> ast.expr:
+    arguments = [expression(parameter, lowering) for parameter in node.parameters.elements]
+
+    if node.name in lowering.defined:
+        return call(f'f_{node.name}', *arguments)
+
+    return ast.Call(lowering.builtin(node.name), arguments, [])
+
+
+@expression.register
+def _(node: Range, lowering: Lowering) -> ast.expr:
+    return call('iter', call('range', *bounds(node, lowering)))
+
+
+def index(node: Expression, lowering: Lowering) -> ast.expr:
+    match node:
+        case Colon():
+            return call('slice', ast.Constant(None))
+
+        case Range():  # a slice, not an iterator
+            return call('slice', *bounds(node, lowering))
+
+    return expression(node, lowering)
+
+
+def select(source: ast.expr, indices: list[ast.expr], lowering: Lowering) -> ast.expr:
+    return ast.Call(lowering.function('subscript', 'select'), [source, ast.List(indices, ast.Load())], [])
+
+
+def assign(source: ast.expr, indices: list[ast.expr], value: ast.expr, lowering: Lowering) -> ast.stmt:
+    return ast.Expr(ast.Call(lowering.function('subscript', 'assign'), [source, ast.List(indices, ast.Load()), value], []))
+
+
+def offset(index: ast.expr) -> ast.expr:  # 1-based to 0-based
+    if isinstance(index, ast.Constant) and type(index.value) is int:
+        return ast.Constant(index.value - 1)
+
+    return ast.BinOp(index, ast.Sub(), ast.Constant(1))
+
+
+def subscript(source: ast.expr, indices: list[ast.expr], context: ast.expr_context = ast.Load()) -> ast.expr:
+    # the VM applies the last index first
+    for k, index in enumerate(reversed(indices)):
+        last = k == len(indices) - 1
+        source = ast.Subscript(source, offset(index), context if last else ast.Load())
+
+    return source
+
+
+@expression.register
+def _(node: Subscription, lowering: Lowering) -> ast.expr:
+    source = expression(node.source, lowering)
+    keys = [index(each, lowering) for each in node.indices]
+
+    return select(source, keys, lowering) if node.sliced else subscript(source, keys)
+
+
+@singledispatch
+def statements(node: Node, lowering: Lowering) -> list[ast.stmt]:
+    return [ast.Expr(expression(node, lowering))]
+
+
+@statements.register
+def _(node: Block, lowering: Lowering) -> list[ast.stmt]:
+    return [
+        statement
+        for action in node.actions
+        for statement in statements(action, lowering)
+    ]
+
+
+def body(node: Optional[Block], lowering: Lowering) -> list[ast.stmt]:
+    return (statements(node, lowering) if node is not None else []) or [ast.Pass()]
+
+
+def once(value: ast.expr, prelude: list[ast.stmt], lowering: Lowering) -> ast.expr:
+    '''`value` as an expression free to repeat, evaluated into a temporary if it is not one.'''
+
+    if isinstance(value, (ast.Name, ast.Constant)):
+        return value
+
+    name = lowering.temporary()
+    prelude.append(ast.Assign([ast.Name(name, ast.Store())], value))
+
+    return ast.Name(name, ast.Load())
+
+
+@statements.register
+def _(node: Assignment, lowering: Lowering) -> list[ast.stmt]:
+    operator = node.operator
+    right = expression(node.right, lowering)
+
+    match node.left:
+        case Identifier(name=name) if operator == '=':
+            return [ast.Assign([variable(name, ast.Store())], right)]
+
+        case Identifier(name=name):  # no augmented assignment - `+=` would extend a list in place
+            numbers = specialization.declared_type(node.left) in numeric and getattr(node.right, 'type', None) in numeric
+            value = binary(specialization.compound_operator(node), variable(name), right, lowering, numbers)
+
+            return [ast.Assign([variable(name, ast.Store())], value)]
+
+        case Subscription() as sub if operator == '=':
+            source = expression(sub.source, lowering)
+            keys = [index(each, lowering) for each in sub.indices]
+
+            if sub.sliced:
+                return [assign(source, keys, right, lowering)]
+
+            return [ast.Assign([subscript(source, keys, ast.Store())], right)]
+
+        case Subscription() as sub:  # source & indices are evaluated once, as in the VM
+            prelude = []
+
+            source = once(expression(sub.source, lowering), prelude, lowering)
+            keys = [once(index(each, lowering), prelude, lowering) for each in sub.indices]
+
+            if sub.sliced:
+                value = binary(operator[0], select(source, keys, lowering), right, lowering)
+                return [*prelude, assign(source, keys, value, lowering)]
+
+            value = binary(operator[0], subscript(source, keys), right, lowering)
+
+            return [*prelude, ast.Assign([subscript(source, keys, ast.Store())], value)]
+
+    raise NotImplementedError(f'Cannot assign to {node.left.__class__.__name__}')
+
+
+@statements.register
+def _(node: If, lowering: Lowering) -> list[ast.stmt]:
+    otherwise = statements(node.else_body, lowering) if node.else_body is not None else []
+
+    return [ast.If(expression(node.condition, lowering), body(node.body, lowering), otherwise)]
+
+
+@statements.register
+def _(node: While, lowering: Lowering) -> list[ast.stmt]:
+    return [ast.While(expression(node.condition, lowering), body(node.body, lowering), [])]
+
+
+@statements.register
+def _(node: For, lowering: Lowering) -> list[ast.stmt]:
+    # a range is iterated natively, without materializing the iterator the VM would push
+    iterable = call('range', *bounds(node.range, lowering))\
+        if isinstance(node.range, Range)\
+        else expression(node.range, lowering)
+
+    return [ast.For(variable(node.iterator.name, ast.Store()), iterable, body(node.body, lowering), [])]
+
+
+@statements.register
+def _(node: Control, lowering: Lowering) -> list[ast.stmt]:
+    match node.instruction:
+        case 'break':
+            return [ast.Break()]
+
+        case 'continue':
+            return [ast.Continue()]
+
+    raise NotImplementedError(f'Not implemented for {node.instruction}')
+
+
+@statements.register
+def _(node: Function, lowering: Lowering) -> list[ast.stmt]:
+    return []  # lowered at module level
+
+
+@statements.register
+def _(node: Return, lowering: Lowering) -> list[ast.stmt]:
+    if node.expression is None or len(node.expression.elements) == 0:
+        return [ast.Return(None)]
+
+    return [ast.Return(expression(node.expression, lowering))]
@@ -27,7 +27,7 @@ expressions = {
             (matrix_int32, matrix_int32): matrix_int32,
             (matrix_float64, matrix_float64): matrix_float64,
 
-            (matrix_float64, matrix_int32): matrix_float64,
+            (matrix_int32, matrix_float64): matrix_float64,
             (matrix_float64, matrix_int32): matrix_float64
         },
         '/': {
@@ -208,12 +208,16 @@ expressions = {
         '<': {
             (int32, int32): boolean,
             (float64, float64): boolean,
+            (int32, float64): boolean,
+            (float64, int32): boolean,
             (boolean, boolean): boolean,
             (string, string): boolean,
         },
         '<=': {
             (int32, int32): boolean,
             (float64, float64): boolean,
+            (int32, float64): boolean,
+            (float64, int32): boolean,
             (boolean, boolean): boolean,
             (string, string): boolean,
             (vector_int32, vector_int32): boolean,
@@ -222,12 +226,16 @@ expressions = {
         '>': {
             (int32, int32): boolean,
             (float64, float64): boolean,
+            (int32, float64): boolean,
+            (float64, int32): boolean,
             (boolean, boolean): boolean,
             (string, string): boolean
         },
         '>=': {
             (int32, int32): boolean,
             (float64, float64): boolean,
+            (int32, float64): boolean,
+            (float64, int32): boolean,
             (boolean, boolean): boolean,
             (string, string): boolean
         },
@@ -263,6 +271,9 @@ expressions = {
     'range': {
         'unit': {
             (int32, int32): range_int32
+        },
+        'step': {
+            (int32, int32): range_int32
         }
     }
 }
@@ -0,0 +1 @@
+from syntax_tree.passes import folding, inlining, purity
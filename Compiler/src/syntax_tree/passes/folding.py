@@ -0,0 +1,241 @@
+from typing import Any, Callable, Optional, Sequence
+from dataclasses import dataclass, fields
+from syntax_tree.structure.nodes import *
+from semantics import dispatch
+from semantics.types import Type, Primitive, Collection
+import virtual_machine.stdlib as std
+
+#=
+# Constant folding & propagation over a structurized tree.
+# Operators whose operands are all literals are evaluated at compile time
+# with the very functions the VM would call (`stdlib`), typed with `semantics.dispatch`.
+# Variables assigned exactly once, at the top level of a block, to a scalar literal
+# are substituted into every later read. Both steps repeat until nothing changes.
+# =#
+
+
+@dataclass
+class Statistics:
+    folded: int = 0
+    propagated: int = 0
+
+
+def subtrees(node: Node) -> Sequence[Node]:
+    for field in fields(node):
+        match getattr(node, field.name):
+            case Node() as child:
+                yield child
+
+            case list() as children:
+                yield from (child for child in children if isinstance(child, Node))
+
+
+def rewrite(node: Node, function: Callable[[Node], Node]) -> Node:
+    '''Post-order rewrite: each node is replaced with `function` of itself, children first.'''
+
+    for field in fields(node):
+        match getattr(node, field.name):
+            case Node() as child:
+                setattr(node, field.name, rewrite(child, function))
+
+            case list() as children:
+                for k, child in enumerate(children):
+                    if isinstance(child, Node):
+                        children[k] = rewrite(child, function)
+
+    return function(node)
+
+
+def adopt(node: Node, parent: Optional[Node], owner: Optional[Scope]) -> Node:
+    node.parent = parent
+    node.owner = owner
+    node.structurized = True
+
+    for child in subtrees(node):
+        adopt(child, node, owner)
+
+    return node
+
+
+def literal(node: Node) -> Optional[tuple[Any, Type]]:
+    match node:
+        case Vector():
+            elements = [literal(element) for element in node.elements]
+
+            if len(elements) == 0 or None in elements:
+                return None
+
+            types = { type for _, type in elements }
+            element_type = types.pop()
+
+            if len(types) > 0 or not isinstance(element_type, Primitive):
+                return None
+
+            return [value for value, _ in elements], Collection('vector', element_type)
+
+        case Matrix():
+            rows = [literal(row) for row in node.rows]
+
+            if len(rows) == 0 or None in rows or len({ type for _, type in rows }) != 1:
+                return None
+
+            return [value for value, _ in rows], Collection('matrix', rows[0][1].element_type)
+
+        case Expression() if type(node) is Expression and node.type is not None:
+            return node.value, node.type
+
+    return None
+
+
+def construct(value: Any, type: Type) -> Node:
+    match type:
+        case Collection(name='vector'):
+            return Vector(
+                elements=[Expression(element, type.element_type) for element in value],
+                type=None,
+                length=len(value)
+            )
+
+        case Collection(name='matrix'):
+            rows = [construct(row, Collection('vector', type.element_type)) for row in value]
+
+            return Matrix(None, None, rows, (len(value), len(value[0])))
+
+    return Expression(value, type)
+
+
+def evaluate(node: Node) -> Optional[tuple[Any, Type]]:
+    match node:
+        case BinaryExpression():
+            operands = (literal(node.left), literal(node.right))
+            table = dispatch.expressions['binary']
+            function = std.binary_ops.get(node.operator)
+
+        case UnaryExpression():
+            operands = (literal(node.operand),)
+            table = dispatch.expressions['unary']
+            function = std.unary_ops.get(node.operator)
+
+        case _:
+            return None
+
+    if None in operands or function is None:
+        return None
+
+    result_type = table.get(node.operator, dict()).get(tuple(type for _, type in operands))
+
+    if result_type is None:  # ill-typed, left for the type checker to report
+        return None
+
+    try:
+        return function(*(value for value, _ in operands)), result_type
+    except Exception:  # e.g. division by zero, left for the runtime to report
+        return None
+
+
+def fold_node(statistics: Statistics) -> Callable[[Node], Node]:
+    def fold(node: Node) -> Node:
+        result = evaluate(node)
+
+        if result is None:
+            return node
+
+        statistics.folded += 1
+
+        return adopt(construct(*result), node.parent, node.owner)
+
+    return fold
+
+
+def assignment_counts(node: Node, counts: dict[str, int]) -> dict[str, int]:
+    match node:
+        case Function():
+            return counts
+
+        case Assignment(left=Identifier(name=name)):
+            counts[name] = counts.get(name, 0) + 1
+
+        case Assignment(left=Subscription(source=Identifier(name=name))):
+            counts[name] = counts.get(name, 0) + 2  # written through, never a constant
+
+        case For(iterator=Identifier(name=name)):
+            counts[name] = counts.get(name, 0) + 2
+
+    for child in subtrees(node):
+        assignment_counts(child, counts)
+
+    return counts
+
+
+def substitute(node: Node, constants: dict[str, tuple[Any, Type]], statistics: Statistics) -> None:
+    for field in fields(node):
+        match (node, field.name):
+            case (Assignment(), 'left') | (For(), 'iterator') | (Call(), 'function'):
+                continue
+
+        def replace(child: Any) -> Any:
+            match child:
+                case Identifier(name=name) if name in constants:
+                    statistics.propagated += 1
+                    return adopt(Expression(*constants[name]), node, child.owner)
+
+                case Function():
+                    pass
+
+                case Node():
+                    substitute(child, constants, statistics)
+
+            return child
+
+        match getattr(node, field.name):
+            case list() as children:
+                children[:] = map(replace, children)
+
+            case child:
+                setattr(node, field.name, replace(child))
+
+
+def propagate(block: Block, statistics: Statistics) -> None:
+    counts = assignment_counts(block, dict())
+    constants = dict()
+
+    for action in block.actions:
+        match action:
+            case Function():
+                continue  # a scope of its own, its body is propagated as a block of its own
+
+        substitute(action, constants, statistics)
+
+        match action:
+            case Assignment(operator='=', left=Identifier(name=name)) if counts[name] == 1:
+                value = literal(action.right)
+
+                if value is not None and isinstance(value[1], Primitive):
+                    constants[name] = value
+
+
+def blocks(node: Node) -> Sequence[Block]:
+    match node:
+        case Program():
+            yield node.content
+
+        case Function():
+            yield node.body
+
+    for child in subtrees(node):
+        yield from blocks(child)
+
+
+def fold(root: Node) -> Statistics:
+    statistics = Statistics()
+    previous = None
+
+    while previous != (statistics.folded, statistics.propagated):
+        previous = (statistics.folded, statistics.propagated)
+
+        rewrite(root, fold_node(statistics))
+
+        for block in blocks(root):
+            propagate(block, statistics)
+
+    return statistics
@@ -0,0 +1,279 @@
+from typing import Optional, Sequence
+from dataclasses import dataclass, field, fields
+from syntax_tree.structure.nodes import *
+from syntax_tree.passes.folding import subtrees
+
+#=
+# Inlining of small functions over a structurized tree.
+# A function qualifies if its body is straight-line - assignments followed by a single
+# `return <expression>;` - calls nothing, so it cannot recurse, and is at most `budget` nodes large.
+# At a call site, the arguments are assigned to fresh variables and a renamed copy of the body
+# is placed before the statement containing the call, which is replaced by the returned expression.
+# Every variable of the copy gets a name of its own, defined in the caller's scope the way
+# `structurize` defines any other, so nothing of the caller can be captured or overwritten.
+# A call site qualifies if its arguments call nothing, no call left in place runs before it
+# within its statement - moving the copy ahead would reorder their effects - and it is evaluated
+# exactly once per execution of its statement, so not in the condition of a while loop.
+# A function storing through a subscript into a parameter - or a variable assigned from one -
+# does not qualify, its copy would write into the caller's array ahead of the rest of the statement.
+# =#
+
+BUDGET = 40  # nodes of a function body
+
+
+@dataclass
+class Report:
+    budget: int
+    inlined: dict[str, int] = field(default_factory=dict)  # function -> call sites
+    rejected: dict[str, str] = field(default_factory=dict)  # function -> why it is not inlined
+
+    def __str__(self) -> str:
+        lines = [f'inlining, budget of {self.budget} nodes']
+
+        for name, sites in self.inlined.items():
+            lines.append(f'    {name}: {sites} call site(s)')
+
+        for name, reason in self.rejected.items():
+            lines.append(f'    {name}: not inlined, {reason}')
+
+        return '\n'.join(lines)
+
+
+def size(node: Node) -> int:
+    return 1 + sum(size(child) for child in subtrees(node))
+
+
+def calls(node: Node) -> Sequence[Call]:
+    if isinstance(node, Call):
+        yield node
+
+    for child in subtrees(node):
+        yield from calls(child)
+
+
+def identifiers(node: Node) -> Sequence[Identifier]:
+    if isinstance(node, Identifier):
+        yield node
+
+    for child in subtrees(node):
+        yield from identifiers(child)
+
+
+def recursive(name: str, functions: dict[str, Function]) -> bool:
+    pending = [name]
+    visited = { name }
+
+    while len(pending) > 0:
+        for call in calls(functions[pending.pop()].body):
+            if call.name == name:
+                return True
+
+            if call.name in functions and call.name not in visited:
+                visited.add(call.name)
+                pending.append(call.name)
+
+    return False
+
+
+def straight_line(function: Function) -> bool:
+    match function.body.actions:
+        case [*assignments, Return(expression=ExpressionList(elements=[_]))]:
+            return all(isinstance(action, Assignment) for action in assignments)
+
+    return False
+
+
+def writes_through(function: Function) -> bool:
+    '''Whether the body stores into an element of a parameter or of an alias of one.'''
+
+    aliases = { parameter.name for parameter in function.arguments.elements }
+
+    for action in function.body.actions:
+        match action:
+            case Assignment(left=Subscription(source=Identifier(name=name))) if name in aliases:
+                return True
+
+            case Assignment(left=Identifier(name=name), right=right):
+                if any(identifier.name in aliases for identifier in identifiers(right)):
+                    aliases.add(name)
+                else:
+                    aliases.discard(name)
+
+    return False
+
+
+def rejection(function: Function, functions: dict[str, Function], budget: int) -> Optional[str]:
+    if recursive(function.name, functions):
+        return 'recursive'
+
+    if not straight_line(function):
+        return 'not straight-line'
+
+    if any(True for _ in calls(function.body)):
+        return 'calls other functions'
+
+    if size(function.body) > budget:
+        return f'{size(function.body)} nodes'
+
+    if writes_through(function):
+        return 'writes into a parameter'
+
+    return None
+
+
+def clone(node: Node, names: dict[str, str], line: Optional[int]) -> Node:
+    values = dict()
+
+    for attribute in fields(node):
+        match getattr(node, attribute.name):
+            case Node() as child:
+                values[attribute.name] = clone(child, names, line)
+
+            case list() as children:
+                values[attribute.name] = [
+                    clone(child, names, line) if isinstance(child, Node) else child
+                    for child in children
+                ]
+
+            case value:
+                values[attribute.name] = value
+
+    if isinstance(node, Identifier):
+        values['name'] = names[node.name]
+        values['line'] = line
+
+    copy = type(node)(**values)
+    copy.line = line
+
+    return copy
+
+
+class Inliner:
+    functions: dict[str, Function]  # those that qualify
+    report: Report
+    sites: int
+    called: bool  # a call of the statement visited stays in place
+
+    def __init__(self, functions: dict[str, Function], report: Report) -> None:
+        self.functions = functions
+        self.report = report
+        self.sites = 0
+        self.called = False
+
+    def qualifies(self, call: Call) -> bool:
+        return not self.called\
+            and call.name in self.functions\
+            and len(call.parameters.elements) == len(self.functions[call.name].arguments.elements)\
+            and not any(True for _ in calls(call.parameters))
+
+    def expand(self, call: Call, line: Optional[int]) -> tuple[list[Statement], Expression]:
+        function = self.functions[call.name]
+
+        names = {
+            identifier.name: f'__inline_{self.sites}_{identifier.name}'
+            for identifier in identifiers(function)
+        }
+
+        self.sites += 1
+        self.report.inlined[call.name] = self.report.inlined.get(call.name, 0) + 1
+
+        *assignments, result = function.body.actions
+
+        prologue = [
+            Assignment('=', Identifier(names[parameter.name], line, None), argument)
+            for parameter, argument in zip(function.arguments.elements, call.parameters.elements)
+        ]
+
+        prologue.extend(clone(action, names, line) for action in assignments)
+
+        for statement in prologue:
+            statement.line = line
+
+        return prologue, clone(result.expression.elements[0], names, line)
+
+    def visit(self, node: Node, prologue: list[Statement], line: Optional[int]) -> Node:
+        '''Inlines the calls under `node`, innermost first, their statements go to `prologue`.'''
+
+        def replace(child: Node) -> Node:
+            if isinstance(child, (Block, Function)):  # blocks are visited on their own, statement by statement
+                return child
+
+            replaced = self.visit(child, prologue, line)
+
+            if replaced is not child:
+                replaced.structurize(node, child.owner)
+
+            return replaced
+
+        for attribute in fields(node):
+            match (node, attribute.name):
+                case (While(), 'condition'):
+                    continue
+
+            match getattr(node, attribute.name):
+                case Node() as child:
+                    setattr(node, attribute.name, replace(child))
+
+                case list() as children:
+                    children[:] = [replace(child) if isinstance(child, Node) else child for child in children]
+
+        if not isinstance(node, Call):
+            return node
+
+        if not self.qualifies(node):
+            self.called = True
+            return node
+
+        statements, expression = self.expand(node, line)
+        prologue.extend(statements)
+
+        return expression
+
+    def block(self, block: Block) -> None:
+        k = 0
+
+        while k < len(block.actions):
+            action = block.actions[k]
+            prologue = []
+            self.called = False
+
+            replaced = self.visit(action, prologue, action.line)
+
+            if replaced is action and len(prologue) == 0:
+                k += 1
+                continue
+
+            for statement in [*prologue, replaced]:
+                statement.structurize(block, block.scope)  # defines the fresh variables
+
+            block.actions[k:k + 1] = [*prologue, replaced]  # the copies are visited in turn, they may call too
+
+
+def blocks(node: Node) -> Sequence[Block]:
+    if isinstance(node, Block):
+        yield node
+
+    for child in subtrees(node):
+        yield from blocks(child)
+
+
+def inline(root: Program, budget: int = BUDGET) -> Report:
+    report = Report(budget)
+    functions = { function.name: function for function in definitions(root) }
+
+    qualifying = dict()
+
+    for name, function in functions.items():
+        reason = rejection(function, functions, budget)
+
+        if reason is None:
+            qualifying[name] = function
+        else:
+            report.rejected[name] = reason
+
+    inliner = Inliner(qualifying, report)
+
+    for block in list(blocks(root)):
+        inliner.block(block)
+
+    return report
@@ -0,0 +1,101 @@
+from typing import Sequence
+from syntax_tree.structure.nodes import *
+from syntax_tree.passes.folding import subtrees
+from syntax_tree.passes.inlining import calls
+
+#=
+# Purity analysis of the functions of a structurized tree.
+# A function is pure if its result depends on its arguments only and calling it changes nothing
+# the caller could observe: it assigns no variable outside of its own scopes, writes through
+# a subscription only into vectors it built itself - never into a parameter or an alias of one -
+# and calls pure functions only, so no `print` or other builtin.
+# Calls between functions are resolved as a greatest fixpoint, recursion does not spoil purity.
+# =#
+
+builtins = { 'zeros', 'ones', 'eye' }  # the pure ones
+
+
+def function_scopes(function: Function) -> Sequence[Scope]:
+    yield function.scope
+
+    def scopes(node: Node) -> Sequence[Scope]:
+        if isinstance(node, Function):
+            return
+
+        if node.defines_scope:
+            yield node.scope
+
+        for child in subtrees(node):
+            yield from scopes(child)
+
+    yield from scopes(function.body)
+
+
+def writes(node: Node) -> Sequence[Assignment | For]:
+    if isinstance(node, Function):
+        return
+
+    if isinstance(node, (Assignment, For)):
+        yield node
+
+    for child in subtrees(node):
+        yield from writes(child)
+
+
+def base(node: Expression) -> Expression:
+    while isinstance(node, Subscription):
+        node = node.source
+
+    return node
+
+
+def locally_pure(function: Function) -> bool:
+    '''Pure, calls aside.'''
+
+    local = { identifier.name for scope in function_scopes(function) for identifier in scope.symbols }
+    parameters = { argument.name for argument in function.arguments.elements }
+
+    fresh = dict()  # variable -> every value assigned to it is a vector of its own
+
+    for write in writes(function.body):
+        match write:
+            case Assignment(operator='=', left=Identifier(name=name), right=right):
+                fresh[name] = fresh.get(name, True) and isinstance(right, (Vector, Matrix))
+
+            case Assignment(left=Identifier(name=name)) | For(iterator=Identifier(name=name)):
+                fresh[name] = False
+
+    for write in writes(function.body):
+        match write:
+            case Assignment(left=Identifier(name=name)) | For(iterator=Identifier(name=name)):
+                if name not in local:
+                    return False
+
+            case Assignment(left=Subscription() as target):
+                match base(target):
+                    case Identifier(name=name) if name not in parameters and fresh.get(name, False):
+                        pass
+
+                    case _:
+                        return False
+
+    return True
+
+
+def pure(root: Node) -> set[str]:
+    '''Names of the pure functions defined in the tree.'''
+
+    functions = { function.name: function for function in definitions(root) }
+    candidates = { name for name, function in functions.items() if locally_pure(function) }
+
+    changed = True
+
+    while changed:
+        changed = False
+
+        for name in list(candidates):
+            if any(call.name not in candidates | builtins for call in calls(functions[name].body)):
+                candidates.discard(name)
+                changed = True
+
+    return candidates
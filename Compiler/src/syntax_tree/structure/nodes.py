@@ -41,11 +41,13 @@ class Node:
 #   parent: Optional['Node'] - prototyped at runtime
 #   owner: Optional['Scope']          -//-
 #   structurized: bool                -//-
+#   line: Optional[int]               -//- source line of statements, identifiers keep their own
 
     def __post_init__(self) -> None:
         self.parent: Optional[Node] = None
         self.owner: Optional[Scope] = None
         self.structurized = False
+        self.line: Optional[int] = getattr(self, 'line', None)
 
         if self.defines_scope:
             self.scope = Scope()
@@ -134,7 +136,8 @@ class Block(
 
     def check_types(self) -> None:
         for action in self.actions:
-            action.check_types()
+            if hasattr(action, 'check_types'):  # calls are left to runtime
+                action.check_types()
 
 
 @dataclass
@@ -176,12 +179,13 @@ class Identifier(
         #     print(f'Identifier {self.fancy_repr} is defined in scope {self.scope}')
         #     return
 
-        if self.owner.has_element_before(self):
+        # a symbol not typed yet is the target of the very assignment being checked (`k = k - 1`)
+        if self.owner.has_element_before(self) and self.owner.type(self.name) is not None:
             self.type = self.owner.type(self.name)
             return
 
         for scope in self.superscopes:
-            if scope.has_element_before(self):
+            if scope.has_element_before(self) and scope.type(self.name) is not None:
                 self.type = scope.type(self.name)
                 print(f'Identifier {self.fancy_repr} is defined in scope {scope}')
                 return
@@ -308,13 +312,37 @@ class LogicalExpression(BinaryExpression):
 class Range(
         Expression, 
         metaclass=ObservableNode, 
-        display={ 'recursive': ['start', 'end'] },
+        display={ 'inline': ['interval'], 'recursive': ['start', 'step', 'end'] },
         typecheck={ 'source': ['start', 'end'] },
-        dispatch={ 'key': 'interval', 'table': dispatch.expressions['range'] }  # unit range is default by now
+        dispatch={ 'key': 'interval', 'table': dispatch.expressions['range'] }
 ):
     start: Expression
     end: Expression
-    interval: str = 'unit'
+    interval: Literal['unit', 'step'] = 'unit'
+    step: Optional[Expression] = None
+
+    def typing_hook(self) -> None:
+        if self.step is None:
+            return
+
+        if hasattr(self.step, 'check_types'):  # a literal is typed already
+            self.step.check_types()
+
+        if self.step.type != int32:
+            raise RuntimeError(f'No dispatch available for {self} step & {self.step.type}')
+
+
+@dataclass
+class Colon(
+        Expression, 
+        metaclass=ObservableNode, 
+        display={ 'simple': ['type'] }
+):
+    pass  # a whole dimension, `:` as an index
+
+
+def is_slice(index: Expression) -> bool:
+    return isinstance(index, (Range, Colon))
 
 
 @dataclass
@@ -327,8 +355,40 @@ class Subscription(
     source: Expression
     index: Expression
 
+    @property
+    def indices(self) -> list[Expression]:
+        return self.index.elements\
+            if isinstance(self.index, ExpressionList)\
+            else [self.index]
+
+    @property
+    def sliced(self) -> bool:
+        return any(is_slice(index) for index in self.indices)
+
     def typing_hook(self) -> None:
-        self.type = self.source.type
+        indices = self.indices
+
+        for index in indices:
+            if hasattr(index, 'check_types'):
+                index.check_types()
+
+        dimensions = { 'vector': 1, 'matrix': 2 }
+        kept = sum(is_slice(index) for index in indices)  # dimensions a slice leaves in the result
+
+        match self.source.type:
+            case Collection(name='vector' | 'matrix') as type if len(indices) <= dimensions[type.name]:
+                match dimensions[type.name] - len(indices) + kept:
+                    case 0:
+                        self.type = type.element_type
+
+                    case 1:
+                        self.type = Collection('vector', type.element_type)  # a row, a part of one or a column
+
+                    case _:
+                        self.type = Collection('matrix', type.element_type)
+
+            case type:
+                self.type = type
 
 
 @dataclass
@@ -386,6 +446,12 @@ class If(
     body: Block
     else_body: Optional[Block]
 
+    def typing_hook(self) -> None:
+        self.body.check_types()
+
+        if self.else_body is not None:
+            self.else_body.check_types()
+
 
 @dataclass
 class While(
@@ -397,6 +463,9 @@ class While(
     condition: Expression
     body: Block
 
+    def typing_hook(self) -> None:
+        self.body.check_types()
+
 
 @dataclass
 class For(
@@ -410,6 +479,9 @@ class For(
     range: Expression
     body: Block
 
+    def typing_hook(self) -> None:
+        self.body.check_types()
+
 
 @dataclass
 class Function(
@@ -422,18 +494,56 @@ class Function(
     arguments: ExpressionList
     body: Block
 
+    def structurize(self, parent: Optional['Node'] = None, owner: Optional['Scope'] = None) -> None:
+        for argument in self.arguments.elements:  # parameters are the first symbols of the function's own scope
+            self.scope.define(argument)
+
+        super().structurize(parent, owner)
+
+
+def definitions(node: Node) -> Sequence[Function]:
+    '''Every function defined in the tree, nested ones included - they share a single namespace.'''
+
+    for child in node.children:
+        if child is node.parent:  # children also lists the parent link
+            continue
+
+        if isinstance(child, Function):
+            yield child
+
+        yield from definitions(child)
+
 
 @dataclass
 class Return(
         Statement, 
         metaclass=ObservableNode, 
-        display={ 'recursive': ['value', 'type', 'expression'] },
-        typecheck={ 'source': ['expression'] }
+        display={ 'simple': ['type'], 'recursive': ['expression'] },
+        typecheck={ 'source': [] }
 ):
     value: Any
     type: Type
     expression: Optional[Expression]
 
+    def typing_hook(self) -> None:  # the returned ExpressionList carries no type of its own
+        elements = self.expression.elements\
+            if isinstance(self.expression, ExpressionList)\
+            else [self.expression] if self.expression is not None else []
+
+        for element in elements:
+            if hasattr(element, 'check_types'):
+                element.check_types()
+
+        match elements:
+            case []:
+                self.type = nothing
+
+            case [element]:
+                self.type = element.type
+
+            case _:
+                self.type = None  # several values, untyped as any other unknown
+
 
 @dataclass
 class Control(
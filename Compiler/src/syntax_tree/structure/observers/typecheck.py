@@ -1,5 +1,5 @@
 from typing import Callable, Optional
-from semantics.types import nothing, Type
+from semantics.types import Type
 
 def unique(collection: list[str]) -> list[str]:
     return list(dict.fromkeys(collection))
@@ -57,15 +57,16 @@ def assign_to_children(obj: 'Node', names: list[str], type: str) -> None:
 
 def typecheck_method(source: list[str], sink: list[str], decapsulate: bool) -> Callable[['Node'], None]:
     def check_types(obj: 'Node'):
-        nonlocal source, sink
+        # gathered into fresh lists on every call - the shared ones must not grow
+        # while an outer call of the same class is still iterating them
+        ancessors = [
+            ancessor.typed_fields
+            for ancessor in obj.__class__.__mro__
+            if hasattr(ancessor, 'typed_fields')
+        ]
 
-        for ancessor in obj.__class__.__mro__:
-            if hasattr(ancessor, 'typed_fields'):
-                source.extend(ancessor.typed_fields['source'])
-                sink.extend(ancessor.typed_fields['sink'])
-
-        source = unique(source)
-        sink = unique(sink)
+        source = unique(flatten([fields['source'] for fields in ancessors]))
+        sink = unique(flatten([fields['sink'] for fields in ancessors]))
 
         if len(source) == 0:  # TODO something more general
             if hasattr(obj, 'typing_hook'):  # Invoke hook anyway to provide more customizable behaviour
@@ -78,10 +79,10 @@ def typecheck_method(source: list[str], sink: list[str], decapsulate: bool) -> C
         if hasattr(obj, 'dispatch'):
             type = obj.dispatch(type)
         else:  # TODO error if type has length other than 1 here
-            type = type[0] or nothing
+            type = type[0]  # None stays untyped, e.g. a call's result
         
         if len(sink) > 0:
-            assign_to_children(obj, sink, type.element_type if decapsulate else type)
+            assign_to_children(obj, sink, type.element_type if decapsulate and type is not None else type)
 
         if hasattr(obj, 'type'):
             obj.type = type
@@ -103,6 +104,9 @@ def dispatch_method(key: str, type_table: dict[tuple[Type, ...], Type]) -> Calla
         if types in variants:
             return variants[types]
 
+        if None in types:  # an operand of unknown type, e.g. the result of a call
+            return None
+
         raise RuntimeError(f'No dispatch available for {obj} & {types}')
 
     return dispatch
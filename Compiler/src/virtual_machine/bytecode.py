@@ -1,10 +1,5 @@
 from enum import Enum, auto
 
-class StackMarker(Enum):
-    BEGIN_LOOP = auto()
-    END_LOOP = auto()
-    RETURN = auto()
-
 
 class Operation(Enum):
     PUSH = auto()
@@ -15,29 +10,42 @@ class Operation(Enum):
     STORE_NAME = auto()
     LOAD_NAME = auto()
 
+    STORE_FAST = auto()
+    LOAD_FAST = auto()
+
     JUMP = auto()
     JUMP_IF_FALSE = auto()
     JUMP_TOP = auto()
     JUMP_TOP_IF_FALSE = auto()
 
     RETURN = auto()
+    RETURN_VALUE = auto()
 
+    SETUP_LOOP = auto()
     CLEAR_LOOP = auto()
 
     APPEND = auto()
     LEN = auto()
 
     MAKE_LIST = auto()
+    MAKE_ARRAY = auto()
     MAKE_ITER = auto()
     MAKE_ENUMERATE = auto()
     MAKE_CONST_SEQUENCE = auto()
+    MAKE_SLICE = auto()
 
     ITER_NEXT = auto()
 
+    FOR_RANGE_INIT = auto()
+    FOR_RANGE_STEP = auto()
+
     SUBSCRIPT_WRITE = auto()
     SUBSCRIPT_READ = auto()
+    SLICE_WRITE = auto()
+    SLICE_READ = auto()
 
     CALL = auto()
+    DEFINE_FUNCTION = auto()
 
     SWITCH_CONTEXT = auto()
     DROP_CONTEXT = auto()
@@ -47,6 +55,22 @@ class Operation(Enum):
 
     UNARY_OP = auto()
 
+    BINARY_ADD_INT = auto()
+    BINARY_ADD_FLOAT = auto()
+    BINARY_SUBTRACT_INT = auto()
+    BINARY_SUBTRACT_FLOAT = auto()
+    BINARY_MULTIPLY_INT = auto()
+    BINARY_MULTIPLY_FLOAT = auto()
+    BINARY_DIVIDE_FLOAT = auto()
+    BINARY_MODULO_INT = auto()
+
+    JUMP_UNLESS_LT_INT = auto()
+    JUMP_UNLESS_LE_INT = auto()
+    JUMP_UNLESS_GT_INT = auto()
+    JUMP_UNLESS_GE_INT = auto()
+    JUMP_UNLESS_EQ_INT = auto()
+    JUMP_UNLESS_NE_INT = auto()
+
     INCREMENT = auto()
     DECREMENT = auto()
 
@@ -55,4 +79,71 @@ class Operation(Enum):
 
     def __repr__(self) -> str:
         return self._name_
-    
\ No newline at end of file
+
+
+class Operand(Enum):
+    CONSTANT = auto()  # index into the constant pool
+    NAME = auto()      # index into the name table
+    INTEGER = auto()   # stored verbatim (offsets, jumps, counts)
+
+
+operands: dict[Operation, tuple[Operand, ...]] = {
+    Operation.PUSH: (Operand.CONSTANT,),
+
+    Operation.STORE_NAME: (Operand.NAME,),
+    Operation.LOAD_NAME: (Operand.NAME,),
+
+    Operation.STORE_FAST: (Operand.INTEGER,),
+    Operation.LOAD_FAST: (Operand.INTEGER,),
+
+    Operation.JUMP: (Operand.INTEGER,),
+    Operation.JUMP_IF_FALSE: (Operand.INTEGER,),
+
+    Operation.APPEND: (Operand.INTEGER,),
+    Operation.LEN: (Operand.INTEGER,),
+
+    Operation.MAKE_ARRAY: (Operand.CONSTANT,),
+    Operation.MAKE_CONST_SEQUENCE: (Operand.CONSTANT,),
+    Operation.MAKE_SLICE: (Operand.INTEGER,),  # 3 of start, end & step, 0 of a whole dimension
+
+    Operation.ITER_NEXT: (Operand.INTEGER, Operand.INTEGER),
+
+    Operation.FOR_RANGE_INIT: (Operand.INTEGER, Operand.INTEGER),  # (slot, exit)
+    Operation.FOR_RANGE_STEP: (Operand.INTEGER, Operand.INTEGER),  # (slot, body)
+
+    Operation.SUBSCRIPT_WRITE: (Operand.INTEGER,),
+    Operation.SUBSCRIPT_READ: (Operand.INTEGER,),
+    Operation.SLICE_WRITE: (Operand.INTEGER,),
+    Operation.SLICE_READ: (Operand.INTEGER,),
+
+    Operation.CALL: (Operand.INTEGER,),
+    Operation.DEFINE_FUNCTION: (Operand.CONSTANT,),
+
+    Operation.BINARY_OP: (Operand.CONSTANT,),
+    Operation.UNARY_OP: (Operand.CONSTANT,),
+
+    Operation.PRINT: (Operand.INTEGER,),
+
+    Operation.JUMP_UNLESS_LT_INT: (Operand.INTEGER,),
+    Operation.JUMP_UNLESS_LE_INT: (Operand.INTEGER,),
+    Operation.JUMP_UNLESS_GT_INT: (Operand.INTEGER,),
+    Operation.JUMP_UNLESS_GE_INT: (Operand.INTEGER,),
+    Operation.JUMP_UNLESS_EQ_INT: (Operand.INTEGER,),
+    Operation.JUMP_UNLESS_NE_INT: (Operand.INTEGER,),
+}
+
+
+jump_operands: dict[Operation, int] = {  # position of the relative jump among an instruction's operands
+    Operation.JUMP: 0,
+    Operation.JUMP_IF_FALSE: 0,
+    Operation.ITER_NEXT: 1,
+    Operation.FOR_RANGE_INIT: 1,
+    Operation.FOR_RANGE_STEP: 1,
+
+    Operation.JUMP_UNLESS_LT_INT: 0,
+    Operation.JUMP_UNLESS_LE_INT: 0,
+    Operation.JUMP_UNLESS_GT_INT: 0,
+    Operation.JUMP_UNLESS_GE_INT: 0,
+    Operation.JUMP_UNLESS_EQ_INT: 0,
+    Operation.JUMP_UNLESS_NE_INT: 0,
+}
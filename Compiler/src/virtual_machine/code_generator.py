@@ -1,20 +1,34 @@
-from typing import Callable, Any
-from virtual_machine.bytecode import Operation, StackMarker
+from typing import Callable, Any, Optional
+from virtual_machine.bytecode import Operation
+from virtual_machine.code_object import CodeObject, FunctionCode, Lines, functions
+from virtual_machine.emitter import Emitter, Label
+from virtual_machine.profiling import Profile
+from virtual_machine import slots, specialization
+from syntax_tree.passes.purity import pure
 from syntax_tree.structure.nodes import *
 from functools import singledispatch
-import virtual_machine.stdlib
+import virtual_machine.stdlib as std
 
-class Placeholder:
-    BREAK = 0
-    CONTINUE = 1
+FOLDED = 4096  # elements of the largest constructor result computed at compile time
 
 
-def disassemble(code: list[Operation]) -> str:
+def disassemble(code: list[Operation] | CodeObject, profile: Optional[Profile] = None) -> str:
+    '''With a `profile` of the code, every line starts with its execution count & time.
+    Listings of the functions the code defines follow its own.'''
+
+    defined = functions(code)
+
+    if isinstance(code, CodeObject):
+        code = code.instructions()
+
     line_width = int(len(max(Operation._member_names_, key=len)) * 1.5)
 
     representation = ''
 
-    for command in code:
+    for i, command in enumerate(code):
+        if profile is not None:
+            representation += profile.annotation(i)
+
         match command:
             case (op, *args):
                 name = op.__repr__()
@@ -28,323 +42,416 @@ def disassemble(code: list[Operation]) -> str:
             case op:
                 representation += op.__repr__() + '\n'
 
+    for function in defined:
+        called = profile.functions.get(function.name) if profile is not None else None  # None if never called
+        representation += f'\n{function.__repr__()}\n' + disassemble(function.code, called)
+
     return representation
 
 
+def compile(node: Node, *, dynamic: bool = False, lines: Optional[Lines] = None) -> list[Operation]:
+    '''Variables are addressed by frame slots resolved from the scopes of a structurized tree.
+    With `dynamic` (or for names no scope knows about) they are looked up by name instead.
+    A `lines` list is filled with the source line of every instruction.'''
+
+    emitter = Emitter(None if dynamic else slots.resolve(node))
+    generate(node, emitter)
+
+    if lines is not None:
+        lines[:] = emitter.lines
+
+    return emitter.resolve()
+
+
+def compile_function(node: Function, *, dynamic: bool = False, pure: bool = False) -> FunctionCode:
+    '''The function's own code, its parameters take the first slots.'''
+
+    emitter = Emitter(None if dynamic else slots.resolve(node))
+    emitter.locate(node.line)
+    generate(node.body, emitter)
+
+    names = [argument.name for argument in node.arguments.elements]
+    parameters = names if dynamic else [emitter.slots[name] for name in names]
+    n_locals = 0 if dynamic else len(emitter.slots)
+
+    return FunctionCode(node.name, parameters, emitter.resolve(), emitter.lines, pure, n_locals)
+
+
 @singledispatch
-def compile(node: Node) -> list[Operation]:
+def generate(node: Node, emitter: Emitter) -> None:
     raise NotImplementedError(f'Not implemented for {node.__class__.__name__}')
 
 
-@compile.register
-def _(node: Program) -> list[Operation]:
-    return compile(node.content)
+@generate.register
+def _(node: Program, emitter: Emitter) -> None:
+    proven = pure(node)
 
+    for function in definitions(node):  # hoisted, a call may precede the definition
+        code = compile_function(function, dynamic=emitter.slots is None, pure=function.name in proven)
+        emitter.emit(Operation.DEFINE_FUNCTION, code)
 
-@compile.register
-def _(node: Block) -> list[Operation]:
-    return sum((compile(action) for action in node.actions), start=[])
+    generate(node.content, emitter)
 
 
-@compile.register
-def _(node: Identifier) -> list[Operation]:
-    return [
-        (Operation.LOAD_NAME, node.name)
-    ]
+@generate.register
+def _(node: Block, emitter: Emitter) -> None:
+    for action in node.actions:
+        emitter.locate(action.line)
+        generate(action, emitter)
 
+        if isinstance(action, Expression):  # a value nobody uses, calls for their effect
+            emitter.emit(Operation.POP)
 
-@compile.register
-def _(node: Expression) -> list[Operation]:
-    return [
-        (Operation.PUSH, node.value)
-    ]
 
+@generate.register
+def _(node: Function, emitter: Emitter) -> None:
+    pass  # compiled on its own, defined at the start of the program
 
-@compile.register
-def _(node: Vector) -> list[Operation]:
-    operations = [
-        [(Operation.PUSH, element.value),
-        (Operation.APPEND, -2)]
-        for element in node.elements
-    ]
-    
-    return sum(operations, start=[Operation.MAKE_LIST])
 
+@generate.register
+def _(node: Identifier, emitter: Emitter) -> None:
+    emitter.load(node.name)
 
-@compile.register
-def _(node: Matrix) -> list[Operation]:
-    vectors = map(
-        lambda vec: compile(vec) + [(Operation.APPEND, -2)], 
-        node.rows
-    )
 
-    return sum(vectors, start=[Operation.MAKE_LIST])
+@generate.register
+def _(node: Expression, emitter: Emitter) -> None:
+    emitter.emit(Operation.PUSH, node.value)
 
 
-@compile.register
-def _(node: UnaryExpression):
-    return [
-        (Operation.LOAD_NAME, node.operand.name),
-        (Operation.UNARY_OP, node.operator)
-    ]
+def element_type(node: Vector | Matrix) -> Optional[str]:  # None until the types are checked
+    return node.element_type.name if isinstance(node.element_type, Type) else None
 
 
-@compile.register
-def _(node: BinaryExpression) -> list[Operation]:
-    return [
-        *compile(node.left),
-        *compile(node.right),
-        (Operation.BINARY_OP, node.operator)
-    ]
+def elements(node: Vector, emitter: Emitter) -> None:
+    emitter.emit(Operation.MAKE_LIST)
 
+    for element in node.elements:
+        generate(element, emitter)
+        emitter.emit(Operation.APPEND, -2)
 
-@compile.register
-def _(node: Range) -> list[Operation]:
-    return [
-        (Operation.PUSH, lambda n: n),
-        *compile(node.start),
-        *compile(node.end),
-        Operation.MAKE_ITER
-    ]
 
+@generate.register
+def _(node: Vector, emitter: Emitter) -> None:
+    elements(node, emitter)
+    emitter.emit(Operation.MAKE_ARRAY, element_type(node))
 
-@compile.register
-def _(node: Subscription) -> list[Operation]:
-    if not isinstance(node.index, ExpressionList):
-        return [
-            *compile(node.source),
-            *compile(node.index),
-            (Operation.SUBSCRIPT_READ, 1)
-        ]
-    
-    indices = [compile(e) for e in node.index.elements]
-    n = len(indices)
-
-    indices = sum(indices, start=[])
-
-    return [
-        *compile(node.source),
-        *indices,
-        (Operation.SUBSCRIPT_READ, n)
-    ]
+
+@generate.register
+def _(node: Matrix, emitter: Emitter) -> None:
+    emitter.emit(Operation.MAKE_LIST)
+
+    for row in node.rows:  # converted as a whole, not row by row
+        elements(row, emitter)
+        emitter.emit(Operation.APPEND, -2)
+
+    emitter.emit(Operation.MAKE_ARRAY, element_type(node))
+
+
+@generate.register
+def _(node: UnaryExpression, emitter: Emitter) -> None:
+    generate(node.operand, emitter)
+    emitter.emit(Operation.UNARY_OP, node.operator)
+
+
+@generate.register
+def _(node: BinaryExpression, emitter: Emitter) -> None:
+    generate(node.left, emitter)
+    generate(node.right, emitter)
+
+    match specialization.binary(node):
+        case None:
+            emitter.emit(Operation.BINARY_OP, specialization.operator(node))
+
+        case op:
+            emitter.emit(op)
+
+
+def branch_unless(condition: Expression, target: Label, emitter: Emitter) -> None:
+    op = specialization.compare_and_jump(condition)
+
+    if op is None:
+        generate(condition, emitter)
+        emitter.emit(Operation.JUMP_IF_FALSE, target)
+        return
+
+    generate(condition.left, emitter)
+    generate(condition.right, emitter)
+    emitter.emit(op, target)
+
+
+def bounds(node: Range, emitter: Emitter) -> None:  # start, end, step
+    generate(node.start, emitter)
+    generate(node.end, emitter)
+
+    if node.step is None:
+        emitter.emit(Operation.PUSH, 1)
+    else:
+        generate(node.step, emitter)
+
+
+@generate.register
+def _(node: Range, emitter: Emitter) -> None:
+    bounds(node, emitter)
+    emitter.emit(Operation.MAKE_ENUMERATE)
+
+
+def index(node: Expression, emitter: Emitter) -> None:
+    match node:
+        case Colon():
+            emitter.emit(Operation.MAKE_SLICE, 0)
+
+        case Range():  # a slice, not an iterator
+            bounds(node, emitter)
+            emitter.emit(Operation.MAKE_SLICE, 3)
+
+        case _:
+            generate(node, emitter)
+
+
+def accessors(node: Subscription) -> tuple[Operation, Operation]:  # (read, write)
+    if node.sliced:
+        return Operation.SLICE_READ, Operation.SLICE_WRITE
+
+    return Operation.SUBSCRIPT_READ, Operation.SUBSCRIPT_WRITE
+
+
+@generate.register
+def _(node: Subscription, emitter: Emitter) -> None:
+    generate(node.source, emitter)
+
+    for each in node.indices:
+        index(each, emitter)
+
+    emitter.emit(accessors(node)[0], len(node.indices))
 
 
-@compile.register
-def _(node: Call) -> list[Operation]:
-    args = sum((compile(p) for p in node.parameters.elements), start=[])
-    
-    return [
-        *args,
-        (Operation.PUSH, node.name),
-        (Operation.CALL, len(args))
+def constructed(node: Call, emitter: Emitter) -> Optional[Any]:
+    '''Result of a constructor called with constant arguments, if the representation lets it be shared.'''
+
+    if node.name not in std.constructors:  # keywords, no function of the program takes their names
+        return None
+
+    if not std.representations[std.representation].shares:
+        return None
+
+    arguments = [
+        parameter.value
+        for parameter in node.parameters.elements
+        if type(parameter) is Expression and type(parameter.value) is int and parameter.value >= 0
     ]
 
+    if len(arguments) == 0 or len(arguments) != len(node.parameters.elements):
+        return None
+
+    if arguments[0] * arguments[-1] > FOLDED:  # rows * columns, n * n of a square one
+        return None
+
+    try:
+        return std.builtins[node.name](*arguments)
+    except TypeError:  # wrong arity, left to fail at run time
+        return None
+
+
+@generate.register
+def _(node: Call, emitter: Emitter) -> None:
+    value = constructed(node, emitter)
 
-@compile.register
-def _(node: Assignment) -> list[Operation]:
+    if value is not None:  # every execution gets a copy-on-write handle of the constant
+        emitter.emit(Operation.PUSH, value)
+        emitter.emit(Operation.MAKE_ARRAY, None)
+        return
+
+    for parameter in node.parameters.elements:
+        generate(parameter, emitter)
+
+    emitter.emit(Operation.PUSH, node.name)
+    emitter.emit(Operation.CALL, len(node.parameters.elements))
+
+
+@generate.register
+def _(node: Assignment, emitter: Emitter) -> None:
     operator = node.operator
 
     match node.left:
+        case sub if isinstance(sub, Subscription) and operator == '=':
+            generate(sub.source, emitter)
+
+            for each in sub.indices:
+                index(each, emitter)
+
+            generate(node.right, emitter)
+            emitter.emit(accessors(sub)[1], len(sub.indices))
+
         case sub if isinstance(sub, Subscription):
-            if isinstance(sub.index, ExpressionList):
-                n_indices = len(sub.index.elements)
-                indices = sum((
-                    compile(element)
-                    for element in sub.index.elements
-                ), start=[])
-
-            else:
-                n_indices = 1
-                indices = compile(sub.index)
-
-            if operator == '=':
-                return [
-                    *compile(sub.source),
-                    *indices,
-                    *compile(node.right),
-                    (Operation.SUBSCRIPT_WRITE, n_indices)
-                ]
-            
             names = [
-                f'__local_index_{i}'
-                for i in range(n_indices)
-            ]
-            
-            store_indices = sum((
-                [compute, 
-                (Operation.STORE_NAME, name)]
-                for compute, name in zip(indices, names)
-            ), start=[])
-
-            load_indices = [
-                (Operation.LOAD_NAME, name)
-                for name in reversed(names)
-            ]
-            
-            return [
-                *compile(sub.source),
-                *store_indices,
-                *load_indices,
-                (Operation.SUBSCRIPT_READ, n_indices),
-                *compile(node.right),
-                (Operation.BINARY_OP, operator[0]),
-                (Operation.STORE_NAME, '__local_element'),
-                *load_indices,
-                (Operation.LOAD_NAME, '__local_element'),
-                (Operation.SUBSCRIPT_WRITE, n_indices)
+                emitter.temporary('__local_index')
+                for _ in sub.indices
             ]
 
+            element = emitter.temporary('__local_element')
+
+            generate(sub.source, emitter)
+            emitter.emit(Operation.CLONE)
+
+            read, write = accessors(sub)
+
+            for each, name in zip(sub.indices, names):
+                index(each, emitter)
+                emitter.store(name)
+
+            for name in names:
+                emitter.load(name)
+
+            emitter.emit(read, len(names))
+            generate(node.right, emitter)
+            emitter.emit(Operation.BINARY_OP, operator[0])
+            emitter.store(element)
+
+            for name in names:
+                emitter.load(name)
+
+            emitter.load(element)
+            emitter.emit(write, len(names))
+
         case id if isinstance(id, Identifier) and operator == '=':
-            return [
-                *compile(node.right),
-                (Operation.STORE_NAME, id.name)
-            ]
+            generate(node.right, emitter)
+            emitter.store(id.name)
 
         case id if isinstance(id, Identifier):
-            return [
-                (Operation.LOAD_NAME, id.name),
-                *compile(node.right),
-                (Operation.BINARY_OP, operator[0]),
-                (Operation.STORE_NAME, id.name),
-            ]
+            emitter.load(id.name)
+            generate(node.right, emitter)
 
+            match specialization.compound(node):
+                case None:
+                    emitter.emit(Operation.BINARY_OP, specialization.compound_operator(node))
 
-@compile.register
-def _(node: If) -> list[Operation]:
-    true_block = compile(node.body)
-    false_block = []\
-        if node.else_body is None\
-        else compile(node.else_body)
+                case op:
+                    emitter.emit(op)
 
-    return [
-        *compile(node.condition),
-        (Operation.JUMP_IF_FALSE, len(true_block) + 1),
-        *true_block,
-        *false_block
-    ]
+            emitter.store(id.name)
+
+
+@generate.register
+def _(node: If, emitter: Emitter) -> None:
+    has_else = node.else_body is not None and len(node.else_body.actions) > 0
+
+    otherwise = emitter.label()
+    end = emitter.label()
+
+    branch_unless(node.condition, otherwise, emitter)
+
+    generate(node.body, emitter)
+
+    if has_else:
+        emitter.emit(Operation.JUMP, end)
 
+    emitter.mark(otherwise)
 
-@compile.register
-def _(node: Control) -> list[Operation]:
+    if has_else:
+        generate(node.else_body, emitter)
+
+    emitter.mark(end)
+
+
+@generate.register
+def _(node: Control, emitter: Emitter) -> None:
     match node.instruction:
         case 'break':
-            return [(Operation.JUMP, Placeholder.BREAK)]
+            emitter.emit(Operation.JUMP, emitter.loop.exit)
 
         case 'continue':
-            return [(Operation.JUMP, Placeholder.CONTINUE)]
+            emitter.emit(Operation.JUMP, emitter.loop.next)
         
 
-@compile.register
-def _(node: ExpressionList) -> list[Operation]:  # happens only in return
+@generate.register
+def _(node: ExpressionList, emitter: Emitter) -> None:  # happens only in return
     if len(node.elements) == 1:
-        return compile(node.elements[0])
+        generate(node.elements[0], emitter)
+        return
 
-    code = [Operation.MAKE_LIST]
+    emitter.emit(Operation.MAKE_LIST)
 
     for element in node.elements:
-        code.extend(compile(element))
-        code.append((Operation.APPEND, -2))
-
-    return code
+        generate(element, emitter)
+        emitter.emit(Operation.APPEND, -2)
 
         
-@compile.register
-def _(node: Return) -> list[Operation]:
-    if node.expression is None:
-        return [Operation.RETURN]
-
-    return [
-        *compile(node.expression),
-        (Operation.PUSH, StackMarker.RETURN),
-        Operation.RETURN
-    ]
+@generate.register
+def _(node: Return, emitter: Emitter) -> None:
+    if node.expression is None or len(node.expression.elements) == 0:
+        emitter.emit(Operation.RETURN)
+        return
 
+    generate(node.expression, emitter)
+    emitter.emit(Operation.RETURN_VALUE)
 
-@compile.register
-def _(node: While) -> list[Operation]:
-    condition = compile(node.condition)
-    body = compile(node.body)
-
-    condition_jump = len(condition) + 1
-    backward_jump = condition_jump + len(body)
-
-    body.append((Operation.JUMP, -backward_jump))
-    end = len(body)
-    
-    for i, element in enumerate(body): 
-        match element:
-            case (Operation.JUMP, Placeholder.BREAK):
-                body[i] = (Operation.JUMP, end - i)
-
-            case (Operation.JUMP, Placeholder.CONTINUE):
-                body[i] = (Operation.JUMP, -(i + condition_jump))
-
-    return [
-        (Operation.PUSH, StackMarker.BEGIN_LOOP),
-        *condition,
-        (Operation.JUMP_IF_FALSE, end),
-        *body,
-        (Operation.PUSH, StackMarker.END_LOOP),
-        Operation.CLEAR_LOOP
-    ]
 
-# BEGIN_LOOP
-# 1. condition
-# 2
-# 3
-# 4 value lays on stack
-# JUMP_IF_FALSE
-# 1. body
-# 2
-# 3 continue (i = 2)
-# 4 break (i = 3)
-# 5
-# 6 JUMP_BACK
-# END_LOOP
-
-@compile.register
-def _(node: Range) -> list[Operation]:
-    start = compile(node.start)
-    stop = compile(node.end)
-
-    return [
-        *start,
-        *stop,
-        Operation.MAKE_ENUMERATE
-    ]
+@generate.register
+def _(node: While, emitter: Emitter) -> None:
+    condition = emitter.label()
+    exit = emitter.label()
 
+    emitter.mark(condition)
+    branch_unless(node.condition, exit, emitter)
 
-@compile.register
-def _(node: For) -> list[Operation]:
-    range = compile(node.range)
-    body = compile(node.body)
+    emitter.enter_loop(exit, condition)
+    generate(node.body, emitter)
+    emitter.exit_loop()
 
-    n = len(body)
+    emitter.locate(node.line)  # the back-edge belongs to the loop, not its last statement
+    emitter.emit(Operation.JUMP, condition)
 
-    body = [
-        (Operation.ITER_NEXT, -1, n + 3),
-        (Operation.STORE_NAME, node.iterator.name),       
-        *body,
-        (Operation.JUMP, -(n + 2)),
-    ]
+    emitter.mark(exit)
 
-    n += 3
 
-    for i, element in enumerate(body): 
-        match element:
-            case (Operation.JUMP, Placeholder.BREAK):
-                body[i] = (Operation.JUMP, n - i)
+@generate.register
+def _(node: For, emitter: Emitter) -> None:
+    if isinstance(node.range, Range):
+        counted_loop(node, emitter)
+        return
 
-            case (Operation.JUMP, Placeholder.CONTINUE):
-                body[i] = (Operation.JUMP, -i)
+    next = emitter.label()
+    exit = emitter.label()
 
-    return [
-        (Operation.PUSH, StackMarker.BEGIN_LOOP),
-        *range,
-        *body,
-        (Operation.PUSH, StackMarker.END_LOOP),
-        Operation.CLEAR_LOOP
-    ]
+    emitter.emit(Operation.SETUP_LOOP)  # the iterator stays on the stack until the exit
+    generate(node.range, emitter)
+
+    emitter.mark(next)
+    emitter.emit(Operation.ITER_NEXT, -1, exit)
+    emitter.store(node.iterator.name)
+
+    emitter.enter_loop(exit, next)
+    generate(node.body, emitter)
+    emitter.exit_loop()
+
+    emitter.locate(node.line)
+    emitter.emit(Operation.JUMP, next)
+
+    emitter.mark(exit)
+    emitter.emit(Operation.CLEAR_LOOP)
+
+
+def counted_loop(node: For, emitter: Emitter) -> None:
+    # the counter lives in a range iterator held by a reserved slot - advancing it natively
+    # beats slot arithmetic, and the loop variable may be reassigned in the body freely
+    register = emitter.register()
+
+    body = emitter.label()
+    next = emitter.label()
+    exit = emitter.label()
+
+    bounds(node.range, emitter)
+    emitter.emit(Operation.FOR_RANGE_INIT, register, exit)
+
+    emitter.mark(body)
+    emitter.store(node.iterator.name)
 
+    emitter.enter_loop(exit, next)
+    generate(node.body, emitter)
+    emitter.exit_loop()
 
+    emitter.mark(next)
+    emitter.locate(node.line)
+    emitter.emit(Operation.FOR_RANGE_STEP, register, body)
 
+    emitter.mark(exit)
@@ -0,0 +1,264 @@
+from typing import Any, Hashable, Optional
+from dataclasses import dataclass, field, replace
+from array import array
+from sys import intern
+from bisect import bisect_right
+from virtual_machine.bytecode import Operation, Operand, operands
+from virtual_machine.verifier import analyze
+
+#=
+# Compact executable form of the code list produced by `compile`.
+# Every instruction is an opcode word followed by its operand words (see `bytecode.operands`),
+# all packed into a single array('i'). Constants and names live in side tables,
+# operands only hold indices into them.
+# Jump deltas are kept in instructions, not words, so they survive the round trip unchanged.
+# Code is verified when assembled, its maximum stack depth is kept along.
+# Source lines are kept as a table of instruction ranges, in the manner of CPython's `co_lines`.
+# A function is code of its own, a `FunctionCode` constant of DEFINE_FUNCTION - assembling
+# a program assembles the functions it defines along.
+# =#
+
+Lines = list[Optional[int]]  # source line of every instruction, None where unknown
+LineTable = list[tuple[int, int, Optional[int]]]  # (start, end, line) - instructions start..end-1 stem from line
+
+kinds: list[tuple[Operand, ...]] = [()] * (max(op.value for op in Operation) + 1)
+
+for op, signature in operands.items():
+    kinds[op.value] = signature
+
+
+local_operations = { Operation.LOAD_FAST, Operation.STORE_FAST, Operation.FOR_RANGE_INIT, Operation.FOR_RANGE_STEP }
+
+
+def constant_key(value: Any) -> Hashable:
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), id(value))
+
+    if type(value) is float:
+        return (float, repr(value))  # 0.0 == -0.0, their representations differ
+
+    return (type(value), value)  # keeps 1, 1.0 and True apart
+
+
+@dataclass
+class CodeObject:
+    code: array = field(default_factory=lambda: array('i'))
+    constants: list[Any] = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+    length: int = 0  # number of instructions
+    n_locals: int = 0  # frame slots addressed by LOAD_FAST/STORE_FAST
+    stack_size: int = 0  # maximum operand stack depth
+    lines: LineTable = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def line(self, i: int) -> Optional[int]:
+        return line_at(self.lines, i)
+
+    def decode(self) -> tuple[list[int], list[Any]]:
+        tables = {
+            Operand.CONSTANT: self.constants,
+            Operand.NAME: self.names,
+            Operand.INTEGER: None,
+        }
+
+        resolvers = [  # per opcode: the table every operand word indexes into, None if verbatim
+            tuple(tables[kind] for kind in signature)
+            for signature in kinds
+        ]
+
+        words = self.code
+        opcodes = []
+        arguments = []
+
+        n = len(words)
+        w = 0
+
+        while w < n:
+            opcode = words[w]
+            resolver = resolvers[opcode]
+            w += 1
+
+            match len(resolver):
+                case 0:
+                    argument = None
+
+                case 1:
+                    table = resolver[0]
+                    argument = words[w] if table is None else table[words[w]]
+                    w += 1
+
+                case arity:
+                    argument = tuple(
+                        words[w + k] if table is None else table[words[w + k]]
+                        for k, table in enumerate(resolver)
+                    )
+                    w += arity
+
+            opcodes.append(opcode)
+            arguments.append(argument)
+
+        return opcodes, arguments
+
+    def instructions(self) -> list[Any]:
+        code = []
+
+        for opcode, argument in zip(*self.decode()):
+            op = Operation(opcode)
+
+            match len(kinds[opcode]):
+                case 0:
+                    code.append(op)
+
+                case 1:
+                    code.append((op, argument))
+
+                case _:
+                    code.append((op, *argument))
+
+        return code
+
+
+def line_table(lines: Lines) -> LineTable:
+    table = []
+
+    for i, line in enumerate(lines):
+        if len(table) > 0 and table[-1][2] == line:
+            table[-1] = (table[-1][0], i + 1, line)
+        else:
+            table.append((i, i + 1, line))
+
+    return table
+
+
+def line_at(table: LineTable, i: int) -> Optional[int]:
+    k = bisect_right(table, i, key=lambda entry: entry[0]) - 1
+
+    if k < 0 or i >= table[k][1]:
+        return None
+
+    return table[k][2]
+
+
+def frame_size(code: list[Any] | CodeObject) -> int:
+    if isinstance(code, CodeObject):
+        return code.n_locals
+
+    return max((
+        command[1] + 1
+        for command in code
+        if isinstance(command, tuple) and command[0] in local_operations
+    ), default=0)
+
+
+@dataclass
+class FunctionCode:
+    name: str
+    parameters: list[int | str]  # slot of every parameter in order, its name in dynamic code
+    code: list[Any] | CodeObject
+    lines: Optional[Lines] = None  # of a code list, a CodeObject holds its own table
+    pure: bool = False  # its calls may be memoized
+    n_locals: int = 0  # slots of the frame, parameters the body never reads included
+
+    def __repr__(self) -> str:
+        return f'<{"pure " if self.pure else ""}function {self.name}/{len(self.parameters)}>'
+
+
+def functions(code: list[Any] | CodeObject) -> list[FunctionCode]:
+    '''Functions the code defines.'''
+
+    if isinstance(code, CodeObject):
+        return [value for value in code.constants if isinstance(value, FunctionCode)]
+
+    return [
+        command[1] for command in code
+        if isinstance(command, tuple) and command[0] == Operation.DEFINE_FUNCTION
+    ]
+
+
+def stack_size(code: list[Any] | CodeObject) -> int:
+    if isinstance(code, CodeObject):
+        return code.stack_size
+
+    return analyze(code)
+
+
+class Assembler:
+    code_object: CodeObject
+    constant_indices: dict[Hashable, int]
+    name_indices: dict[str, int]
+
+    def __init__(self) -> None:
+        self.code_object = CodeObject()
+        self.constant_indices = dict()
+        self.name_indices = dict()
+
+    def constant(self, value: Any) -> int:
+        key = constant_key(value)
+
+        if key not in self.constant_indices:
+            self.constant_indices[key] = len(self.code_object.constants)
+            self.code_object.constants.append(value)
+
+        return self.constant_indices[key]
+
+    def name(self, name: str) -> int:
+        if name not in self.name_indices:
+            self.name_indices[name] = len(self.code_object.names)
+            self.code_object.names.append(intern(name))
+
+        return self.name_indices[name]
+
+    def emit(self, op: Operation, args: list[Any]) -> None:
+        signature = operands.get(op, ())
+
+        if len(args) != len(signature):
+            raise ValueError(f'{op.__repr__()} expects {len(signature)} operand(s), got {len(args)}')
+
+        words = self.code_object.code
+        words.append(op.value)
+
+        for kind, value in zip(signature, args):
+            match kind:
+                case Operand.CONSTANT:
+                    words.append(self.constant(value))
+
+                case Operand.NAME:
+                    words.append(self.name(value))
+
+                case Operand.INTEGER:
+                    words.append(value)
+
+        if op in local_operations:
+            self.code_object.n_locals = max(self.code_object.n_locals, args[0] + 1)
+
+        self.code_object.length += 1
+
+
+def assemble(code: list[Any], lines: Optional[Lines] = None) -> CodeObject:
+    assembler = Assembler()
+
+    if lines is not None:
+        if len(lines) != len(code):
+            raise ValueError(f'{len(lines)} lines for {len(code)} instructions')
+
+        assembler.code_object.lines = line_table(lines)
+
+    for command in code:
+        match command:
+            case (Operation.DEFINE_FUNCTION, FunctionCode(code=list()) as function):
+                assembled = assemble(function.code, function.lines)
+                assembler.emit(Operation.DEFINE_FUNCTION, [replace(function, code=assembled, lines=None)])
+
+            case (op, *args):
+                assembler.emit(op, args)
+
+            case op:
+                assembler.emit(op, [])
+
+    assembler.code_object.stack_size = analyze(code)  # operand counts are checked by now
+
+    return assembler.code_object
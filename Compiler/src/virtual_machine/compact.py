@@ -0,0 +1,398 @@
+from typing import Any, Callable, Iterator, Optional
+from array import array
+from itertools import repeat
+from math import prod
+from semantics.types import Type, int32, float64
+from virtual_machine.slicing import span
+
+#=
+# Compact vectors & matrices of numbers, a pure-Python runtime representation.
+# The elements live in a single flat `array` buffer, row-major - 'q' for int32 & 'd' for float64 -
+# addressed through an offset & a stride per dimension, so a subscript is one offset computation
+# instead of a walk through nested lists. Selected with `stdlib.use('compact')`.
+# Indices keep the meaning they have on nested lists: the last one selects the row, a single index
+# into a matrix gives the whole row, sharing the matrix's buffer the way a nested list shares its row.
+# Every alias of one value - the matrix & its rows - holds the same `Storage`. A view is another value
+# over the same buffer, with a storage of its own: a transpose swaps shape & strides in O(1),
+# a constant of the pool hands out a view of itself. Both storages are then `shared`,
+# the first write through either copies the buffer, never the other's elements.
+# A slice in a subscript reads out such a view as well, assigning to one copies a row at a time.
+# A float stored into an int32 buffer promotes the whole storage to float64, as a nested list takes it.
+# =#
+
+typecodes: dict[str, str] = {  # element type -> typecode of the buffer
+    int32.name: 'q',
+    float64.name: 'd',
+}
+
+element_types: dict[str, Type] = { 'q': int32, 'd': float64 }
+
+
+def row_major(shape: tuple[int, ...]) -> tuple[int, ...]:
+    return (shape[1], 1) if len(shape) == 2 else (1,)
+
+
+def packed(values: list[Any]) -> array:
+    '''The narrowest buffer holding `values` - an int32 operation may well give floats.'''
+
+    try:
+        return array('q', values)
+    except TypeError:
+        return array('d', values)
+
+
+class Storage:
+    buffer: array
+    shared: bool  # another storage refers to the buffer, it is copied before the first write
+
+    def __init__(self, buffer: array, shared: bool = False) -> None:
+        self.buffer = buffer
+        self.shared = shared
+
+    def own(self) -> None:
+        self.buffer = self.buffer[:]  # whole, offsets & strides of every alias stay valid
+        self.shared = False
+
+    def promote(self) -> None:
+        '''To a float64 buffer, a copy as `own` makes.'''
+
+        self.buffer = array('d', self.buffer)
+        self.shared = False
+
+
+class Matrix:
+    storage: Storage
+    shape: tuple[int, ...]  # (length,) of a vector, (rows, columns) of a matrix
+    strides: tuple[int, ...]  # elements between neighbours along each dimension
+    offset: int  # of the first element within the buffer
+
+    def __init__(self, buffer: array | Storage, shape: tuple[int, ...], strides: Optional[tuple[int, ...]] = None, offset: int = 0) -> None:
+        self.storage = buffer if isinstance(buffer, Storage) else Storage(buffer)
+        self.shape = shape
+        self.strides = strides if strides is not None else row_major(shape)
+        self.offset = offset
+
+    @staticmethod
+    def of(values: list[Any], element: Optional[str] = None) -> 'Matrix | list[Any]':
+        '''`values` in a flat buffer of the `element` type, or of the one they hold. Left alone if they are no vector or matrix.'''
+
+        match values:
+            case [list() as first, *_] if all(type(row) is list and len(row) == len(first) for row in values):
+                shape = (len(values), len(first))
+                elements = [element for row in values for element in row]
+
+            case [list(), *_]:  # ragged
+                return values
+
+            case _:
+                shape = (len(values),)
+                elements = values
+
+        if len(elements) == 0 or not all(type(element) in (int, float) for element in elements):
+            return values
+
+        if element is None:
+            return Matrix(packed(elements), shape)
+
+        return Matrix(array(typecodes[element], elements), shape)
+
+    @staticmethod
+    def filled(shape: tuple[int, ...], value: int | float) -> 'Matrix':
+        size = shape[0] * shape[1] if len(shape) == 2 else shape[0]
+        return Matrix(array('d' if type(value) is float else 'q', [value]) * size, shape)
+
+    @staticmethod
+    def identity(n: int) -> 'Matrix':
+        matrix = Matrix.filled((n, n), 0)
+        matrix.buffer[::n + 1] = array('q', [1]) * n
+
+        return matrix
+
+    @property
+    def buffer(self) -> array:
+        return self.storage.buffer
+
+    @property
+    def element_type(self) -> Type:
+        return element_types[self.buffer.typecode]
+
+    @property
+    def size(self) -> int:
+        size = 1
+
+        for extent in self.shape:
+            size *= extent
+
+        return size
+
+    @property
+    def contiguous(self) -> bool:
+        return self.strides == row_major(self.shape)
+
+    def elements(self) -> array | Iterator[int | float]:
+        '''Every element, row after row - a strided row is a single slice of the buffer.'''
+
+        buffer = self.buffer
+
+        if self.contiguous:
+            return buffer[self.offset:self.offset + self.size]
+
+        if len(self.shape) == 1:
+            return strip(buffer, self.offset, self.shape[0], self.strides[0])
+
+        rows, columns = self.shape
+        row, column = self.strides
+
+        elements = array(buffer.typecode)
+
+        for r in range(rows):
+            elements.extend(strip(buffer, self.offset + r * row, columns, column))
+
+        return elements
+
+    def row(self, index: int) -> 'Matrix':
+        '''An alias, writes through it change the matrix.'''
+
+        return Matrix(self.storage, self.shape[1:], self.strides[1:], self.offset + index * self.strides[0])
+
+    def view(self, shape: tuple[int, ...], strides: tuple[int, ...], offset: int) -> 'Matrix':
+        '''Another value over the same buffer, in O(1) - whichever is written to first copies it.'''
+
+        self.storage.shared = True
+        return Matrix(Storage(self.buffer, True), shape, strides, offset)
+
+    def share(self) -> 'Matrix':
+        return self.view(self.shape, self.strides, self.offset)
+
+    def transpose(self) -> 'Matrix':
+        if len(self.shape) == 1:  # a column
+            return self.view((self.shape[0], 1), (self.strides[0], 1), self.offset)
+
+        return self.view(self.shape[::-1], self.strides[::-1], self.offset)
+
+    def position(self, indices: list[int]) -> int:
+        '''Of the element at 1-based `indices`, the last one selecting the row.'''
+
+        if len(indices) == 2:
+            column, row = indices
+            rows, columns = self.shape
+
+            if 0 < row <= rows and 0 < column <= columns:
+                return self.offset + (row - 1) * self.strides[0] + (column - 1) * self.strides[1]
+
+        elif 0 < indices[0] <= self.shape[0]:
+            return self.offset + (indices[0] - 1) * self.strides[0]
+
+        raise IndexError(f'Indices {indices} out of range of a {self.kind} of shape {self.shape}')
+
+    def read(self, indices: list[int]) -> Any:
+        if len(indices) == 2 == len(self.shape):  # the common case, without a call
+            column, row = indices
+            rows, columns = self.shape
+
+            if 0 < row <= rows and 0 < column <= columns:
+                return self.storage.buffer[self.offset + (row - 1) * self.strides[0] + (column - 1) * self.strides[1]]
+
+        if len(indices) == len(self.shape):
+            return self.storage.buffer[self.position(indices)]
+
+        if len(indices) == 1 and len(self.shape) == 2:
+            if not 0 < indices[0] <= self.shape[0]:
+                raise IndexError(f'Row {indices[0]} out of range of a matrix of shape {self.shape}')
+
+            return self.row(indices[0] - 1)
+
+        raise IndexError(f'{len(indices)} indices into a {self.kind}')
+
+    def write(self, indices: list[int], element: Any) -> None:
+        if self.storage.shared:
+            self.storage.own()
+
+        if len(indices) == len(self.shape):
+            if type(element) is float and self.storage.buffer.typecode == 'q':
+                self.storage.promote()
+
+            try:
+                self.storage.buffer[self.position(indices)] = element
+            except TypeError:
+                raise TypeError(f'Cannot store {element!r} in a {self.element_type} {self.kind}') from None
+
+            return
+
+        target = self.read(indices)
+
+        if target.shape != shape(element):
+            raise ValueError(f'Cannot assign {element!r} to a row of length {target.shape[0]}')
+
+        for k, value in enumerate(elements(element)):
+            target.write([k + 1], value)
+
+    def region(self, indices: list[int | slice]) -> tuple[tuple[int, ...], tuple[int, ...], int]:
+        '''Shape, strides & offset of the elements `indices` select, slices among them.'''
+
+        if len(indices) > len(self.shape):
+            raise IndexError(f'{len(indices)} indices into a {self.kind}')
+
+        shape, strides, offset = [], [], self.offset
+
+        for index, extent, stride in zip(reversed(indices), self.shape, self.strides):
+            if type(index) is slice:
+                positions = span(index, extent)
+
+                shape.append(len(positions))
+                strides.append(stride * positions.step)
+                offset += positions.start * stride if len(positions) > 0 else 0
+
+            elif 0 < index <= extent:
+                offset += (index - 1) * stride
+
+            else:
+                raise IndexError(f'Index {index} out of range of a dimension of {extent} in a {self.kind}')
+
+        selected = len(indices)  # a single index into a matrix keeps the columns whole
+
+        return (*shape, *self.shape[selected:]), (*strides, *self.strides[selected:]), offset
+
+    def select(self, indices: list[int | slice]) -> 'Matrix':
+        return self.view(*self.region(indices))
+
+    def assign(self, indices: list[int | slice], element: Any) -> None:
+        '''The elements `indices` select, from those of `element` - a scalar fills them all.'''
+
+        if self.storage.shared:
+            self.storage.own()
+
+        shape, strides, offset = self.region(indices)
+        buffer = self.storage.buffer
+
+        if isinstance(element, (int, float)):
+            source = [element] * prod(shape)
+        else:
+            source = element if isinstance(element, Matrix) else Matrix.of(element)
+
+            if not isinstance(source, Matrix) or source.shape != shape:
+                raise ValueError(f'Cannot assign {element!r} to a slice of shape {shape}')
+
+            source = source.elements()
+
+        try:
+            values = packed(source) if buffer.typecode == 'q' else array('d', source)  # a copy, `element` may view this very buffer
+        except TypeError:
+            raise TypeError(f'Cannot store {element!r} in a {self.element_type} {self.kind}') from None
+
+        if values.typecode != buffer.typecode:
+            self.storage.promote()
+            buffer = self.storage.buffer
+
+        if len(shape) == 1:
+            place(buffer, offset, shape[0], strides[0], values)
+            return
+
+        rows, columns = shape
+
+        for r in range(rows):
+            place(buffer, offset + r * strides[0], columns, strides[1], values[r * columns:(r + 1) * columns])
+
+    @property
+    def kind(self) -> str:
+        return 'matrix' if len(self.shape) == 2 else 'vector'
+
+    def map(self, function: Callable[[Any, Any], Any], other: Any) -> 'Matrix':
+        '''`function` applied element by element, a scalar `other` paired with every element.'''
+
+        if not isinstance(other, Matrix):
+            return Matrix(packed(list(map(function, self.elements(), repeat(other)))), self.shape)
+
+        if other.shape != self.shape:
+            raise ValueError(f'Shapes {self.shape} and {other.shape} do not match')
+
+        return Matrix(packed(list(map(function, self.elements(), other.elements()))), self.shape)
+
+    def tolist(self) -> list[Any]:
+        elements = list(self.elements())
+
+        if len(self.shape) == 1:
+            return elements
+
+        columns = self.shape[1]
+        return [elements[k:k + columns] for k in range(0, len(elements), columns)]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, index: int) -> Any:  # 0-based, along the first dimension - as a nested list
+        return self.read([index + 1])
+
+    def __neg__(self) -> 'Matrix':
+        return Matrix(array(self.buffer.typecode, [-element for element in self.elements()]), self.shape)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Matrix):
+            return self.shape == other.shape and list(self.elements()) == list(other.elements())
+
+        if isinstance(other, list):
+            return self.tolist() == other
+
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.tolist())  # prints as the nested list would
+
+
+def build(values: Any, element: Optional[str] = None) -> Any:
+    if isinstance(values, Matrix):  # a constant of the pool
+        return values.share()
+
+    return Matrix.of(values, element)
+
+
+def strip(buffer: array, start: int, length: int, stride: int) -> array:
+    '''`length` elements from `start` on, `stride` apart.'''
+
+    if length == 0:
+        return buffer[0:0]
+
+    stop = start + (length - 1) * stride
+
+    if stride > 0:
+        return buffer[start:stop + 1:stride]
+
+    return buffer[stop:start + 1:-stride][::-1]
+
+
+def place(buffer: array, start: int, length: int, stride: int, values: array) -> None:
+    '''`values` into `length` elements from `start` on, `stride` apart.'''
+
+    if length == 0:
+        return
+
+    stop = start + (length - 1) * stride
+
+    if stride > 0:
+        buffer[start:stop + 1:stride] = values
+    else:
+        buffer[stop:start + 1:-stride] = values[::-1]
+
+
+def shape(value: Any) -> tuple[int, ...]:
+    if isinstance(value, Matrix):
+        return value.shape
+
+    return (len(value),)
+
+
+def elements(value: Any) -> Any:
+    return value.elements() if isinstance(value, Matrix) else value
+
+
+def equal(left: Any, right: Any) -> bool:
+    return left == right
+
+
+def broadcast(function: Callable[[Any, Any], Any], left: Any, right: Any) -> Matrix:
+    match (left, right):
+        case (Matrix(), _):
+            return left.map(function, Matrix.of(right) if isinstance(right, list) else right)
+
+        case (_, Matrix()):
+            return right.map(lambda x, y: function(y, x), Matrix.of(left) if isinstance(left, list) else left)
@@ -0,0 +1,494 @@
+from typing import Any, Callable, Optional
+from sys import maxsize
+from virtual_machine.bytecode import Operation
+from virtual_machine.code_object import CodeObject
+import virtual_machine.stdlib as std
+from virtual_machine.slicing import whole
+
+#=
+# Table-driven interpreter core.
+# Code is decoded once into two parallel lists (opcodes & arguments),
+# then every step is a single indexed call: handlers[opcode](frame, argument, i).
+# Each handler returns the index of the next instruction to execute.
+# =#
+
+Handler = Callable[['Frame', Any, int], int]
+
+HALT = maxsize  # any index past the end of code stops the loop
+
+exhausted = object()  # default of next() - None may well be an element
+
+handlers: list[Optional[Handler]] = [None] * (max(op.value for op in Operation) + 1)
+
+
+def handles(operation: Operation, table: list[Optional[Handler]] = handlers) -> Callable[[Handler], Handler]:
+    def register(handler: Handler) -> Handler:
+        table[operation.value] = handler
+        return handler
+
+    return register
+
+
+def decode(code: list[Any] | CodeObject, table: list[Optional[Handler]] = handlers) -> tuple[list[int], list[Any]]:
+    if isinstance(code, CodeObject):
+        opcodes, arguments = code.decode()
+
+    else:
+        opcodes = []
+        arguments = []
+
+        for command in code:
+            match command:
+                case (op, argument):
+                    pass
+
+                case (op, *args):
+                    argument = tuple(args)
+
+                case op:
+                    argument = None
+
+            opcodes.append(op.value)
+            arguments.append(argument)
+
+    for opcode in set(opcodes):
+        if table[opcode] is None:
+            raise NotImplementedError(f'No handler for {Operation(opcode).__repr__()}')
+
+    return opcodes, arguments
+
+
+@handles(Operation.PUSH)
+def _(frame: 'Frame', value: Any, i: int) -> int:
+    frame.stack.append(value)
+    return i + 1
+
+
+@handles(Operation.POP)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack.pop()
+    return i + 1
+
+
+@handles(Operation.CLONE)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack.append(frame.stack[-1])
+    return i + 1
+
+
+@handles(Operation.SWAP)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack = frame.stack
+    stack[-1], stack[-2] = stack[-2], stack[-1]
+    return i + 1
+
+
+@handles(Operation.STORE_NAME)
+def _(frame: 'Frame', name: str, i: int) -> int:
+    frame.context[name] = frame.stack.pop()
+    return i + 1
+
+
+@handles(Operation.LOAD_NAME)
+def _(frame: 'Frame', name: str, i: int) -> int:
+    frame.stack.append(frame.context[name])
+    return i + 1
+
+
+@handles(Operation.STORE_FAST)
+def _(frame: 'Frame', slot: int, i: int) -> int:
+    frame.locals[slot] = frame.stack.pop()
+    return i + 1
+
+
+@handles(Operation.LOAD_FAST)
+def _(frame: 'Frame', slot: int, i: int) -> int:
+    frame.stack.append(frame.locals[slot])
+    return i + 1
+
+
+@handles(Operation.JUMP)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    return i + delta
+
+
+@handles(Operation.JUMP_IF_FALSE)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    if not frame.stack.pop():
+        return i + delta
+
+    return i + 1
+
+
+@handles(Operation.RETURN)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.result = None
+    return HALT
+
+
+@handles(Operation.RETURN_VALUE)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.result = frame.stack.pop()
+    return HALT
+
+
+@handles(Operation.SETUP_LOOP)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.blocks.append(len(frame.stack))
+    return i + 1
+
+
+@handles(Operation.CLEAR_LOOP)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    del frame.stack[frame.blocks.pop():]
+    return i + 1
+
+
+@handles(Operation.APPEND)
+def _(frame: 'Frame', offset: int, i: int) -> int:
+    stack = frame.stack
+    stack[offset].append(stack.pop())
+    return i + 1
+
+
+@handles(Operation.LEN)
+def _(frame: 'Frame', offset: int, i: int) -> int:
+    stack = frame.stack
+    stack.append(len(stack[offset]))
+    return i + 1
+
+
+@handles(Operation.MAKE_LIST)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack.append([])
+    return i + 1
+
+
+@handles(Operation.MAKE_ARRAY)
+def _(frame: 'Frame', element: Optional[str], i: int) -> int:
+    stack = frame.stack
+    stack[-1] = std.array(stack[-1], element)
+    return i + 1
+
+
+@handles(Operation.MAKE_ENUMERATE)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack = frame.stack
+
+    step = stack.pop()
+    end = stack.pop()
+    start = stack.pop()
+
+    stack.append(iter(range(start, end, step)))
+    return i + 1
+
+
+@handles(Operation.MAKE_SLICE)
+def _(frame: 'Frame', n_bounds: int, i: int) -> int:
+    stack = frame.stack
+
+    if n_bounds == 0:
+        stack.append(whole)
+        return i + 1
+
+    step = stack.pop()
+    end = stack.pop()
+
+    stack[-1] = slice(stack[-1], end, step)
+    return i + 1
+
+
+@handles(Operation.MAKE_CONST_SEQUENCE)
+def _(frame: 'Frame', value: Any, i: int) -> int:
+    stack = frame.stack
+    length = stack.pop()
+
+    stack.append((value for _ in range(length)))
+    return i + 1
+
+
+@handles(Operation.ITER_NEXT)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> int:
+    offset, jump = argument
+    stack = frame.stack
+
+    element = next(stack[offset], exhausted)
+
+    if element is exhausted:
+        return i + jump
+
+    stack.append(element)
+    return i + 1
+
+
+@handles(Operation.FOR_RANGE_INIT)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> int:
+    slot, exit = argument
+    stack = frame.stack
+
+    step = stack.pop()
+    end = stack.pop()
+    counter = iter(range(stack.pop(), end, step))
+
+    element = next(counter, exhausted)
+
+    if element is exhausted:
+        return i + exit
+
+    frame.locals[slot] = counter
+
+    stack.append(element)
+    return i + 1
+
+
+@handles(Operation.FOR_RANGE_STEP)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> int:
+    slot, body = argument
+    element = next(frame.locals[slot], exhausted)
+
+    if element is exhausted:
+        return i + 1
+
+    frame.stack.append(element)
+    return i + body
+
+
+@handles(Operation.SUBSCRIPT_READ)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack = frame.stack
+
+    indices = stack[-n_indices:]
+    del stack[-n_indices:]
+
+    deref = stack.pop()
+
+    if type(deref) is not list:
+        stack.append(std.read(deref, indices))
+        return i + 1
+
+    for index in reversed(indices):
+        deref = deref[index - 1]
+
+    stack.append(deref)
+    return i + 1
+
+
+@handles(Operation.SUBSCRIPT_WRITE)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack = frame.stack
+    element = stack.pop()
+
+    indices = stack[-n_indices:]
+    del stack[-n_indices:]
+
+    deref = stack.pop()
+
+    if type(deref) is not list:
+        std.write(deref, indices, element)
+        return i + 1
+
+    for index in reversed(indices[1:]):
+        deref = deref[index - 1]
+
+    deref[indices[0] - 1] = element
+    return i + 1
+
+
+@handles(Operation.SLICE_READ)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack = frame.stack
+
+    indices = stack[-n_indices:]
+    del stack[-n_indices:]
+
+    stack[-1] = std.select(stack[-1], indices)
+    return i + 1
+
+
+@handles(Operation.SLICE_WRITE)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack = frame.stack
+    element = stack.pop()
+
+    indices = stack[-n_indices:]
+    del stack[-n_indices:]
+
+    std.assign(stack.pop(), indices, element)
+    return i + 1
+
+
+@handles(Operation.CALL)
+def _(frame: 'Frame', n_args: int, i: int) -> int:
+    stack = frame.stack
+    name = stack.pop()
+
+    start = len(stack) - n_args
+    arguments = stack[start:]
+    del stack[start:]
+
+    callee, value = frame.vm.call(name, arguments)
+
+    if callee is None:  # a builtin, done already
+        stack.append(value)
+        return i + 1
+
+    frame.callee = callee  # the engine's loop yields it, the result is pushed on resumption
+    frame.resume = i + 1
+    return HALT
+
+
+@handles(Operation.DEFINE_FUNCTION)
+def _(frame: 'Frame', function: 'FunctionCode', i: int) -> int:
+    frame.vm.define(function)
+    return i + 1
+
+
+@handles(Operation.BINARY_OP)
+def _(frame: 'Frame', operator: str, i: int) -> int:
+    stack = frame.stack
+
+    right = stack.pop()
+    left = stack.pop()
+
+    stack.append(std.binary_ops[operator](left, right))
+    return i + 1
+
+
+@handles(Operation.UNARY_OP)
+def _(frame: 'Frame', operator: str, i: int) -> int:
+    stack = frame.stack
+    stack.append(std.unary_ops[operator](stack.pop()))
+    return i + 1
+
+
+@handles(Operation.BINARY_ADD_INT)
+@handles(Operation.BINARY_ADD_FLOAT)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+    stack[-1] = stack[-1] + right
+    return i + 1
+
+
+@handles(Operation.BINARY_SUBTRACT_INT)
+@handles(Operation.BINARY_SUBTRACT_FLOAT)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+    stack[-1] = stack[-1] - right
+    return i + 1
+
+
+@handles(Operation.BINARY_MULTIPLY_INT)
+@handles(Operation.BINARY_MULTIPLY_FLOAT)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+    stack[-1] = stack[-1] * right
+    return i + 1
+
+
+@handles(Operation.BINARY_DIVIDE_FLOAT)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+    stack[-1] = stack[-1] / right
+    return i + 1
+
+
+@handles(Operation.BINARY_MODULO_INT)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+    stack[-1] = stack[-1] % right
+    return i + 1
+
+
+@handles(Operation.JUMP_UNLESS_LT_INT)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+
+    if stack.pop() < right:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_LE_INT)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+
+    if stack.pop() <= right:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_GT_INT)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+
+    if stack.pop() > right:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_GE_INT)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+
+    if stack.pop() >= right:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_EQ_INT)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+
+    if stack.pop() == right:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_NE_INT)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack = frame.stack
+    right = stack.pop()
+
+    if stack.pop() != right:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.INCREMENT)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack[-1] += 1
+    return i + 1
+
+
+@handles(Operation.DECREMENT)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack[-1] -= 1
+    return i + 1
+
+
+@handles(Operation.PRINT)
+def _(frame: 'Frame', n_args: int, i: int) -> int:
+    print(*frame.stack[-n_args:], sep='\n')
+    return i + 1
+
+
+@handles(Operation.PRINT_STACK)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    print(*frame.stack, sep='\n')
+    return i + 1
@@ -0,0 +1,149 @@
+from typing import Any, Optional
+from virtual_machine.bytecode import Operation
+
+#=
+# Append-only instruction buffer used by the code generator.
+# Jump targets are symbolic `Label`s until `resolve` rewrites them
+# into the relative deltas the VM expects, in a single pass over the recorded fixups.
+# Every instruction is recorded with the source line `locate`d last.
+# =#
+
+
+class Label:
+    position: Optional[int]
+
+    def __init__(self) -> None:
+        self.position = None
+
+    def __repr__(self) -> str:
+        return f'Label({self.position})'
+
+
+class Loop:
+    exit: Label
+    next: Label
+
+    def __init__(self, exit: Label, next: Label) -> None:
+        self.exit = exit        # target of 'break'
+        self.next = next        # target of 'continue'
+
+
+class Emitter:
+    code: list[Any]
+    fixups: list[int]  # indices of instructions with a Label operand
+    loops: list[Loop]
+    slots: Optional[dict[str, int]]  # None compiles every variable access by name
+    temporaries: int
+    registers: int  # slots of the VM's own state in dynamic code
+    line: Optional[int]
+    lines: list[Optional[int]]  # source line of every instruction
+
+    def __init__(self, slots: Optional[dict[str, int]] = None) -> None:
+        self.code = []
+        self.line = None
+        self.lines = []
+        self.fixups = []
+        self.loops = []
+        self.slots = slots
+        self.temporaries = 0
+        self.registers = 0
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def emit(self, op: Operation, *args: Any) -> None:
+        self.lines.append(self.line)
+
+        if len(args) == 0:
+            self.code.append(op)
+            return
+
+        if any(isinstance(arg, Label) for arg in args):
+            self.fixups.append(len(self.code))
+
+        self.code.append((op, *args))
+
+    def locate(self, line: Optional[int]) -> None:
+        if line is not None:
+            self.line = line
+
+    def load(self, name: str) -> None:
+        if self.slots is not None and name in self.slots:
+            self.emit(Operation.LOAD_FAST, self.slots[name])
+        else:
+            self.emit(Operation.LOAD_NAME, name)
+
+    def store(self, name: str) -> None:
+        if self.slots is not None and name in self.slots:
+            self.emit(Operation.STORE_FAST, self.slots[name])
+        else:
+            self.emit(Operation.STORE_NAME, name)
+
+    def temporary(self, prefix: str) -> str:
+        # every temporary is unique, so each slot has a single short live range
+        name = f'{prefix}_{self.temporaries}'
+        self.temporaries += 1
+
+        if self.slots is not None:
+            self.slots[name] = len(self.slots)
+
+        return name
+
+    def register(self) -> int:
+        '''Frame slot for the VM's own state, allocated in dynamic code as well.'''
+
+        if self.slots is None:
+            self.registers += 1
+            return self.registers - 1
+
+        slot = len(self.slots)
+        self.slots[f'__register_{slot}'] = slot
+
+        return slot
+
+    def label(self) -> Label:
+        return Label()
+
+    def mark(self, label: Label) -> None:
+        if label.position is not None:
+            raise RuntimeError(f'{label} is already bound')
+
+        label.position = len(self.code)
+
+    def here(self) -> Label:
+        label = self.label()
+        self.mark(label)
+
+        return label
+
+    def enter_loop(self, exit: Label, next: Label) -> None:
+        self.loops.append(Loop(exit, next))
+
+    def exit_loop(self) -> None:
+        self.loops.pop()
+
+    @property
+    def loop(self) -> Loop:
+        if len(self.loops) == 0:
+            raise RuntimeError('Loop control statement outside loop')
+
+        return self.loops[-1]
+
+    def resolve(self) -> list[Any]:
+        for index in self.fixups:
+            op, *args = self.code[index]
+
+            for k, arg in enumerate(args):
+                if not isinstance(arg, Label):
+                    continue
+
+                if arg.position is None:
+                    raise RuntimeError(f'Unbound label in {op.__repr__()} at {index}')
+
+                args[k] = arg.position - index
+
+            self.code[index] = (op, *args)
+
+        self.fixups = []
+
+        return self.code
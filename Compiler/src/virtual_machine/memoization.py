@@ -0,0 +1,65 @@
+from typing import Any, Hashable
+from collections import OrderedDict
+
+#=
+# Results of pure functions, by their arguments.
+# A call of a function the compiler proved pure, with scalar arguments only, looks its result up
+# here first - a hit needs no frame at all. Only scalar results are kept, a vector returned
+# could be written to by the caller. The least recently used entry goes once `size` is exceeded.
+# =#
+
+SIZE = 1024
+
+scalars = { int, float, bool, str }
+
+missing = object()
+
+
+class Memo:
+    size: int  # entries kept, 0 turns memoization off
+    entries: OrderedDict[Hashable, Any]
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, size: int = 0) -> None:
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, name: str, arguments: list[Any]) -> Hashable:
+        '''None if the arguments are not all scalars - that call is not memoized.'''
+
+        types = tuple(type(argument) for argument in arguments)  # keeps 1, 1.0 and True apart
+
+        if not scalars.issuperset(types):
+            return None
+
+        return (name, types, *arguments)
+
+    def lookup(self, key: Hashable) -> Any:
+        value = self.entries.get(key, missing)
+
+        if value is missing:
+            self.misses += 1
+            return missing
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+
+        return value
+
+    def store(self, key: Hashable, value: Any) -> None:
+        if type(value) not in scalars and value is not None:
+            return
+
+        self.entries[key] = value
+
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __str__(self) -> str:
+        return f'memoized calls: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, {len(self.entries)}/{self.size} entries'
@@ -0,0 +1,145 @@
+from typing import Any, Optional
+from semantics.types import Type, int32, float64
+from virtual_machine.slicing import span
+
+#=
+# NumPy-backed vector & matrix values, an optional runtime representation.
+# With `stdlib.use('numpy')`, every vector & matrix literal becomes an ndarray whose dtype follows
+# its element type - int32 or float64, inferred from the elements if the code is not typed.
+# Broadcast operators, equality, subscripting & printing are then single vectorized calls
+# instead of a Python call per element. Subscripts read out Python scalars, so the rest of the VM
+# never meets a NumPy scalar. Without NumPy installed, values stay nested lists.
+# An ndarray cannot change its dtype in place, so a float stored into an int32 one raises
+# instead of being truncated - a nested list would hold the float.
+# =#
+
+try:
+    import numpy
+except ImportError:  # optional
+    numpy = None
+
+available = numpy is not None
+
+ndarray: Optional[type] = numpy.ndarray if available else None
+
+dtypes: dict[Type, str] = {
+    int32: 'int32',
+    float64: 'float64',
+}
+
+
+def element_type(values: list[Any]) -> Optional[Type]:
+    '''Of a vector or a rectangular matrix of numbers, None for anything else (ragged, nested deeper, strings).'''
+
+    match values:
+        case [list() as first, *_]:
+            if not all(type(row) is list and len(row) == len(first) for row in values):
+                return None
+
+            elements = [element for row in values for element in row]
+
+        case _:
+            elements = values
+
+    if len(elements) == 0:
+        return None
+
+    types = { type(element) for element in elements }
+
+    if types <= { int }:
+        return int32
+
+    if types <= { int, float }:
+        return float64
+
+    return None
+
+
+def array(values: list[Any], element: Optional[str] = None) -> Any:
+    '''`values` as an ndarray of the `element` type, or of the one they hold. Left alone if they are no vector or matrix.'''
+
+    if element is None:
+        inferred = element_type(values)
+
+        if inferred is None:
+            return values
+
+        element = dtypes[inferred]
+
+    return numpy.array(values, dtype=element)
+
+
+def filled(rows: int, columns: int, value: int) -> Any:
+    return numpy.full((rows, columns), value, dtype='int32')
+
+
+def identity(n: int) -> Any:
+    return numpy.eye(n, dtype='int32')
+
+
+def indexing(indices: list[int]) -> tuple[int, ...]:
+    return tuple(index - 1 for index in reversed(indices))  # the last index selects the row
+
+
+def selection(indices: list[int | slice], shape: tuple[int, ...]) -> tuple[int | slice, ...]:
+    '''NumPy's basic indexing for `indices`, slices among them.'''
+
+    selected = []
+
+    for index, extent in zip(reversed(indices), shape):
+        if type(index) is not slice:
+            selected.append(index - 1)
+            continue
+
+        positions = span(index, extent)
+        stop = positions.stop if positions.stop >= 0 else None  # down to the first element
+
+        selected.append(slice(positions.start, stop, positions.step) if len(positions) > 0 else slice(0, 0))
+
+    return tuple(selected)
+
+
+def read(source: Any, indices: list[int]) -> Any:
+    value = source[indexing(indices)]
+
+    return value.item() if isinstance(value, numpy.generic) else value
+
+
+def narrowing(source: Any, element: Any) -> bool:
+    '''Whether storing `element` into `source` would lose its kind, a float into integers.'''
+
+    if type(element) is float:
+        return source.dtype.kind != 'f'
+
+    if type(element) is int:
+        return False
+
+    return not numpy.can_cast(numpy.asarray(element).dtype, source.dtype, 'same_kind')
+
+
+def write(source: Any, indices: list[int], element: Any) -> None:
+    if narrowing(source, element):
+        raise TypeError(f'Cannot store {element!r} in an {source.dtype} array')
+
+    source[indexing(indices)] = element
+
+
+def transpose(source: Any) -> Any:
+    transposed = source.reshape(-1, 1) if source.ndim == 1 else source.T  # a vector becomes a column
+
+    return transposed.copy()  # writes through a NumPy view would reach the source
+
+
+def select(source: Any, indices: list[int | slice]) -> Any:
+    return source[selection(indices, source.shape)].copy()  # a NumPy view would be written through
+
+
+def assign(source: Any, indices: list[int | slice], element: Any) -> None:
+    if narrowing(source, element):
+        raise TypeError(f'Cannot store {element!r} in an {source.dtype} array')
+
+    source[selection(indices, source.shape)] = element
+
+
+def equal(left: Any, right: Any) -> bool:
+    return bool(numpy.array_equal(left, right))
@@ -0,0 +1,353 @@
+from typing import Any, Callable, Optional
+from dataclasses import replace
+from virtual_machine.bytecode import Operation, jump_operands
+from virtual_machine.code_object import FunctionCode
+
+#=
+# Peephole optimizer over the code list produced by `compile`.
+# Jumps are made absolute for the duration of the pass, rules replace
+# removed instructions with None, and `compact` closes the gaps while
+# remapping every jump target. Relative deltas are restored at the end.
+# =#
+
+Rule = Callable[[list[Any], set[int]], tuple[int, int]]  # -> (removed, rewritten)
+
+rules: list[tuple[str, int, Rule]] = []
+
+
+def rule(name: str, level: int) -> Callable[[Rule], Rule]:
+    def register(function: Rule) -> Rule:
+        rules.append((name, level, function))
+        return function
+
+    return register
+
+
+class Report:
+    removed: dict[str, int]
+    rewritten: dict[str, int]
+    before: int
+    after: int
+
+    def __init__(self, level: int, before: int) -> None:
+        active = [name for name, rule_level, _ in rules if rule_level <= level]
+
+        self.removed = dict.fromkeys(active, 0)
+        self.rewritten = dict.fromkeys(active, 0)
+        self.before = before
+        self.after = before
+
+    def record(self, name: str, removed: int, rewritten: int) -> None:
+        self.removed[name] += removed
+        self.rewritten[name] += rewritten
+
+    def __str__(self) -> str:
+        width = max(map(len, self.removed), default=0) + 4
+
+        lines = [f'{"rule":<{width}}{"removed":>10}{"rewritten":>12}']
+
+        for name in self.removed:
+            lines.append(f'{name:<{width}}{self.removed[name]:>10}{self.rewritten[name]:>12}')
+
+        lines.append(f'{self.before} -> {self.after} instructions')
+
+        return '\n'.join(lines)
+
+
+def operation(command: Any) -> Operation:
+    return command[0] if isinstance(command, tuple) else command
+
+
+def target(command: Any) -> Optional[int]:
+    if not isinstance(command, tuple) or command[0] not in jump_operands:
+        return None
+
+    return command[jump_operands[command[0]] + 1]
+
+
+def retarget(command: tuple, position: int) -> tuple:
+    k = jump_operands[command[0]] + 1
+    return (*command[:k], position, *command[k + 1:])
+
+
+def absolute(code: list[Any]) -> list[Any]:
+    return [
+        retarget(command, i + target(command))
+        if target(command) is not None
+        else command
+        for i, command in enumerate(code)
+    ]
+
+
+def relative(code: list[Any]) -> list[Any]:
+    return [
+        retarget(command, target(command) - i)
+        if target(command) is not None
+        else command
+        for i, command in enumerate(code)
+    ]
+
+
+def targets(code: list[Any]) -> set[int]:
+    return {
+        target(command)
+        for command in code
+        if target(command) is not None
+    }
+
+
+def compact(code: list[Any]) -> list[Any]:
+    # jumps to a removed instruction land on the next surviving one
+    new_index = []
+    alive = 0
+
+    for command in code:
+        new_index.append(alive)
+        alive += command is not None
+
+    new_index.append(alive)
+
+    return [
+        retarget(command, new_index[target(command)])
+        if target(command) is not None
+        else command
+        for command in code
+        if command is not None
+    ]
+
+
+def loads(code: list[Any]) -> dict[int, int]:
+    counts = dict()
+
+    for command in code:
+        if operation(command) == Operation.LOAD_FAST:
+            counts[command[1]] = counts.get(command[1], 0) + 1
+
+    return counts
+
+
+@rule('unreachable', level=1)
+def _(code: list[Any], _: set[int]) -> tuple[int, int]:
+    n = len(code)
+    reachable = [False] * n
+    pending = [0]
+
+    while len(pending) > 0:
+        i = pending.pop()
+
+        if i >= n or reachable[i]:
+            continue
+
+        reachable[i] = True
+
+        match operation(code[i]):
+            case Operation.JUMP:
+                pending.append(target(code[i]))
+
+            case Operation.RETURN | Operation.RETURN_VALUE:
+                pass
+
+            case _ if target(code[i]) is not None:  # conditional jumps
+                pending.append(i + 1)
+                pending.append(target(code[i]))
+
+            case _:
+                pending.append(i + 1)
+
+    removed = 0
+
+    for i in range(n):
+        if not reachable[i]:
+            code[i] = None
+            removed += 1
+
+    return removed, 0
+
+
+@rule('jump_threading', level=1)
+def _(code: list[Any], _: set[int]) -> tuple[int, int]:
+    rewritten = 0
+
+    for i, command in enumerate(code):
+        destination = target(command)
+
+        if destination is None:
+            continue
+
+        seen = { i }
+
+        while destination < len(code) and operation(code[destination]) == Operation.JUMP:
+            if destination in seen:  # jump cycle, leave it alone
+                destination = target(command)
+                break
+
+            seen.add(destination)
+            destination = target(code[destination])
+
+        if destination != target(command):
+            code[i] = retarget(command, destination)
+            rewritten += 1
+
+    return 0, rewritten
+
+
+@rule('jump_to_next', level=1)
+def _(code: list[Any], _: set[int]) -> tuple[int, int]:
+    removed = 0
+    rewritten = 0
+
+    for i, command in enumerate(code):
+        if target(command) != i + 1:
+            continue
+
+        match operation(command):
+            case Operation.JUMP:
+                code[i] = None
+                removed += 1
+
+            case Operation.JUMP_IF_FALSE:
+                code[i] = Operation.POP
+                rewritten += 1
+
+    return removed, rewritten
+
+
+@rule('push_pop', level=1)
+def _(code: list[Any], jump_targets: set[int]) -> tuple[int, int]:
+    pure = { Operation.PUSH, Operation.LOAD_FAST, Operation.CLONE }
+    removed = 0
+    i = 0
+
+    while i < len(code) - 1:
+        if operation(code[i]) in pure\
+                and code[i + 1] == Operation.POP\
+                and i + 1 not in jump_targets:
+            code[i] = code[i + 1] = None
+            removed += 2
+            i += 2
+            continue
+
+        i += 1
+
+    return removed, 0
+
+
+@rule('dead_store', level=2)
+def _(code: list[Any], _: set[int]) -> tuple[int, int]:
+    counts = loads(code)
+    rewritten = 0
+
+    for i, command in enumerate(code):
+        if operation(command) == Operation.STORE_FAST and command[1] not in counts:
+            code[i] = Operation.POP
+            rewritten += 1
+
+    return 0, rewritten
+
+
+@rule('store_load', level=2)
+def _(code: list[Any], jump_targets: set[int]) -> tuple[int, int]:
+    # STORE_FAST s; LOAD_FAST s - the only read of s, the value may just stay on the stack
+    counts = loads(code)
+    removed = 0
+    i = 0
+
+    while i < len(code) - 1:
+        store, load = code[i], code[i + 1]
+
+        if operation(store) == Operation.STORE_FAST\
+                and load == (Operation.LOAD_FAST, store[1])\
+                and counts[store[1]] == 1\
+                and i + 1 not in jump_targets:
+            code[i] = code[i + 1] = None
+            removed += 2
+            i += 2
+            continue
+
+        i += 1
+
+    return removed, 0
+
+
+@rule('store_swap', level=2)
+def _(code: list[Any], jump_targets: set[int]) -> tuple[int, int]:
+    # STORE_FAST s; LOAD_FAST t; LOAD_FAST s - the only read of s becomes LOAD_FAST t; SWAP
+    counts = loads(code)
+    removed = 0
+    i = 0
+
+    while i < len(code) - 2:
+        store, other, load = code[i], code[i + 1], code[i + 2]
+
+        if operation(store) == Operation.STORE_FAST\
+                and operation(other) == Operation.LOAD_FAST\
+                and other[1] != store[1]\
+                and load == (Operation.LOAD_FAST, store[1])\
+                and counts[store[1]] == 1\
+                and i + 1 not in jump_targets\
+                and i + 2 not in jump_targets:
+            code[i] = other
+            code[i + 1] = Operation.SWAP
+            code[i + 2] = None
+            removed += 1
+            i += 3
+            continue
+
+        i += 1
+
+    return removed, 0
+
+
+def optimize(code: list[Any], level: int = 1, *, lines: Optional[list[Optional[int]]] = None) -> tuple[list[Any], Report]:
+    '''A `lines` list, the source line of every instruction, is kept in step with the code.
+    Functions the code defines are optimized as well, the report covers them all.'''
+
+    report = Report(level, len(code))
+
+    if level <= 0:
+        return code, report
+
+    length = len(code)
+
+    code = [
+        (Operation.DEFINE_FUNCTION, optimize_function(command[1], level, report))
+        if operation(command) == Operation.DEFINE_FUNCTION
+        else command
+        for command in code
+    ]
+
+    active = [(name, function) for name, rule_level, function in rules if rule_level <= level]
+
+    code = absolute(code)
+    changed = True
+
+    while changed:
+        changed = False
+
+        for name, function in active:
+            removed, rewritten = function(code, targets(code))
+
+            if lines is not None:
+                lines[:] = [line for command, line in zip(code, lines) if command is not None]
+
+            code = compact(code)
+
+            report.record(name, removed, rewritten)
+            changed = changed or removed > 0 or rewritten > 0
+
+    report.after += len(code) - length
+
+    return relative(code), report
+
+
+def optimize_function(code: FunctionCode, level: int, report: Report) -> FunctionCode:
+    lines = list(code.lines) if code.lines is not None else None
+    optimized, inner = optimize(code.code, level, lines=lines)
+
+    for name in inner.removed:
+        report.record(name, inner.removed[name], inner.rewritten[name])
+
+    report.before += inner.before
+    report.after += inner.after
+
+    return replace(code, code=optimized, lines=lines)
@@ -0,0 +1,440 @@
+from typing import Any, Optional
+from virtual_machine.bytecode import Operation
+from virtual_machine.dispatch import Handler, HALT, handles, exhausted
+import virtual_machine.stdlib as std
+from virtual_machine.slicing import whole
+
+#=
+# Handlers of the preallocated-stack engine.
+# The operand stack is a list of `stack_size` cells allocated once per frame,
+# `frame.sp` indexes the first free one. Verified code never over- or underflows it,
+# so no handler checks its bounds. Popped cells are not cleared.
+# =#
+
+handlers: list[Optional[Handler]] = [None] * (max(op.value for op in Operation) + 1)
+
+
+@handles(Operation.PUSH, handlers)
+def _(frame: 'Frame', value: Any, i: int) -> int:
+    frame.stack[frame.sp] = value
+    frame.sp += 1
+    return i + 1
+
+
+@handles(Operation.POP, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.sp -= 1
+    return i + 1
+
+
+@handles(Operation.CLONE, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+    stack[sp] = stack[sp - 1]
+    frame.sp = sp + 1
+    return i + 1
+
+
+@handles(Operation.SWAP, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+    stack[sp - 1], stack[sp - 2] = stack[sp - 2], stack[sp - 1]
+    return i + 1
+
+
+@handles(Operation.STORE_NAME, handlers)
+def _(frame: 'Frame', name: str, i: int) -> int:
+    frame.sp -= 1
+    frame.context[name] = frame.stack[frame.sp]
+    return i + 1
+
+
+@handles(Operation.LOAD_NAME, handlers)
+def _(frame: 'Frame', name: str, i: int) -> int:
+    frame.stack[frame.sp] = frame.context[name]
+    frame.sp += 1
+    return i + 1
+
+
+@handles(Operation.STORE_FAST, handlers)
+def _(frame: 'Frame', slot: int, i: int) -> int:
+    frame.sp -= 1
+    frame.locals[slot] = frame.stack[frame.sp]
+    return i + 1
+
+
+@handles(Operation.LOAD_FAST, handlers)
+def _(frame: 'Frame', slot: int, i: int) -> int:
+    frame.stack[frame.sp] = frame.locals[slot]
+    frame.sp += 1
+    return i + 1
+
+
+@handles(Operation.JUMP, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    return i + delta
+
+
+@handles(Operation.JUMP_IF_FALSE, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    frame.sp -= 1
+
+    if not frame.stack[frame.sp]:
+        return i + delta
+
+    return i + 1
+
+
+@handles(Operation.RETURN, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.result = None
+    return HALT
+
+
+@handles(Operation.RETURN_VALUE, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.sp -= 1
+    frame.result = frame.stack[frame.sp]
+    return HALT
+
+
+@handles(Operation.SETUP_LOOP, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.blocks.append(frame.sp)
+    return i + 1
+
+
+@handles(Operation.CLEAR_LOOP, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.sp = frame.blocks.pop()
+    return i + 1
+
+
+@handles(Operation.APPEND, handlers)
+def _(frame: 'Frame', offset: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+    stack[sp + offset].append(stack[sp - 1])
+    frame.sp = sp - 1
+    return i + 1
+
+
+@handles(Operation.LEN, handlers)
+def _(frame: 'Frame', offset: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+    stack[sp] = len(stack[sp + offset])
+    frame.sp = sp + 1
+    return i + 1
+
+
+@handles(Operation.MAKE_LIST, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack[frame.sp] = []
+    frame.sp += 1
+    return i + 1
+
+
+@handles(Operation.MAKE_ARRAY, handlers)
+def _(frame: 'Frame', element: Optional[str], i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+    stack[sp - 1] = std.array(stack[sp - 1], element)
+    return i + 1
+
+
+@handles(Operation.MAKE_ENUMERATE, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 2
+    stack[sp - 1] = iter(range(stack[sp - 1], stack[sp], stack[sp + 1]))
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.MAKE_SLICE, handlers)
+def _(frame: 'Frame', n_bounds: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+
+    if n_bounds == 0:
+        stack[sp] = whole
+        frame.sp = sp + 1
+        return i + 1
+
+    sp -= 2
+    stack[sp - 1] = slice(stack[sp - 1], stack[sp], stack[sp + 1])
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.MAKE_CONST_SEQUENCE, handlers)
+def _(frame: 'Frame', value: Any, i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+    stack[sp - 1] = (value for _ in range(stack[sp - 1]))
+    return i + 1
+
+
+@handles(Operation.ITER_NEXT, handlers)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> int:
+    offset, jump = argument
+    stack, sp = frame.stack, frame.sp
+
+    element = next(stack[sp + offset], exhausted)
+
+    if element is exhausted:
+        return i + jump
+
+    stack[sp] = element
+    frame.sp = sp + 1
+    return i + 1
+
+
+@handles(Operation.FOR_RANGE_INIT, handlers)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> int:
+    slot, exit = argument
+    stack, sp = frame.stack, frame.sp - 3
+
+    counter = iter(range(stack[sp], stack[sp + 1], stack[sp + 2]))
+    element = next(counter, exhausted)
+
+    if element is exhausted:
+        frame.sp = sp
+        return i + exit
+
+    frame.locals[slot] = counter
+
+    stack[sp] = element
+    frame.sp = sp + 1
+    return i + 1
+
+
+@handles(Operation.FOR_RANGE_STEP, handlers)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> int:
+    slot, body = argument
+    element = next(frame.locals[slot], exhausted)
+
+    if element is exhausted:
+        return i + 1
+
+    frame.stack[frame.sp] = element
+    frame.sp += 1
+    return i + body
+
+
+@handles(Operation.SUBSCRIPT_READ, handlers)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - n_indices
+    deref = stack[sp - 1]
+
+    if type(deref) is not list:
+        stack[sp - 1] = std.read(deref, stack[sp:sp + n_indices])
+        frame.sp = sp
+        return i + 1
+
+    for k in range(sp + n_indices - 1, sp - 1, -1):
+        deref = deref[stack[k] - 1]
+
+    stack[sp - 1] = deref
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.SUBSCRIPT_WRITE, handlers)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - n_indices - 2
+    deref = stack[sp]
+
+    if type(deref) is not list:
+        std.write(deref, stack[sp + 1:sp + n_indices + 1], stack[sp + n_indices + 1])
+        frame.sp = sp
+        return i + 1
+
+    for k in range(sp + n_indices, sp + 1, -1):
+        deref = deref[stack[k] - 1]
+
+    deref[stack[sp + 1] - 1] = stack[sp + n_indices + 1]
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.SLICE_READ, handlers)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - n_indices
+    stack[sp - 1] = std.select(stack[sp - 1], stack[sp:sp + n_indices])
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.SLICE_WRITE, handlers)
+def _(frame: 'Frame', n_indices: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - n_indices - 2
+    std.assign(stack[sp], stack[sp + 1:sp + n_indices + 1], stack[sp + n_indices + 1])
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.CALL, handlers)
+def _(frame: 'Frame', n_args: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - n_args - 1
+    callee, value = frame.vm.call(stack[sp + n_args], stack[sp:sp + n_args])
+
+    if callee is None:
+        stack[sp] = value
+        frame.sp = sp + 1
+        return i + 1
+
+    frame.sp = sp
+    frame.callee = callee
+    frame.resume = i + 1
+    return HALT
+
+
+@handles(Operation.DEFINE_FUNCTION, handlers)
+def _(frame: 'Frame', function: 'FunctionCode', i: int) -> int:
+    frame.vm.define(function)
+    return i + 1
+
+
+@handles(Operation.BINARY_OP, handlers)
+def _(frame: 'Frame', operator: str, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 1
+    stack[sp - 1] = std.binary_ops[operator](stack[sp - 1], stack[sp])
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.UNARY_OP, handlers)
+def _(frame: 'Frame', operator: str, i: int) -> int:
+    stack, sp = frame.stack, frame.sp
+    stack[sp - 1] = std.unary_ops[operator](stack[sp - 1])
+    return i + 1
+
+
+@handles(Operation.BINARY_ADD_INT, handlers)
+@handles(Operation.BINARY_ADD_FLOAT, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 1
+    stack[sp - 1] = stack[sp - 1] + stack[sp]
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.BINARY_SUBTRACT_INT, handlers)
+@handles(Operation.BINARY_SUBTRACT_FLOAT, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 1
+    stack[sp - 1] = stack[sp - 1] - stack[sp]
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.BINARY_MULTIPLY_INT, handlers)
+@handles(Operation.BINARY_MULTIPLY_FLOAT, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 1
+    stack[sp - 1] = stack[sp - 1] * stack[sp]
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.BINARY_DIVIDE_FLOAT, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 1
+    stack[sp - 1] = stack[sp - 1] / stack[sp]
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.BINARY_MODULO_INT, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 1
+    stack[sp - 1] = stack[sp - 1] % stack[sp]
+    frame.sp = sp
+    return i + 1
+
+
+@handles(Operation.JUMP_UNLESS_LT_INT, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 2
+    frame.sp = sp
+
+    if stack[sp] < stack[sp + 1]:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_LE_INT, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 2
+    frame.sp = sp
+
+    if stack[sp] <= stack[sp + 1]:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_GT_INT, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 2
+    frame.sp = sp
+
+    if stack[sp] > stack[sp + 1]:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_GE_INT, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 2
+    frame.sp = sp
+
+    if stack[sp] >= stack[sp + 1]:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_EQ_INT, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 2
+    frame.sp = sp
+
+    if stack[sp] == stack[sp + 1]:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.JUMP_UNLESS_NE_INT, handlers)
+def _(frame: 'Frame', delta: int, i: int) -> int:
+    stack, sp = frame.stack, frame.sp - 2
+    frame.sp = sp
+
+    if stack[sp] != stack[sp + 1]:
+        return i + 1
+
+    return i + delta
+
+
+@handles(Operation.INCREMENT, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack[frame.sp - 1] += 1
+    return i + 1
+
+
+@handles(Operation.DECREMENT, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    frame.stack[frame.sp - 1] -= 1
+    return i + 1
+
+
+@handles(Operation.PRINT, handlers)
+def _(frame: 'Frame', n_args: int, i: int) -> int:
+    sp = frame.sp
+    print(*frame.stack[sp - n_args:sp], sep='\n')
+    return i + 1
+
+
+@handles(Operation.PRINT_STACK, handlers)
+def _(frame: 'Frame', _: None, i: int) -> int:
+    print(*frame.stack[:frame.sp], sep='\n')
+    return i + 1
@@ -0,0 +1,97 @@
+from typing import Any
+from array import array
+from operator import mul, add
+import virtual_machine.ndarrays as ndarrays
+from virtual_machine.compact import Matrix
+
+#=
+# Matrix products, `*` of two operands the type checker resolved to matrices.
+# The pure-Python kernel works on flat row-major buffers in tiles of BLOCK x BLOCK: a tile of
+# the right operand's columns is sliced out once and reused by every row of the left one,
+# each dot product is a single `sum(map(mul, ...))` running in C. With NumPy installed, products
+# of at least CROSSOVER multiply-adds are handed to `numpy.matmul` - and BLAS - instead,
+# compact buffers without a copy. `benchmark/products.py` measures where the two cross.
+# The result has the representation of the operands, nested lists give nested lists.
+# Both operands have to be matrices, a vector is no n x 1 matrix - in every representation.
+# =#
+
+BLOCK = 64
+
+dtypes = { 'q': 'int64', 'd': 'float64' }  # of the buffers' typecodes
+
+CROSSOVER = 2 ** 3  # multiply-adds, measured: 9 us a 2 x 2 product through NumPy, 13 us blocked - level at 1 x 1
+
+
+def blocked(left: array, right: array, rows: int, inner: int, columns: int, typecode: str) -> array:
+    '''(rows x inner) * (inner x columns) of row-major buffers.'''
+
+    result = array(typecode, [0]) * (rows * columns)
+
+    for first in range(0, columns, BLOCK):
+        last = min(first + BLOCK, columns)
+        whole = [right[j::columns] for j in range(first, last)]  # columns of the tile, all of the inner dimension
+
+        for start in range(0, inner, BLOCK):
+            end = min(start + BLOCK, inner)
+            tile = [column[start:end] for column in whole]
+
+            for i in range(rows):
+                row = left[i * inner + start:i * inner + end]
+                at = i * columns
+
+                partial = [sum(map(mul, row, column)) for column in tile]
+                result[at + first:at + last] = array(typecode, map(add, result[at + first:at + last], partial))
+
+    return result
+
+
+def native(left: array, right: array, rows: int, inner: int, columns: int, typecode: str) -> array:
+    numpy = ndarrays.numpy
+
+    a = numpy.frombuffer(left, dtype=dtypes[left.typecode]).reshape(rows, inner)  # views of the buffers, no copy
+    b = numpy.frombuffer(right, dtype=dtypes[right.typecode]).reshape(inner, columns)
+
+    result = array(typecode)
+    result.frombytes(numpy.matmul(a, b).astype(dtypes[typecode], copy=False).tobytes())
+
+    return result
+
+
+def flat(matrix: Matrix) -> array:
+    if matrix.contiguous and matrix.offset == 0 and len(matrix.buffer) == matrix.size:
+        return matrix.buffer
+
+    return array(matrix.buffer.typecode, matrix.elements())
+
+
+def multiply(left: Matrix, right: Matrix) -> Matrix:
+    (rows, inner), (height, columns) = left.shape, right.shape
+
+    if inner != height:
+        raise ValueError(f'Cannot multiply matrices of shapes {left.shape} and {right.shape}')
+
+    typecode = 'd' if 'd' in (left.buffer.typecode, right.buffer.typecode) else 'q'
+    kernel = native if ndarrays.available and rows * inner * columns >= CROSSOVER else blocked
+
+    return Matrix(kernel(flat(left), flat(right), rows, inner, columns, typecode), (rows, columns))
+
+
+def product(left: Any, right: Any) -> Any:
+    if ndarrays.available and (type(left) is ndarrays.ndarray or type(right) is ndarrays.ndarray):
+        if ndarrays.numpy.ndim(left) != 2 or ndarrays.numpy.ndim(right) != 2:
+            raise TypeError(f'Cannot multiply {left!r} and {right!r} as matrices')
+
+        return ndarrays.numpy.matmul(left, right)
+
+    result = multiply(as_matrix(left), as_matrix(right))
+
+    return result if isinstance(left, Matrix) or isinstance(right, Matrix) else result.tolist()
+
+
+def as_matrix(value: Any) -> Matrix:
+    matrix = value if isinstance(value, Matrix) else Matrix.of(value)
+
+    if not isinstance(matrix, Matrix) or len(matrix.shape) != 2:
+        raise TypeError(f'Cannot multiply {value!r} as a matrix')
+
+    return matrix
@@ -0,0 +1,104 @@
+import json
+from typing import Any
+from virtual_machine.bytecode import Operation
+
+#=
+# Opcode-level profile of a VM run.
+# `VirtualMachine.run(profile=...)` executes in an instrumented loop timing every handler call,
+# so each instruction index gets an execution count and a cumulative wall time in nanoseconds.
+# Every function called gets a profile of its own, nested under the program's.
+# The clock reads add to every instruction, times are for comparison, not absolute.
+# =#
+
+
+class Profile:
+    operations: list[Operation]  # per index of the profiled code
+    counts: list[int]
+    times: list[int]  # cumulative nanoseconds
+    functions: dict[str, 'Profile']  # of every function called, by name
+    attached: list[int]  # opcodes of the code, to recognize it again
+
+    def __init__(self) -> None:
+        self.operations = []
+        self.counts = []
+        self.times = []
+        self.functions = dict()
+        self.attached = []
+
+    def attach(self, opcodes: list[int]) -> None:
+        if opcodes is self.attached:  # another call of the same code
+            return
+
+        operations = [Operation(opcode) for opcode in opcodes]
+
+        if len(self.operations) == 0:
+            self.operations = operations
+            self.counts = [0] * len(operations)
+            self.times = [0] * len(operations)
+
+        elif operations != self.operations:
+            raise ValueError('A profile covers a single code object')
+
+        self.attached = opcodes
+
+    def function(self, name: str) -> 'Profile':
+        if name not in self.functions:
+            self.functions[name] = Profile()
+
+        return self.functions[name]
+
+    @property
+    def total(self) -> int:
+        return sum(self.times) + sum(function.total for function in self.functions.values())
+
+    def by_opcode(self) -> dict[Operation, tuple[int, int]]:
+        '''Operation -> (count, nanoseconds) over the program & its functions, most expensive first.'''
+
+        summary = dict()
+
+        for op, count, time in zip(self.operations, self.counts, self.times):
+            previous = summary.get(op, (0, 0))
+            summary[op] = (previous[0] + count, previous[1] + time)
+
+        for function in self.functions.values():
+            for op, (count, time) in function.by_opcode().items():
+                previous = summary.get(op, (0, 0))
+                summary[op] = (previous[0] + count, previous[1] + time)
+
+        return dict(sorted(summary.items(), key=lambda item: item[1][1], reverse=True))
+
+    def annotation(self, i: int) -> str:
+        return f'{self.counts[i]:>10} {self.times[i] / 1000:>12.1f} us  '
+
+    def export(self) -> dict[str, Any]:
+        return {
+            'total_ns': self.total,
+            'opcodes': {
+                op.__repr__(): { 'count': count, 'time_ns': time }
+                for op, (count, time) in self.by_opcode().items()
+            },
+            'instructions': [
+                { 'index': i, 'op': op.__repr__(), 'count': count, 'time_ns': time }
+                for i, (op, count, time) in enumerate(zip(self.operations, self.counts, self.times))
+            ],
+            'functions': {
+                name: function.export()
+                for name, function in self.functions.items()
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.export(), indent=4)
+
+    def collapsed(self, root: str = 'program') -> str:
+        '''Collapsed-stack lines for flamegraph tools: root;opcode;index nanoseconds,
+        root;function;opcode;index for the code of a function.'''
+
+        return ''.join(
+            f'{root};{op.__repr__()};{i} {time}\n'
+            for i, (op, time) in enumerate(zip(self.operations, self.times))
+            if time > 0
+        ) + ''.join(
+            function.collapsed(f'{root};{name}')
+            for name, function in self.functions.items()
+        )
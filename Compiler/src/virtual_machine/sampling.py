@@ -0,0 +1,104 @@
+import signal
+from types import CodeType, FrameType
+from typing import Any, Callable, Optional
+from virtual_machine.code_object import CodeObject, LineTable, line_at
+
+#=
+# Sampling profiler of the VM.
+# A CPU-time interval timer (SIGPROF) interrupts the interpreter at a fixed rate, the handler
+# walks the Python stack up to the innermost engine loop and reads the index of the instruction
+# it is executing from the loop's own local variable. The loops themselves carry no instrumentation,
+# so the cost is one short handler call per sample, whatever the engine.
+# Sample counts per instruction are mapped to source lines through the code's line table.
+# =#
+
+loops: dict[CodeType, tuple[str, str]] = dict()  # code of an engine loop -> (index variable, frame variable)
+
+
+def sampled(function: Callable, *, index: str = 'i', frame: str = 'self') -> Callable:
+    loops[function.__code__] = (index, frame)
+    return function
+
+
+class Sampler:
+    interval: float  # seconds of CPU time between samples
+    samples: dict[tuple[int, int], int]  # (id of the code, instruction index) -> samples
+    codes: dict[int, list[Any] | CodeObject]
+    missed: int  # samples taken outside any engine loop (compilation, printing)
+    previous: Any  # the SIGPROF handler to restore
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.samples = dict()
+        self.codes = dict()
+        self.missed = 0
+        self.previous = None
+
+    def sample(self, signum: int, frame: Optional[FrameType]) -> None:
+        while frame is not None:
+            names = loops.get(frame.f_code)
+
+            if names is not None:
+                variables = frame.f_locals
+                i, owner = variables.get(names[0]), variables.get(names[1])
+
+                if isinstance(i, int) and owner is not None:  # set up already
+                    code = owner.code
+                    key = (id(code), i)
+
+                    self.codes[id(code)] = code
+                    self.samples[key] = self.samples.get(key, 0) + 1
+                    return
+
+            frame = frame.f_back
+
+        self.missed += 1
+
+    def start(self) -> None:
+        if not hasattr(signal, 'setitimer'):
+            raise NotImplementedError('Sampling needs POSIX interval timers')
+
+        self.previous = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previous)
+
+    def __enter__(self) -> 'Sampler':
+        self.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.stop()
+
+    @property
+    def total(self) -> int:
+        return sum(self.samples.values()) + self.missed
+
+    def hot_lines(self, table: Optional[LineTable] = None) -> list[tuple[Optional[int], int]]:
+        '''(source line, samples), hottest first. Code lists have no table of their own, `table` stands in.'''
+
+        counts = dict()
+
+        for (code_id, i), samples in self.samples.items():
+            code = self.codes[code_id]
+            line = code.line(i) if isinstance(code, CodeObject) else line_at(table or [], i)
+
+            counts[line] = counts.get(line, 0) + samples
+
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)
+
+    def report(self, source: Optional[str] = None, table: Optional[LineTable] = None, limit: int = 10) -> str:
+        text = source.splitlines() if source is not None else []
+        total = max(self.total, 1)
+
+        lines = [f'{"line":>6}{"samples":>10}{"%":>8}']
+
+        for line, samples in self.hot_lines(table)[:limit]:
+            code = text[line - 1].strip() if line is not None and 0 < line <= len(text) else ''
+            lines.append(f'{line if line is not None else "?":>6}{samples:>10}{100 * samples / total:>7.1f}%  {code}')
+
+        lines.append(f'{self.total} samples, {self.missed} outside the VM')
+
+        return '\n'.join(lines)
@@ -0,0 +1,60 @@
+from typing import Any
+
+#=
+# Slices in subscripts, `A[2:5, 1]` or `A[:, j]`.
+# A range written as an index selects the very indices it would iterate - `2:5` is 2, 3 & 4 -
+# and becomes a `slice` of its bounds at run time, a lone `:` the `whole` dimension.
+# Indices keep the order they are applied in, the last one selects the row.
+# Nested lists are sliced by copying, other representations bring their own `select` & `assign`.
+# =#
+
+whole = slice(None)
+
+
+def span(index: slice, extent: int) -> range:
+    '''0-based positions selected by `index` in a dimension of `extent` elements.'''
+
+    if index.start is None:
+        return range(extent)
+
+    positions = range(index.start - 1, index.stop - 1, index.step)
+
+    if len(positions) > 0 and not (0 <= positions[0] < extent and 0 <= positions[-1] < extent):
+        raise IndexError(f'Slice {index.start}:{index.stop} out of range of {extent} elements')
+
+    return positions
+
+
+def select(source: list[Any], indices: list[int | slice]) -> list[Any] | Any:
+    *rest, index = indices
+
+    if type(index) is not slice:
+        element = source[index - 1]
+        return select(element, rest) if rest else element
+
+    selected = [source[position] for position in span(index, len(source))]
+
+    if rest:
+        return [select(element, rest) for element in selected]
+
+    return [list(element) if type(element) is list else element for element in selected]  # rows are copied too
+
+
+def assign(target: list[Any], indices: list[int | slice], element: Any) -> None:
+    *rest, index = indices
+
+    if type(index) is not slice:
+        positions, values = [index - 1], [element]
+
+    else:
+        positions = span(index, len(target))
+        values = element if type(element) is list else [element] * len(positions)  # a scalar fills the slice
+
+        if len(values) != len(positions):
+            raise ValueError(f'Cannot assign {len(values)} elements to a slice of {len(positions)}')
+
+    for position, value in zip(positions, list(values)):  # `values` may be a part of `target`
+        if rest:
+            assign(target[position], rest, value)
+        else:
+            target[position] = list(value) if type(value) is list else value
@@ -0,0 +1,31 @@
+from typing import Sequence
+from syntax_tree.structure.nodes import Node, Scope, Function
+
+#=
+# Resolution of variables to frame slots.
+# Every name defined in a scope of the compiled unit gets a fixed index into
+# the frame's preallocated `locals` list. Scopes of nested functions are skipped,
+# they will be frames of their own.
+# =#
+
+
+def scopes(node: Node) -> Sequence[Scope]:
+    if node.defines_scope and node.scope is not None:
+        yield node.scope
+
+    for child in node.children:
+        if child is node.parent or isinstance(child, Function):  # children also lists the parent link
+            continue
+
+        yield from scopes(child)
+
+
+def resolve(node: Node) -> dict[str, int]:
+    slots = dict()
+
+    for scope in scopes(node):
+        for identifier in scope.symbols:
+            if identifier.name not in slots:
+                slots[identifier.name] = len(slots)
+
+    return slots
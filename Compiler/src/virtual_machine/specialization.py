@@ -0,0 +1,100 @@
+from typing import Optional
+from virtual_machine.bytecode import Operation
+from syntax_tree.structure.nodes import Expression, BinaryExpression, Identifier, Assignment
+from semantics.types import Type, int32, float64, matrix_int32, matrix_float64
+from semantics import dispatch
+
+#=
+# Selection of type-specialized opcodes.
+# Once `check_types` has resolved both operands of a binary expression to numeric primitives,
+# the generic BINARY_OP (a dict lookup and a lambda call per execution) gives way to an opcode
+# doing the arithmetic inline. Conditions of `if` & `while` comparing two int32 values
+# fuse the comparison with the conditional jump.
+# Specialized handlers apply the very Python operators of `stdlib.binary_ops`,
+# so a stale static type may only miss a specialization, never change a result.
+# `*` of two matrices is their product, the generic operator '@' - `*` of untyped values
+# decides at run time, a product of two arrays, element by element with a scalar.
+# =#
+
+numeric = { int32, float64 }
+
+matrices = { matrix_int32, matrix_float64 }
+
+arithmetic: dict[tuple[str, Type], Operation] = {  # (operator, result type) -> opcode
+    ('+', int32): Operation.BINARY_ADD_INT,
+    ('+', float64): Operation.BINARY_ADD_FLOAT,
+    ('-', int32): Operation.BINARY_SUBTRACT_INT,
+    ('-', float64): Operation.BINARY_SUBTRACT_FLOAT,
+    ('*', int32): Operation.BINARY_MULTIPLY_INT,
+    ('*', float64): Operation.BINARY_MULTIPLY_FLOAT,
+    ('/', float64): Operation.BINARY_DIVIDE_FLOAT,
+    ('%', int32): Operation.BINARY_MODULO_INT,
+}
+
+comparisons: dict[str, Operation] = {  # operator -> jump taken when the comparison fails
+    '<': Operation.JUMP_UNLESS_LT_INT,
+    '<=': Operation.JUMP_UNLESS_LE_INT,
+    '>': Operation.JUMP_UNLESS_GT_INT,
+    '>=': Operation.JUMP_UNLESS_GE_INT,
+    '==': Operation.JUMP_UNLESS_EQ_INT,
+    '!=': Operation.JUMP_UNLESS_NE_INT,
+}
+
+
+def binary(node: BinaryExpression) -> Optional[Operation]:
+    if node.left.type not in numeric or node.right.type not in numeric:
+        return None
+
+    return arithmetic.get((node.operator, node.type))
+
+
+def operator(node: BinaryExpression) -> str:
+    '''Of the generic BINARY_OP.'''
+
+    if node.operator == '*' and node.left.type in matrices and node.right.type in matrices:
+        return '@'
+
+    return node.operator
+
+
+def compound_operator(node: Assignment) -> str:
+    operator = node.operator[0]
+
+    if operator == '*' and isinstance(node.left, Identifier) and declared_type(node.left) in matrices and node.right.type in matrices:
+        return '@'
+
+    return operator
+
+
+def declared_type(identifier: Identifier) -> Optional[Type]:
+    # the checker re-types the target of an assignment with the type of its right side,
+    # the variable's own type is the one of its defining occurrence
+    for scope in identifier.superscopes:
+        type = scope.type(identifier.name)
+
+        if type is not None:
+            return type
+
+    return None
+
+
+def compound(node: Assignment) -> Optional[Operation]:
+    operator = node.operator[0]
+    left, right = declared_type(node.left), node.right.type
+
+    if left not in numeric or right not in numeric:
+        return None
+
+    result = dispatch.expressions['binary'][operator].get((left, right))
+
+    return arithmetic.get((operator, result))
+
+
+def compare_and_jump(node: Expression) -> Optional[Operation]:
+    if not isinstance(node, BinaryExpression):
+        return None
+
+    if node.left.type != int32 or node.right.type != int32:
+        return None
+
+    return comparisons.get(node.operator)
@@ -1,19 +1,210 @@
-from typing import Callable, Any
-from virtual_machine.bytecode import Operation
+from typing import Callable, Any, Optional
+from dataclasses import dataclass
+import virtual_machine.ndarrays as ndarrays
+import virtual_machine.compact as compact
+import virtual_machine.products as products
+import virtual_machine.slicing as slicing
+
+#=
+# Vectors & matrices are nested lists unless another representation is selected with `use`,
+# MAKE_ARRAY turns every literal into it. Values of another representation bring their own
+# kernels, registered by type in `arrays` - subscripts, equality & broadcasts of lists stay as they are.
+# =#
+
+
+@dataclass
+class Kernels:
+    read: Callable[[Any, list[int]], Any]
+    write: Callable[[Any, list[int], Any], None]
+    equal: Callable[[Any, Any], bool]
+    broadcast: Callable[[Callable[[Any, Any], Any], Any, Any], Any]  # (scalar function, left, right)
+    transpose: Callable[[Any], Any]
+    select: Callable[[Any, list[int | slice]], Any]  # read & write, slices among the indices
+    assign: Callable[[Any, list[int | slice], Any], None]
+
+
+arrays: dict[type, Kernels] = {
+    compact.Matrix: Kernels(
+        compact.Matrix.read,
+        compact.Matrix.write,
+        compact.equal,
+        compact.broadcast,
+        compact.Matrix.transpose,
+        compact.Matrix.select,
+        compact.Matrix.assign
+    ),
+}
+
+if ndarrays.available:
+    arrays[ndarrays.ndarray] = Kernels(
+        ndarrays.read,
+        ndarrays.write,
+        ndarrays.equal,
+        lambda function, left, right: function(left, right),  # NumPy operators are element-wise already
+        ndarrays.transpose,
+        ndarrays.select,
+        ndarrays.assign
+    )
+
+@dataclass
+class Representation:
+    array: Callable[[Any, Optional[str]], Any]  # a value from nested lists, a handle of a folded constant if `shares`
+    filled: Callable[[int, int, int], Any]  # rows, columns, value
+    identity: Callable[[int], Any]
+    shares: bool  # constants may be folded, MAKE_ARRAY hands out copy-on-write handles of them
+
+
+representations: dict[str, Representation] = {
+    'list': Representation(
+        lambda values, element: values,
+        lambda rows, columns, value: [[value] * columns for _ in range(rows)],
+        lambda n: [[int(row == column) for column in range(n)] for row in range(n)],
+        False  # a nested list would have to be copied whole
+    ),
+    'compact': Representation(
+        compact.build,
+        lambda rows, columns, value: compact.Matrix.filled((rows, columns), value),
+        compact.Matrix.identity,
+        True
+    ),
+    'numpy': Representation(ndarrays.array, ndarrays.filled, ndarrays.identity, False),
+}
+
+representation = 'list'
+array = representations[representation].array
+
+
+def use(name: str) -> None:
+    '''Selects the representation MAKE_ARRAY builds vectors & matrices in.'''
+
+    global representation, array
+
+    if name not in representations:
+        raise ValueError(f'Unknown array representation {name}')
+
+    if name == 'numpy' and not ndarrays.available:
+        raise ModuleNotFoundError('The numpy representation needs NumPy installed')
+
+    representation = name
+    array = representations[name].array
+
+
+def read(source: Any, indices: list[int]) -> Any:
+    kernels = arrays.get(type(source))
+
+    if kernels is not None:
+        return kernels.read(source, indices)
+
+    for index in reversed(indices):
+        source = source[index - 1]
+
+    return source
+
+
+def write(source: Any, indices: list[int], element: Any) -> None:
+    kernels = arrays.get(type(source))
+
+    if kernels is not None:
+        kernels.write(source, indices, element)
+        return
+
+    for index in reversed(indices[1:]):
+        source = source[index - 1]
+
+    source[indices[0] - 1] = element
+
+
+def select(source: Any, indices: list[int | slice]) -> Any:
+    kernels = arrays.get(type(source))
+
+    if kernels is not None:
+        return kernels.select(source, indices)
+
+    return slicing.select(source, indices)
+
+
+def assign(source: Any, indices: list[int | slice], element: Any) -> None:
+    kernels = arrays.get(type(source))
+
+    if kernels is not None:
+        kernels.assign(source, indices, element)
+        return
+
+    slicing.assign(source, indices, element)
+
+
+def equal(left: Any, right: Any) -> bool:
+    kernels = arrays.get(type(left)) or arrays.get(type(right))
+
+    if kernels is None:
+        return left == right
+
+    return kernels.equal(left, right)
+
 
 def make_broadcast(bases: dict[str, Callable[[Any, Any], Any]], operator: str) -> Callable[[list[Any], list[Any]], list[Any]]:
-    def broadcast(l1: list[Any], l2: list[Any]):
-        if isinstance(l1, list):
-            return [
-                broadcast(e1, e2) 
-                for e1, e2 in zip(l1, l2)
-            ]
-        
-        function = bases[operator]
-
-        return [function(e1, e2) for e1, e2 in zip(l1, l2)]
+    function = bases[operator]
+
+    def broadcast(l1: list[Any] | Any, l2: list[Any] | Any):
+        match (isinstance(l1, list), isinstance(l2, list)):
+            case (True, True):
+                return [
+                    broadcast(e1, e2) 
+                    for e1, e2 in zip(l1, l2)
+                ]
+
+            case (True, False):
+                return [broadcast(e1, l2) for e1 in l1]
+
+            case (False, True):
+                return [broadcast(l1, e2) for e2 in l2]
+
+        return function(l1, l2)
+
+    def vectorized(l1: list[Any] | Any, l2: list[Any] | Any):
+        kernels = arrays.get(type(l1)) or arrays.get(type(l2))
+
+        if kernels is None:
+            return broadcast(l1, l2)
+
+        return kernels.broadcast(function, l1, l2)
     
-    return broadcast
+    return vectorized
+
+
+def negate(x: list[Any] | Any) -> list[Any] | Any:
+    if isinstance(x, list):
+        return [negate(e) for e in x]
+
+    return -x
+
+
+def transpose(x: list[Any] | Any) -> list[Any] | Any:
+    kernels = arrays.get(type(x))
+
+    if kernels is not None:
+        return kernels.transpose(x)
+
+    if len(x) > 0 and isinstance(x[0], list):
+        return [list(column) for column in zip(*x)]
+
+    return [[element] for element in x]  # a vector becomes a column
+
+
+scalars = { int, float, bool }
+
+
+def multiply(x: Any, y: Any) -> Any:
+    '''`*` of untyped values, alike in every representation - a matrix product of two arrays,
+    element by element with a scalar.'''
+
+    if type(x) in scalars and type(y) in scalars:  # the common case
+        return x * y
+
+    if type(x) in scalars or type(y) in scalars:
+        return broadcasts['.*'](x, y)
+
+    return products.product(x, y)
 
 
 binary_ops = {
@@ -25,8 +216,8 @@ binary_ops = {
     'and': lambda x, y: x and y,
     'or': lambda x, y: x or y,
     'xor': lambda x, y: x ^ y,
-    '==': lambda x, y: x == y,
-    '!=': lambda x, y: x != y,
+    '==': equal,
+    '!=': lambda x, y: not equal(x, y),
     '<': lambda x, y: x < y,
     '>': lambda x, y: x > y,
     '<=': lambda x, y: x <= y,
@@ -40,9 +231,43 @@ broadcasts = {
 
 binary_ops = {
     **binary_ops,
-    **broadcasts
+    **broadcasts,
+    '*': multiply,  # untyped, the broadcast `.*` keeps the plain operator for the elements
+    '@': products.product,  # `*` of two matrices, chosen by the code generator from their types
 }
 
+unary_ops = {
+    '-': negate,
+    "'": transpose,
+    'not': lambda x: not x,
+}
+
+
+def display(*values: Any) -> None:
+    print(*values, sep='\n')
+
+
+def zeros(rows: int, columns: Optional[int] = None) -> Any:
+    return representations[representation].filled(rows, rows if columns is None else columns, 0)
+
+
+def ones(rows: int, columns: Optional[int] = None) -> Any:
+    return representations[representation].filled(rows, rows if columns is None else columns, 1)
+
+
+def eye(n: int) -> Any:
+    return representations[representation].identity(n)
+
+
+builtins = {  # called by name unless the program defines a function of its own
+    'print': display,
+    'zeros': zeros,
+    'ones': ones,
+    'eye': eye,
+}
+
+constructors = { 'zeros', 'ones', 'eye' }  # builtins without effects, evaluated by the compiler for constant arguments
+
 
 class Iterator:
     gen: Callable[[int], Any]
@@ -64,184 +289,3 @@ class Iterator:
             self.exhausted = True
 
         return element
-
-
-make_zeros = [  # m & n lay on stack
-    (Operation.STORE_NAME, 'm'),
-    (Operation.STORE_NAME, 'n'),
-
-    (Operation.MAKE_LIST),
-
-    (Operation.PUSH, lambda x: x),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'n'),
-    (Operation.MAKE_ITER),
-
-    (Operation.ITER_NEXT, -1, 14),
-    (Operation.POP),
-    (Operation.MAKE_LIST),
-
-    (Operation.PUSH, lambda x: x),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'm'),
-    (Operation.MAKE_ITER),
-
-    (Operation.ITER_NEXT, -1, 5),
-    (Operation.POP),
-    (Operation.PUSH, 0),
-    (Operation.APPEND, -3),
-    (Operation.JUMP, -4),
-
-    (Operation.APPEND, -3),
-    (Operation.JUMP, -13),
-
-    Operation.RETURN
-]
-
-make_zeros_vector = [
-    (Operation.STORE_NAME, 'n'),
-
-    (Operation.PUSH, lambda _: 0),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'n'),
-    (Operation.MAKE_ITER),
-
-    (Operation.MAKE_LIST),
-
-    (Operation.ITER_NEXT, -2, 3),
-    (Operation.APPEND, -2),
-    (Operation.JUMP, -2),
-
-    (Operation.RETURN),
-]
-
-make_ones = [  # m & n lay on stack
-    (Operation.STORE_NAME, 'm'),
-    (Operation.STORE_NAME, 'n'),
-
-    (Operation.MAKE_LIST),
-
-    (Operation.PUSH, lambda x: x),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'n'),
-    (Operation.MAKE_ITER),
-
-    (Operation.ITER_NEXT, -1, 14),
-    (Operation.POP),
-    (Operation.MAKE_LIST),
-
-    (Operation.PUSH, lambda x: x),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'm'),
-    (Operation.MAKE_ITER),
-
-    (Operation.ITER_NEXT, -1, 5),
-    (Operation.POP),
-    (Operation.PUSH, 1),
-    (Operation.APPEND, -3),
-    (Operation.JUMP, -4),
-
-    (Operation.APPEND, -3),
-    (Operation.JUMP, -13),
-
-    Operation.RETURN
-]
-
-make_eye = [  # n lay on stack
-    (Operation.STORE_NAME, 'n'),
-
-    (Operation.MAKE_LIST),
-    (Operation.STORE_NAME, 'array'),
-
-    (Operation.PUSH, lambda n: n),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'n'),
-    (Operation.MAKE_ITER),
-
-    # outer loop begin
-    (Operation.PUSH, lambda n: 0),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'n'),
-    (Operation.MAKE_ITER),
-
-    (Operation.MAKE_LIST),
-
-    # inner loop begin
-    (Operation.ITER_NEXT, -2, 3),
-    (Operation.APPEND, -2),
-    (Operation.JUMP, -2),
-    # inner loop end
-
-    (Operation.ITER_NEXT, -2, 8),
-    (Operation.PUSH, 1),
-    (Operation.SUBSCRIPT_WRITE),
-
-    (Operation.LOAD_NAME, 'array'),
-    (Operation.SWAP),
-    (Operation.APPEND, -2),
-    (Operation.STORE_NAME, 'array'),
-    (Operation.JUMP, -15),
-    #outer loop end
-
-    (Operation.LOAD_NAME, 'array'),
-    (Operation.RETURN)
-]
-
-vec_binary = [
-    # implementation
-    (Operation.STORE_NAME, 'operator'),
-
-    (Operation.LEN, -1),
-    (Operation.STORE_NAME, 'len'),
-
-    (Operation.STORE_NAME, 'v1'),
-    (Operation.STORE_NAME, 'v2'),
-
-    (Operation.LOAD_NAME, 'len'),
-    (Operation.PUSH, 'zeros_vec'),
-    (Operation.CALL, 1),
-    (Operation.STORE_NAME, 'result'),
-
-    (Operation.PUSH, lambda n: n),
-    (Operation.PUSH, 0),
-    (Operation.LOAD_NAME, 'len'),
-    (Operation.MAKE_ITER),
-
-    # loop begin
-    (Operation.ITER_NEXT, -1, 21),
-    (Operation.STORE_NAME, 'i'),
-
-    (Operation.LOAD_NAME, 'v1'),
-    (Operation.LOAD_NAME, 'i'),
-    (Operation.SUBSCRIPT_READ),
-    (Operation.SWAP),
-    (Operation.POP),
-    
-    (Operation.LOAD_NAME, 'v2'),
-    (Operation.LOAD_NAME, 'i'),
-    (Operation.SUBSCRIPT_READ),
-    (Operation.SWAP),
-    (Operation.POP),
-
-    (Operation.LOAD_NAME, 'operator'),
-    (Operation.BINARY_OP_TOP),
-
-    (Operation.LOAD_NAME, 'result'),
-    (Operation.SWAP),
-    (Operation.LOAD_NAME, 'i'),
-    (Operation.SWAP),
-    (Operation.SUBSCRIPT_WRITE),
-    (Operation.POP),
-    (Operation.JUMP, -20),
-
-    (Operation.LOAD_NAME, 'result'),
-    (Operation.RETURN),
-]
-
-context = {
-    'zeros': make_zeros,
-    'zeros_vec': make_zeros_vector,
-    'ones': make_ones,
-    'eye': make_eye,
-    'vec_binary': vec_binary,
-}
@@ -0,0 +1,732 @@
+from typing import Any, Callable, Optional
+from virtual_machine.bytecode import Operation
+from virtual_machine.dispatch import HALT, handles, exhausted
+import virtual_machine.stdlib as std
+from virtual_machine.slicing import whole
+
+#=
+# Builders of the closure-threaded engine.
+# At load, every instruction becomes a closure bound to its frame's stack, locals & context,
+# with its operands decoded, its operator function looked up and its jump targets made absolute.
+# Executing an instruction is then a single call without arguments, returning the next index.
+# =#
+
+Instruction = Callable[[], int]
+Builder = Callable[['Frame', Any, int], Instruction]
+
+builders: list[Optional[Builder]] = [None] * (max(op.value for op in Operation) + 1)
+
+
+def thread(frame: 'Frame') -> list[Instruction]:
+    opcodes, arguments = frame.vm.decoded(frame.code, builders)
+
+    return [
+        builders[opcode](frame, argument, i)
+        for i, (opcode, argument) in enumerate(zip(opcodes, arguments))
+    ]
+
+
+def operator(table: dict[str, Callable], name: str) -> Callable:
+    if name not in table:
+        raise NotImplementedError(f'Unknown operator {name}')
+
+    return table[name]
+
+
+@handles(Operation.PUSH, builders)
+def _(frame: 'Frame', value: Any, i: int) -> Instruction:
+    push = frame.stack.append
+    following = i + 1
+
+    def instruction() -> int:
+        push(value)
+        return following
+
+    return instruction
+
+
+@handles(Operation.POP, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    pop = frame.stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        pop()
+        return following
+
+    return instruction
+
+
+@handles(Operation.CLONE, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    push = stack.append
+    following = i + 1
+
+    def instruction() -> int:
+        push(stack[-1])
+        return following
+
+    return instruction
+
+
+@handles(Operation.SWAP, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        stack[-1], stack[-2] = stack[-2], stack[-1]
+        return following
+
+    return instruction
+
+
+@handles(Operation.STORE_NAME, builders)
+def _(frame: 'Frame', name: str, i: int) -> Instruction:
+    context = frame.context
+    pop = frame.stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        context[name] = pop()
+        return following
+
+    return instruction
+
+
+@handles(Operation.LOAD_NAME, builders)
+def _(frame: 'Frame', name: str, i: int) -> Instruction:
+    context = frame.context
+    push = frame.stack.append
+    following = i + 1
+
+    def instruction() -> int:
+        push(context[name])
+        return following
+
+    return instruction
+
+
+@handles(Operation.STORE_FAST, builders)
+def _(frame: 'Frame', slot: int, i: int) -> Instruction:
+    locals = frame.locals
+    pop = frame.stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        locals[slot] = pop()
+        return following
+
+    return instruction
+
+
+@handles(Operation.LOAD_FAST, builders)
+def _(frame: 'Frame', slot: int, i: int) -> Instruction:
+    locals = frame.locals
+    push = frame.stack.append
+    following = i + 1
+
+    def instruction() -> int:
+        push(locals[slot])
+        return following
+
+    return instruction
+
+
+@handles(Operation.JUMP, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    target = i + delta
+
+    def instruction() -> int:
+        return target
+
+    return instruction
+
+
+@handles(Operation.JUMP_IF_FALSE, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    pop = frame.stack.pop
+    target, following = i + delta, i + 1
+
+    def instruction() -> int:
+        if pop():
+            return following
+
+        return target
+
+    return instruction
+
+
+@handles(Operation.RETURN, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    def instruction() -> int:
+        frame.result = None
+        return HALT
+
+    return instruction
+
+
+@handles(Operation.RETURN_VALUE, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    pop = frame.stack.pop
+
+    def instruction() -> int:
+        frame.result = pop()
+        return HALT
+
+    return instruction
+
+
+@handles(Operation.SETUP_LOOP, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack, blocks = frame.stack, frame.blocks
+    following = i + 1
+
+    def instruction() -> int:
+        blocks.append(len(stack))
+        return following
+
+    return instruction
+
+
+@handles(Operation.CLEAR_LOOP, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack, blocks = frame.stack, frame.blocks
+    following = i + 1
+
+    def instruction() -> int:
+        del stack[blocks.pop():]
+        return following
+
+    return instruction
+
+
+@handles(Operation.APPEND, builders)
+def _(frame: 'Frame', offset: int, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        stack[offset].append(pop())
+        return following
+
+    return instruction
+
+
+@handles(Operation.LEN, builders)
+def _(frame: 'Frame', offset: int, i: int) -> Instruction:
+    stack = frame.stack
+    push = stack.append
+    following = i + 1
+
+    def instruction() -> int:
+        push(len(stack[offset]))
+        return following
+
+    return instruction
+
+
+@handles(Operation.MAKE_LIST, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    push = frame.stack.append
+    following = i + 1
+
+    def instruction() -> int:
+        push([])
+        return following
+
+    return instruction
+
+
+@handles(Operation.MAKE_ARRAY, builders)
+def _(frame: 'Frame', element: Optional[str], i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        stack[-1] = std.array(stack[-1], element)  # looked up on every run, `std.use` may select another
+        return following
+
+    return instruction
+
+
+@handles(Operation.MAKE_ENUMERATE, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        step = pop()
+        end = pop()
+        stack[-1] = iter(range(stack[-1], end, step))
+        return following
+
+    return instruction
+
+
+@handles(Operation.MAKE_SLICE, builders)
+def _(frame: 'Frame', n_bounds: int, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    if n_bounds == 0:
+        def instruction() -> int:
+            stack.append(whole)
+            return following
+
+        return instruction
+
+    def instruction() -> int:
+        step = pop()
+        end = pop()
+        stack[-1] = slice(stack[-1], end, step)
+        return following
+
+    return instruction
+
+
+@handles(Operation.MAKE_CONST_SEQUENCE, builders)
+def _(frame: 'Frame', value: Any, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        stack[-1] = (value for _ in range(stack[-1]))
+        return following
+
+    return instruction
+
+
+@handles(Operation.ITER_NEXT, builders)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> Instruction:
+    offset, jump = argument
+    stack = frame.stack
+    push = stack.append
+    target, following = i + jump, i + 1
+
+    def instruction() -> int:
+        element = next(stack[offset], exhausted)
+
+        if element is exhausted:
+            return target
+
+        push(element)
+        return following
+
+    return instruction
+
+
+@handles(Operation.FOR_RANGE_INIT, builders)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> Instruction:
+    slot, exit = argument
+    stack, locals = frame.stack, frame.locals
+    pop = stack.pop
+    target, following = i + exit, i + 1
+
+    def instruction() -> int:
+        step = pop()
+        end = pop()
+        counter = iter(range(stack[-1], end, step))
+
+        element = next(counter, exhausted)
+
+        if element is exhausted:
+            pop()
+            return target
+
+        locals[slot] = counter
+        stack[-1] = element
+        return following
+
+    return instruction
+
+
+@handles(Operation.FOR_RANGE_STEP, builders)
+def _(frame: 'Frame', argument: tuple[int, int], i: int) -> Instruction:
+    slot, body = argument
+    locals = frame.locals
+    push = frame.stack.append
+    target, following = i + body, i + 1
+
+    def instruction() -> int:
+        element = next(locals[slot], exhausted)
+
+        if element is exhausted:
+            return following
+
+        push(element)
+        return target
+
+    return instruction
+
+
+@handles(Operation.SUBSCRIPT_READ, builders)
+def _(frame: 'Frame', n_indices: int, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        indices = stack[-n_indices:]
+        del stack[-n_indices:]
+
+        deref = stack[-1]
+
+        if type(deref) is not list:
+            stack[-1] = std.read(deref, indices)
+            return following
+
+        for index in reversed(indices):
+            deref = deref[index - 1]
+
+        stack[-1] = deref
+        return following
+
+    return instruction
+
+
+@handles(Operation.SUBSCRIPT_WRITE, builders)
+def _(frame: 'Frame', n_indices: int, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        element = pop()
+
+        indices = stack[-n_indices:]
+        del stack[-n_indices:]
+
+        deref = pop()
+
+        if type(deref) is not list:
+            std.write(deref, indices, element)
+            return following
+
+        for index in reversed(indices[1:]):
+            deref = deref[index - 1]
+
+        deref[indices[0] - 1] = element
+        return following
+
+    return instruction
+
+
+@handles(Operation.SLICE_READ, builders)
+def _(frame: 'Frame', n_indices: int, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        indices = stack[-n_indices:]
+        del stack[-n_indices:]
+
+        stack[-1] = std.select(stack[-1], indices)
+        return following
+
+    return instruction
+
+
+@handles(Operation.SLICE_WRITE, builders)
+def _(frame: 'Frame', n_indices: int, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        element = pop()
+
+        indices = stack[-n_indices:]
+        del stack[-n_indices:]
+
+        std.assign(pop(), indices, element)
+        return following
+
+    return instruction
+
+
+@handles(Operation.CALL, builders)
+def _(frame: 'Frame', n_args: int, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    call = frame.vm.call
+    following = i + 1
+
+    def instruction() -> int:
+        name = pop()
+
+        start = len(stack) - n_args
+        arguments = stack[start:]
+        del stack[start:]
+
+        callee, value = call(name, arguments)
+
+        if callee is None:
+            stack.append(value)
+            return following
+
+        frame.callee = callee
+        frame.resume = following
+        return HALT
+
+    return instruction
+
+
+@handles(Operation.DEFINE_FUNCTION, builders)
+def _(frame: 'Frame', function: 'FunctionCode', i: int) -> Instruction:
+    define = frame.vm.define
+    following = i + 1
+
+    def instruction() -> int:
+        define(function)
+        return following
+
+    return instruction
+
+
+@handles(Operation.BINARY_OP, builders)
+def _(frame: 'Frame', name: str, i: int) -> Instruction:
+    function = operator(std.binary_ops, name)
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        right = pop()
+        stack[-1] = function(stack[-1], right)
+        return following
+
+    return instruction
+
+
+@handles(Operation.UNARY_OP, builders)
+def _(frame: 'Frame', name: str, i: int) -> Instruction:
+    function = operator(std.unary_ops, name)
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        stack[-1] = function(stack[-1])
+        return following
+
+    return instruction
+
+
+@handles(Operation.BINARY_ADD_INT, builders)
+@handles(Operation.BINARY_ADD_FLOAT, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        right = pop()
+        stack[-1] = stack[-1] + right
+        return following
+
+    return instruction
+
+
+@handles(Operation.BINARY_SUBTRACT_INT, builders)
+@handles(Operation.BINARY_SUBTRACT_FLOAT, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        right = pop()
+        stack[-1] = stack[-1] - right
+        return following
+
+    return instruction
+
+
+@handles(Operation.BINARY_MULTIPLY_INT, builders)
+@handles(Operation.BINARY_MULTIPLY_FLOAT, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        right = pop()
+        stack[-1] = stack[-1] * right
+        return following
+
+    return instruction
+
+
+@handles(Operation.BINARY_DIVIDE_FLOAT, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        right = pop()
+        stack[-1] = stack[-1] / right
+        return following
+
+    return instruction
+
+
+@handles(Operation.BINARY_MODULO_INT, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    pop = stack.pop
+    following = i + 1
+
+    def instruction() -> int:
+        right = pop()
+        stack[-1] = stack[-1] % right
+        return following
+
+    return instruction
+
+
+@handles(Operation.JUMP_UNLESS_LT_INT, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    pop = frame.stack.pop
+    target, following = i + delta, i + 1
+
+    def instruction() -> int:
+        right = pop()
+
+        if pop() < right:
+            return following
+
+        return target
+
+    return instruction
+
+
+@handles(Operation.JUMP_UNLESS_LE_INT, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    pop = frame.stack.pop
+    target, following = i + delta, i + 1
+
+    def instruction() -> int:
+        right = pop()
+
+        if pop() <= right:
+            return following
+
+        return target
+
+    return instruction
+
+
+@handles(Operation.JUMP_UNLESS_GT_INT, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    pop = frame.stack.pop
+    target, following = i + delta, i + 1
+
+    def instruction() -> int:
+        right = pop()
+
+        if pop() > right:
+            return following
+
+        return target
+
+    return instruction
+
+
+@handles(Operation.JUMP_UNLESS_GE_INT, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    pop = frame.stack.pop
+    target, following = i + delta, i + 1
+
+    def instruction() -> int:
+        right = pop()
+
+        if pop() >= right:
+            return following
+
+        return target
+
+    return instruction
+
+
+@handles(Operation.JUMP_UNLESS_EQ_INT, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    pop = frame.stack.pop
+    target, following = i + delta, i + 1
+
+    def instruction() -> int:
+        right = pop()
+
+        if pop() == right:
+            return following
+
+        return target
+
+    return instruction
+
+
+@handles(Operation.JUMP_UNLESS_NE_INT, builders)
+def _(frame: 'Frame', delta: int, i: int) -> Instruction:
+    pop = frame.stack.pop
+    target, following = i + delta, i + 1
+
+    def instruction() -> int:
+        right = pop()
+
+        if pop() != right:
+            return following
+
+        return target
+
+    return instruction
+
+
+@handles(Operation.INCREMENT, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        stack[-1] += 1
+        return following
+
+    return instruction
+
+
+@handles(Operation.DECREMENT, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        stack[-1] -= 1
+        return following
+
+    return instruction
+
+
+@handles(Operation.PRINT, builders)
+def _(frame: 'Frame', n_args: int, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        print(*stack[-n_args:], sep='\n')
+        return following
+
+    return instruction
+
+
+@handles(Operation.PRINT_STACK, builders)
+def _(frame: 'Frame', _: None, i: int) -> Instruction:
+    stack = frame.stack
+    following = i + 1
+
+    def instruction() -> int:
+        print(*stack, sep='\n')
+        return following
+
+    return instruction
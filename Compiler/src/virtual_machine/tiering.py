@@ -0,0 +1,107 @@
+from typing import Any, Optional
+from virtual_machine.bytecode import jump_operands
+from virtual_machine.dispatch import Handler, handlers as interpreted
+import virtual_machine.threaded as threaded
+
+#=
+# Tiered execution.
+# Frames start in the table-driven interpreter with every jump backwards - a loop's back-edge - counted.
+# Once a back-edge has been taken `threshold` times, the loop (from the jump target to the back-edge)
+# is rebuilt as closures of the threaded engine and execution continues in them right away,
+# on the very same stack & locals. Leaving the region drops back to the interpreter,
+# a later entry into the loop switches again at its first back-edge.
+# Counters are kept per function, so every call of it adds to the same loops.
+# =#
+
+THRESHOLD = 1000
+
+
+class Tiering:
+    '''Tuning & statistics, shared by every frame of a VM.'''
+
+    threshold: int
+    counters: dict[tuple[str, int], int]  # (code name, back-edge index) -> times taken by the interpreter
+    compiled: list[tuple[str, int, int]]  # code name, first & last index of every region recompiled, in order
+
+    def __init__(self, threshold: int = THRESHOLD) -> None:
+        self.threshold = threshold
+        self.counters = dict()
+        self.compiled = []
+
+    def __str__(self) -> str:
+        lines = [f'tiering, threshold of {self.threshold} back-edges: {len(self.compiled)} loop(s) recompiled']
+
+        for (name, back_edge), taken in self.counters.items():
+            lines.append(f'    {name} @{back_edge}: taken {taken} time(s) by the interpreter')
+
+        for name, first, last in self.compiled:
+            lines.append(f'    {name} {first}..{last}: recompiled')
+
+        return '\n'.join(lines)
+
+
+class Tier:
+    '''Loops of one frame's code recompiled so far.'''
+
+    tiering: Tiering
+    name: str
+    opcodes: list[int]
+    arguments: list[Any]
+    regions: dict[int, tuple[int, list[threaded.Instruction]]]  # back-edge index -> (first index, closures)
+
+    def __init__(self, tiering: Tiering, name: str, opcodes: list[int], arguments: list[Any]) -> None:
+        self.tiering = tiering
+        self.name = name
+        self.opcodes = opcodes
+        self.arguments = arguments
+        self.regions = dict()
+
+    def compile(self, frame: 'Frame', first: int, last: int) -> tuple[int, list[threaded.Instruction]]:
+        program = [
+            threaded.builders[self.opcodes[k]](frame, self.arguments[k], k)
+            for k in range(first, last + 1)
+        ]
+
+        self.tiering.compiled.append((self.name, first, last))
+
+        return first, program
+
+    def back_edge(self, frame: 'Frame', i: int, target: int) -> int:
+        region = self.regions.get(i)
+
+        if region is None:
+            key = (self.name, i)
+            count = self.tiering.counters.get(key, 0) + 1
+            self.tiering.counters[key] = count
+
+            if count < self.tiering.threshold:
+                return target
+
+            region = self.regions[i] = self.compile(frame, target, i)
+
+        first, program = region
+        end = first + len(program)
+        pc = target
+
+        while first <= pc < end:
+            pc = program[pc - first]()
+
+        return pc
+
+
+def back_edge(handler: Handler) -> Handler:
+    def counted(frame: 'Frame', argument: Any, i: int) -> int:
+        target = handler(frame, argument, i)
+
+        if target >= i:
+            return target
+
+        return frame.tier.back_edge(frame, i, target)
+
+    return counted
+
+
+handlers: list[Optional[Handler]] = list(interpreted)
+
+for operation in jump_operands:
+    handlers[operation.value] = back_edge(interpreted[operation.value])
@@ -0,0 +1,74 @@
+import json
+from typing import Any, TextIO
+from virtual_machine.bytecode import Operation
+
+#=
+# Tracing interface of the VM.
+# A frame with a tracer attached runs in a separate, instrumented loop calling the hooks below,
+# a frame without one runs its engine's loop untouched - tracing costs nothing unless used.
+# Every hook of `Tracer` does nothing, subclasses override the ones they need.
+# =#
+
+
+class Tracer:
+    def on_instruction(self, frame: 'Frame', i: int, op: Operation, argument: Any) -> None:
+        '''Before instruction `i` executes.'''
+
+    def on_call(self, frame: 'Frame', function: Any, arguments: list[Any]) -> None:
+        '''Before a CALL executes, with the callee & its arguments as they lay on the stack.'''
+
+    def on_loop_iteration(self, frame: 'Frame', i: int, target: int) -> None:
+        '''After the jump at `i` went back to `target` - another iteration of a loop starts.'''
+
+    def on_finish(self, frame: 'Frame', result: Any) -> None:
+        '''After the frame stopped.'''
+
+
+class StackPrinter(Tracer):
+    '''The stack before every instruction, on stdout - what `debug=True` shows.'''
+
+    def on_instruction(self, frame: 'Frame', i: int, op: Operation, argument: Any) -> None:
+        print(f'{frame.stack}\n\n{op.__repr__()} {argument}')
+
+    def on_finish(self, frame: 'Frame', result: Any) -> None:
+        print(frame.stack)
+
+
+class EventWriter(Tracer):
+    '''Every event as one JSON object per line, written to `file` as it happens.
+    Values that are not JSON (iterators, functions) are written as their repr.'''
+
+    file: TextIO
+    stack: bool  # include the whole stack with each instruction, not just its depth
+
+    def __init__(self, file: TextIO, *, stack: bool = False) -> None:
+        self.file = file
+        self.stack = stack
+
+    def write(self, event: dict[str, Any]) -> None:
+        self.file.write(json.dumps(event, default=repr) + '\n')
+
+    def on_instruction(self, frame: 'Frame', i: int, op: Operation, argument: Any) -> None:
+        event = {
+            'event': 'instruction',
+            'frame': frame.id,
+            'index': i,
+            'op': op.__repr__(),
+            'argument': argument,
+            'depth': len(frame.stack),
+        }
+
+        if self.stack:
+            event['stack'] = frame.stack
+
+        self.write(event)
+
+    def on_call(self, frame: 'Frame', function: Any, arguments: list[Any]) -> None:
+        self.write({ 'event': 'call', 'frame': frame.id, 'function': function, 'arguments': arguments })
+
+    def on_loop_iteration(self, frame: 'Frame', i: int, target: int) -> None:
+        self.write({ 'event': 'loop_iteration', 'frame': frame.id, 'index': i, 'target': target })
+
+    def on_finish(self, frame: 'Frame', result: Any) -> None:
+        self.write({ 'event': 'finish', 'frame': frame.id, 'result': result })
+        self.file.flush()
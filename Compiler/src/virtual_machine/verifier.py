@@ -0,0 +1,177 @@
+from typing import Any, Optional
+from virtual_machine.bytecode import Operation, jump_operands
+
+#=
+# Static stack analysis of a code list.
+# Every reachable instruction is visited once with the operand stack depth (and the depths
+# saved by enclosing loops) it runs at. Code whose depth goes negative, differs between
+# two paths into one instruction, or that jumps outside of itself is rejected,
+# so engines may trust their stack without checks. The deepest point is the size
+# of a preallocated stack.
+# =#
+
+State = tuple[int, tuple[int, ...]]  # (depth, saved depths of the enclosing loops)
+
+nullary = { Operation.PUSH, Operation.LOAD_NAME, Operation.LOAD_FAST, Operation.MAKE_LIST }
+stores = { Operation.POP, Operation.STORE_NAME, Operation.STORE_FAST }
+unary = { Operation.UNARY_OP, Operation.INCREMENT, Operation.DECREMENT, Operation.MAKE_ARRAY, Operation.MAKE_CONST_SEQUENCE }
+
+binary = {
+    Operation.BINARY_OP,
+    Operation.BINARY_ADD_INT,
+    Operation.BINARY_ADD_FLOAT,
+    Operation.BINARY_SUBTRACT_INT,
+    Operation.BINARY_SUBTRACT_FLOAT,
+    Operation.BINARY_MULTIPLY_INT,
+    Operation.BINARY_MULTIPLY_FLOAT,
+    Operation.BINARY_DIVIDE_FLOAT,
+    Operation.BINARY_MODULO_INT,
+}
+
+compare_jumps = {
+    Operation.JUMP_UNLESS_LT_INT,
+    Operation.JUMP_UNLESS_LE_INT,
+    Operation.JUMP_UNLESS_GT_INT,
+    Operation.JUMP_UNLESS_GE_INT,
+    Operation.JUMP_UNLESS_EQ_INT,
+    Operation.JUMP_UNLESS_NE_INT,
+}
+
+
+def effect(op: Operation, args: list[Any]) -> tuple[int, Optional[int], Optional[int]]:
+    '''(depth required, change when falling through, change when jumping) - None if that never happens'''
+
+    match op:
+        case _ if op in nullary:
+            return 0, 1, None
+
+        case _ if op in stores:
+            return 1, -1, None
+
+        case _ if op in unary:
+            return 1, 0, None
+
+        case _ if op in binary:
+            return 2, -1, None
+
+        case _ if op in compare_jumps:
+            return 2, -2, -2
+
+        case Operation.CLONE:
+            return 1, 1, None
+
+        case Operation.SWAP:
+            return 2, 0, None
+
+        case Operation.JUMP:
+            return 0, None, 0
+
+        case Operation.JUMP_IF_FALSE:
+            return 1, -1, -1
+
+        case Operation.RETURN:
+            return 0, None, None
+
+        case Operation.RETURN_VALUE:
+            return 1, None, None
+
+        case Operation.APPEND:
+            return max(1, -args[0]), -1, None
+
+        case Operation.LEN:
+            return -args[0], 1, None
+
+        case Operation.MAKE_ENUMERATE:
+            return 3, -2, None
+
+        case Operation.ITER_NEXT:
+            return -args[0], 1, 0
+
+        case Operation.FOR_RANGE_INIT:
+            return 3, -2, -3
+
+        case Operation.FOR_RANGE_STEP:
+            return 0, 0, 1
+
+        case Operation.MAKE_SLICE:
+            return args[0], 1 - args[0], None
+
+        case Operation.SUBSCRIPT_READ | Operation.SLICE_READ:
+            return args[0] + 1, -args[0], None
+
+        case Operation.SUBSCRIPT_WRITE | Operation.SLICE_WRITE:
+            return args[0] + 2, -args[0] - 2, None
+
+        case Operation.CALL:
+            return args[0] + 1, -args[0], None
+
+        case Operation.DEFINE_FUNCTION:
+            return 0, 0, None
+
+        case Operation.PRINT:
+            return args[0], 0, None
+
+        case Operation.PRINT_STACK:
+            return 0, 0, None
+
+    raise ValueError(f'No stack effect known for {op.__repr__()}')
+
+
+def successors(i: int, command: Any, state: State) -> list[tuple[int, State]]:
+    op, *args = command if isinstance(command, tuple) else (command,)
+    depth, blocks = state
+
+    match op:
+        case Operation.SETUP_LOOP:
+            return [(i + 1, (depth, (*blocks, depth)))]
+
+        case Operation.CLEAR_LOOP:
+            if len(blocks) == 0 or blocks[-1] > depth:
+                raise ValueError(f'{op.__repr__()} at {i} does not match a SETUP_LOOP')
+
+            return [(i + 1, (blocks[-1], blocks[:-1]))]
+
+    required, through, jumping = effect(op, args)
+
+    if depth < required:
+        raise ValueError(f'Stack underflow at {i}: {op.__repr__()} needs {required}, depth is {depth}')
+
+    result = []
+
+    if through is not None:
+        result.append((i + 1, (depth + through, blocks)))
+
+    if jumping is not None:
+        result.append((i + args[jump_operands[op]], (depth + jumping, blocks)))
+
+    return result
+
+
+def analyze(code: list[Any]) -> int:
+    '''Maximum operand stack depth of `code`, ValueError if it is malformed.'''
+
+    n = len(code)
+    states: list[Optional[State]] = [None] * (n + 1)  # index n - past the end, where execution stops
+    states[0] = (0, ())
+    pending = [0] if n > 0 else []
+    deepest = 0
+
+    while len(pending) > 0:
+        i = pending.pop()
+
+        for j, state in successors(i, code[i], states[i]):
+            if not 0 <= j <= n:
+                raise ValueError(f'Jump out of range at {i}: {code[i]}')
+
+            deepest = max(deepest, state[0])
+
+            if states[j] is None:
+                states[j] = state
+
+                if j < n:
+                    pending.append(j)
+
+            elif states[j] != state and j < n:
+                raise ValueError(f'Inconsistent stack at {j}: {states[j]} and {state}')
+
+    return deepest
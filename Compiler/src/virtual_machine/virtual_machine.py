@@ -1,9 +1,37 @@
-from typing import Any, Optional, Sequence
-from itertools import count
+from typing import Any, Callable, Hashable, Optional, Sequence
+from itertools import count, repeat
+from time import perf_counter_ns
 from virtual_machine.bytecode import *
+from virtual_machine.dispatch import handlers, decode, exhausted
+from virtual_machine.code_object import CodeObject, FunctionCode, frame_size, stack_size, functions
+from virtual_machine.verifier import analyze
+import virtual_machine.preallocated as preallocated
+import virtual_machine.threaded as threaded
+import virtual_machine.tiering as tiering
+from virtual_machine.tracing import Tracer, StackPrinter
+from virtual_machine.profiling import Profile
+import virtual_machine.sampling as sampling
+from virtual_machine.memoization import Memo, missing
+from virtual_machine.slicing import whole
 import virtual_machine.stdlib as std
 
 
+#=
+# Calls.
+# A CALL of a function the program defines does not recurse into the engine: the handler
+# parks the callee's frame in `frame.callee` and halts the loop, the engine yields the frame
+# to `VirtualMachine.run` and pushes the result the run sends back on resumption.
+# The Python stack stays flat however deep the program recurses.
+# Every engine loop runs one activation after another - a finished frame goes back to the VM's
+# pool and a later call reuses it with its generator, stack & locals. Decoded code is cached
+# per code object, threaded closures & recompiled loops per frame and code object.
+# Calls of pure functions may be answered from `VirtualMachine.memo` without a frame, a frame
+# run for a miss carries its key and the result is stored when it finishes.
+# =#
+
+PROGRAM = '<program>'  # name of the loaded code, no function can be called so
+
+
 class FrameState:
     FINISH = 0
     CALL = 1
@@ -14,200 +42,669 @@ class Frame:
     id: int
 
     vm: 'VirtualMachine'
-    context: dict[str, Any]
-    code: list[Any]
+    name: str  # of the function running, PROGRAM for the loaded code
+    context: dict[str, Any]  # variables accessed by name (dynamic code)
+    locals: list[Any]        # variables resolved to slots
+    code: list[Any] | CodeObject
     stack: list[Any]  # TODO precise typing
-    debug: bool
+    sp: int  # first free cell of a preallocated stack
+    blocks: list[int]  # operand stack depth at entry of every active loop
+    tier: Optional[tiering.Tier]  # loops recompiled by the tiered engine
+    tracer: Optional[Tracer]
+    result: Any
+    callee: Optional['Frame']  # set up by CALL, for the engine to yield
+    resume: int  # index to continue at after the callee returned
+    memo: Optional[Hashable]  # key to store the result under
+    prepared: dict[tuple[str, int], tuple[Any, Any]]  # (kind, id of the code) -> (code, preparation)
     execution: Sequence[FrameState]
 
-    def __init__(self, vm: 'VirtualMachine', context: dict[str, Any], code: list['Any'], *, debug: bool = False) -> None:
+    def __init__(self, vm: 'VirtualMachine', context: dict[str, Any], code: list[Any] | CodeObject, *, engine: str = 'match', tracer: Optional[Tracer] = None, name: str = PROGRAM, size: int = 0) -> None:
         self.id = next(Frame.instances)
         self.vm = vm
+        self.name = name
         self.context = context
+        self.locals = [None] * max(size, vm.cached('frame_size', code, frame_size))  # `size` counts unread parameters too
         self.code = code
         self.stack = []
-        self.debug = debug
-        self.execution = self.execute()
+        self.sp = 0
+        self.blocks = []
+        self.tier = None
+        self.tracer = tracer
+        self.result = None
+        self.callee = None
+        self.resume = 0
+        self.memo = None
+        self.prepared = dict()
+        self.execution = engines[engine](self) if tracer is None else self.execute_traced()
 
     def __hash__(self) -> int:
         return hash(self.id)
 
+    def enter(self, code: list[Any] | CodeObject, name: str, size: int = 0) -> None:
+        '''Sets a cleared frame up for another activation.'''
+
+        self.code = code
+        self.name = name
+        self.locals.extend(repeat(None, max(size, self.vm.cached('frame_size', code, frame_size))))
+
+    def clear(self) -> None:
+        '''Drops the values of the finished activation. The lists themselves stay,
+        closures of the threaded engine hold them.'''
+
+        self.context.clear()
+        self.locals.clear()
+        self.stack.clear()
+        self.blocks.clear()
+        self.sp = 0
+        self.result = None
+        self.memo = None
+
+    def prepare(self, kind: str, compute: Callable[['Frame'], Any]) -> Any:
+        key = (kind, id(self.code))
+
+        if key not in self.prepared:
+            self.prepared[key] = (self.code, compute(self))  # the code is kept, its id stays unique
+
+        return self.prepared[key][1]
+
+    def call(self) -> tuple[FrameState, 'Frame']:
+        callee, self.callee = self.callee, None
+        return (FrameState.CALL, callee)
+
     def execute(self) -> Sequence[tuple[FrameState, Any]]:
-        n = len(self.code)
-        i = 0
+        while True:
+            code = self.vm.cached('instructions', self.code, CodeObject.instructions)\
+                if isinstance(self.code, CodeObject)\
+                else self.code
+
+            n = len(code)
+            i = 0
 
-        result = None
+            result = None
 
-        while i < n:
-            if self.debug:
-                print(f'{self.stack}\n\n{self.code[i]}')
+            while i < n:
+                match code[i]:
+                    case (Operation.PUSH, value):
+                        self.stack.append(value)
 
-            match self.code[i]:
-                case (Operation.PUSH, value):
-                    self.stack.append(value)
+                    case Operation.POP:
+                        self.stack.pop()
 
-                case Operation.POP:
-                    self.stack.pop()
+                    case Operation.CLONE:
+                        self.stack.append(self.stack[-1])
 
-                case Operation.CLONE:
-                    self.stack.append(self.stack[-1])
+                    case Operation.SWAP:
+                        self.stack[-1], self.stack[-2] = self.stack[-2], self.stack[-1]
 
-                case Operation.SWAP:
-                    self.stack[-1], self.stack[-2] = self.stack[-2], self.stack[-1]
+                    case (Operation.STORE_NAME, name):
+                        self.context[name] = self.stack.pop()
 
-                case (Operation.STORE_NAME, name):
-                    self.context[name] = self.stack.pop()
+                    case (Operation.LOAD_NAME, name):
+                        self.stack.append(self.context[name])
 
-                case (Operation.LOAD_NAME, name):
-                    self.stack.append(self.context[name])
+                    case (Operation.STORE_FAST, slot):
+                        self.locals[slot] = self.stack.pop()
 
-                case (Operation.JUMP, delta):
-                    i += delta - 1
+                    case (Operation.LOAD_FAST, slot):
+                        self.stack.append(self.locals[slot])
 
-                case (Operation.JUMP_IF_FALSE, delta):
-                    if not self.stack.pop():
+                    case (Operation.JUMP, delta):
                         i += delta - 1
 
-                case Operation.RETURN:
-                    result = self.stack[-2]\
-                        if self.stack[-1] == StackMarker.RETURN\
-                        else None
-                    
+                    case (Operation.JUMP_IF_FALSE, delta):
+                        if not self.stack.pop():
+                            i += delta - 1
+
+                    case Operation.RETURN:
+                        break
+
+                    case Operation.RETURN_VALUE:
+                        result = self.stack.pop()
+                        break
+
+                    case Operation.SETUP_LOOP:
+                        self.blocks.append(len(self.stack))
+
+                    case Operation.CLEAR_LOOP:
+                        del self.stack[self.blocks.pop():]
+
+                    case (Operation.APPEND, offset):
+                        self.stack[offset].append(self.stack.pop())
+
+                    case (Operation.LEN, offset):
+                        self.stack.append(len(self.stack[offset]))
+
+                    case Operation.MAKE_LIST:
+                        self.stack.append([])
+
+                    case (Operation.MAKE_ARRAY, element):
+                        self.stack[-1] = std.array(self.stack[-1], element)
+
+                    case Operation.MAKE_ENUMERATE:
+                        step = self.stack.pop()
+                        end = self.stack.pop()
+                        start = self.stack.pop()
+
+                        self.stack.append(iter(range(start, end, step)))
+
+                    case (Operation.MAKE_SLICE, 0):
+                        self.stack.append(whole)
+
+                    case (Operation.MAKE_SLICE, _):
+                        step = self.stack.pop()
+                        end = self.stack.pop()
+
+                        self.stack[-1] = slice(self.stack[-1], end, step)
+
+                    case (Operation.MAKE_CONST_SEQUENCE, value):
+                        length = self.stack.pop()
+
+                        self.stack.append((value for _ in range(length)))
+
+                    case (Operation.ITER_NEXT, offset, jump):
+                        iterator = self.stack[offset]
+
+                        match next(iterator, exhausted):
+                            case something if something is exhausted:
+                                i += jump - 1
+
+                            case something:
+                                self.stack.append(something)
+
+                    case (Operation.FOR_RANGE_INIT, slot, exit):
+                        step = self.stack.pop()
+                        end = self.stack.pop()
+                        counter = iter(range(self.stack.pop(), end, step))
+
+                        match next(counter, exhausted):
+                            case element if element is exhausted:
+                                i += exit - 1
+
+                            case element:
+                                self.locals[slot] = counter
+                                self.stack.append(element)
+
+                    case (Operation.FOR_RANGE_STEP, slot, body):
+                        match next(self.locals[slot], exhausted):
+                            case element if element is exhausted:
+                                pass
+
+                            case element:
+                                self.stack.append(element)
+                                i += body - 1
+
+                    case (Operation.SUBSCRIPT_READ, n_indices):
+                        indices = self.stack[-n_indices:]
+                        self.stack[-n_indices:] = []
+
+                        source = self.stack.pop()
+
+                        if type(source) is not list:
+                            self.stack.append(std.read(source, indices))
+
+                        else:
+                            deref = source
+
+                            for index in reversed(indices):
+                                deref = deref[index - 1]
+
+                            self.stack.append(deref)
+
+                    case (Operation.SUBSCRIPT_WRITE, n_indices):
+                        element = self.stack.pop()
+
+                        indices = self.stack[-n_indices:]
+                        self.stack[-n_indices:] = []
+
+                        source = self.stack.pop()
+
+                        if type(source) is not list:
+                            std.write(source, indices, element)
+
+                        else:
+                            deref = source
+
+                            for index in reversed(indices[1:]):
+                                deref = deref[index - 1]
+
+                            deref[indices[0] - 1] = element
+
+                    case (Operation.SLICE_READ, n_indices):
+                        indices = self.stack[-n_indices:]
+                        self.stack[-n_indices:] = []
+
+                        self.stack[-1] = std.select(self.stack[-1], indices)
+
+                    case (Operation.SLICE_WRITE, n_indices):
+                        element = self.stack.pop()
+
+                        indices = self.stack[-n_indices:]
+                        self.stack[-n_indices:] = []
+
+                        std.assign(self.stack.pop(), indices, element)
+
+                    case (Operation.CALL, n_args):
+                        name = self.stack.pop()
+
+                        start = len(self.stack) - n_args
+                        arguments = self.stack[start:]
+                        del self.stack[start:]
+
+                        callee, value = self.vm.call(name, arguments)
+
+                        if callee is not None:
+                            value = yield (FrameState.CALL, callee)
+
+                        self.stack.append(value)
+
+                    case (Operation.DEFINE_FUNCTION, function):
+                        self.vm.define(function)
+
+                    case (Operation.BINARY_OP, operator):
+                        right = self.stack.pop()
+                        left = self.stack.pop()
+
+                        value = std.binary_ops[operator](left, right)
+                        self.stack.append(value)
+
+                    case (Operation.UNARY_OP, operator):
+                        operand = self.stack.pop()
+
+                        value = std.unary_ops[operator](operand)
+                        self.stack.append(value)
+
+                    case Operation.BINARY_ADD_INT | Operation.BINARY_ADD_FLOAT:
+                        right = self.stack.pop()
+                        self.stack[-1] = self.stack[-1] + right
+
+                    case Operation.BINARY_SUBTRACT_INT | Operation.BINARY_SUBTRACT_FLOAT:
+                        right = self.stack.pop()
+                        self.stack[-1] = self.stack[-1] - right
+
+                    case Operation.BINARY_MULTIPLY_INT | Operation.BINARY_MULTIPLY_FLOAT:
+                        right = self.stack.pop()
+                        self.stack[-1] = self.stack[-1] * right
+
+                    case Operation.BINARY_DIVIDE_FLOAT:
+                        right = self.stack.pop()
+                        self.stack[-1] = self.stack[-1] / right
+
+                    case Operation.BINARY_MODULO_INT:
+                        right = self.stack.pop()
+                        self.stack[-1] = self.stack[-1] % right
+
+                    case (Operation.JUMP_UNLESS_LT_INT, delta):
+                        right = self.stack.pop()
+
+                        if not self.stack.pop() < right:
+                            i += delta - 1
+
+                    case (Operation.JUMP_UNLESS_LE_INT, delta):
+                        right = self.stack.pop()
+
+                        if not self.stack.pop() <= right:
+                            i += delta - 1
+
+                    case (Operation.JUMP_UNLESS_GT_INT, delta):
+                        right = self.stack.pop()
+
+                        if not self.stack.pop() > right:
+                            i += delta - 1
+
+                    case (Operation.JUMP_UNLESS_GE_INT, delta):
+                        right = self.stack.pop()
+
+                        if not self.stack.pop() >= right:
+                            i += delta - 1
+
+                    case (Operation.JUMP_UNLESS_EQ_INT, delta):
+                        right = self.stack.pop()
+
+                        if not self.stack.pop() == right:
+                            i += delta - 1
+
+                    case (Operation.JUMP_UNLESS_NE_INT, delta):
+                        right = self.stack.pop()
+
+                        if not self.stack.pop() != right:
+                            i += delta - 1
+
+                    case Operation.INCREMENT:
+                        self.stack[-1] += 1
+
+                    case Operation.DECREMENT:
+                        self.stack[-1] -= 1
+
+                    case (Operation.PRINT, n_args):
+                        args = self.stack[-n_args:]
+                        print(*args, sep='\n')
+
+                    case Operation.PRINT_STACK:
+                        print(*self.stack, sep='\n')
+
+                i += 1
+
+            yield (FrameState.FINISH, result)
+
+    def execute_dispatch(self) -> Sequence[tuple[FrameState, Any]]:
+        table = handlers
+
+        while True:
+            opcodes, arguments = self.vm.decoded(self.code, table)
+
+            n = len(opcodes)
+            i = 0
+
+            while True:
+                while i < n:
+                    i = table[opcodes[i]](self, arguments[i], i)
+
+                if self.callee is None:
                     break
 
-                case Operation.CLEAR_LOOP:
-                    while self.stack.pop() != StackMarker.BEGIN_LOOP:
-                        pass 
+                self.stack.append((yield self.call()))
+                i = self.resume
 
-                case (Operation.APPEND, offset):
-                    self.stack[offset].append(self.stack.pop())
+            yield (FrameState.FINISH, self.result)
 
-                case (Operation.LEN, offset):
-                    self.stack.append(len(self.stack[offset]))
+    def execute_preallocated(self) -> Sequence[tuple[FrameState, Any]]:
+        table = preallocated.handlers
 
-                case Operation.MAKE_LIST:
-                    self.stack.append([])
+        while True:
+            opcodes, arguments = self.vm.decoded(self.code, table)
 
-                case Operation.MAKE_ENUMERATE:
-                    end = self.stack.pop()
-                    start = self.stack.pop()
+            self.stack.extend(repeat(None, self.vm.cached('stack_size', self.code, stack_size) - len(self.stack)))
+            self.sp = 0
 
-                    self.stack.append(iter(range(start, end)))
+            n = len(opcodes)
+            i = 0
 
-                case (Operation.MAKE_CONST_SEQUENCE, value):
-                    length = self.stack.pop()
+            while True:
+                while i < n:
+                    i = table[opcodes[i]](self, arguments[i], i)
 
-                    self.stack.append((value for _ in range(length)))
+                if self.callee is None:
+                    break
 
-                case (Operation.ITER_NEXT, offset, jump):
-                    iterator = self.stack[offset]
+                self.stack[self.sp] = yield self.call()
+                self.sp += 1
+                i = self.resume
 
-                    match next(iterator):
-                        case None:
-                            i += jump - 1
+            del self.stack[self.sp:]  # only live values are left to inspect
 
-                        case something:
-                            self.stack.append(something)
+            yield (FrameState.FINISH, self.result)
 
-                case (Operation.SUBSCRIPT_READ, n_indices):
-                    indices = self.stack[-n_indices:]
-                    self.stack[-n_indices:] = []
+    def execute_threaded(self) -> Sequence[tuple[FrameState, Any]]:
+        # threading happens right away, on load, the returned generator only runs the closures
+        self.prepare('threaded', threaded.thread)
+        return self.run_threaded()
 
-                    source = self.stack.pop()
+    def run_threaded(self) -> Sequence[tuple[FrameState, Any]]:
+        while True:
+            program = self.prepare('threaded', threaded.thread)
 
-                    deref = source
+            n = len(program)
+            i = 0
 
-                    for index in reversed(indices):
-                        deref = deref[index - 1]
+            while True:
+                while i < n:
+                    i = program[i]()
 
-                    self.stack.append(deref)
+                if self.callee is None:
+                    break
+
+                self.stack.append((yield self.call()))
+                i = self.resume
+
+            yield (FrameState.FINISH, self.result)
+
+    def execute_tiered(self) -> Sequence[tuple[FrameState, Any]]:
+        table = tiering.handlers
+
+        while True:
+            opcodes, arguments = self.vm.decoded(self.code, table)
+
+            self.tier = self.prepare('tiered', lambda frame: tiering.Tier(frame.vm.tiering, frame.name, opcodes, arguments))
+
+            n = len(opcodes)
+            i = 0
+
+            while True:
+                while i < n:
+                    i = table[opcodes[i]](self, arguments[i], i)
+
+                if self.callee is None:
+                    break
+
+                self.stack.append((yield self.call()))
+                i = self.resume
+
+            yield (FrameState.FINISH, self.result)
 
-                case (Operation.SUBSCRIPT_WRITE, n_indices):
-                    element = self.stack.pop()
+    def execute_traced(self) -> Sequence[tuple[FrameState, Any]]:
+        # whatever the engine, a traced frame runs the table-driven handlers with every hook called
+        table = handlers
+        tracer = self.tracer
 
-                    indices = self.stack[-n_indices:]
-                    self.stack[-n_indices:] = []
+        while True:
+            opcodes, arguments = self.vm.decoded(self.code, table)
+            operations = [Operation(opcode) for opcode in opcodes]
 
-                    source = self.stack.pop()
+            n = len(opcodes)
+            i = 0
 
-                    deref = source
+            while True:
+                while i < n:
+                    op, argument = operations[i], arguments[i]
+                    tracer.on_instruction(self, i, op, argument)
 
-                    for index in reversed(indices[1:]):
-                        deref = deref[index - 1]
+                    if op == Operation.CALL:  # the callee's name above its arguments
+                        tracer.on_call(self, self.stack[-1], self.stack[len(self.stack) - 1 - argument:-1])
 
-                    deref[indices[0] - 1] = element
+                    j = table[opcodes[i]](self, argument, i)
 
-                case (Operation.CALL, n_args):
-                    raise NotImplementedError('Function calls are not supported')
-                    yield (FrameState.CALL, 'fun_name')
+                    if j < i:
+                        tracer.on_loop_iteration(self, i, j)
 
-                case (Operation.BINARY_OP, operator):
-                    left = self.stack.pop()
-                    right = self.stack.pop()
+                    i = j
+
+                if self.callee is None:
+                    break
 
-                    result = std.binary_ops[operator](left, right)
-                    self.stack.append(result)
+                self.stack.append((yield self.call()))
+                i = self.resume
 
-                case (Operation.UNARY_OP, operator):
-                    operand = self.stack.pop()
+            tracer.on_finish(self, self.result)
 
-                    result = std.unary_ops[operator](operand)
-                    self.stack.append(result)
+            yield (FrameState.FINISH, self.result)
 
-                case Operation.INCREMENT:
-                    self.stack[-1] += 1
+    def execute_profiled(self, profile: Profile) -> Sequence[tuple[FrameState, Any]]:
+        table = handlers
+        clock = perf_counter_ns
 
-                case Operation.DECREMENT:
-                    self.stack[-1] -= 1
+        while True:
+            opcodes, arguments = self.vm.decoded(self.code, table)
 
-                case (Operation.PRINT, n_args):
-                    args = self.stack[-n_args:]
-                    print(*args, sep='\n')
+            section = profile if self.name == PROGRAM else profile.function(self.name)
+            section.attach(opcodes)
+            counts, times = section.counts, section.times
+
+            n = len(opcodes)
+            i = 0
+
+            while True:
+                while i < n:
+                    start = clock()
+                    j = table[opcodes[i]](self, arguments[i], i)
+                    times[i] += clock() - start
+                    counts[i] += 1
+                    i = j
+
+                if self.callee is None:
+                    break
 
-                case Operation.PRINT_STACK:
-                    print(*self.stack, sep='\n')
+                self.stack.append((yield self.call()))
+                i = self.resume
 
-            i += 1
+            yield (FrameState.FINISH, self.result)
 
-        if self.debug:
-            print(self.stack)
 
-        yield (FrameState.FINISH, result)
+engines = {
+    'match': Frame.execute,
+    'dispatch': Frame.execute_dispatch,
+    'preallocated': Frame.execute_preallocated,
+    'threaded': Frame.execute_threaded,
+    'tiered': Frame.execute_tiered,
+}
+
+for loop in (Frame.execute, Frame.execute_dispatch, Frame.execute_preallocated, Frame.run_threaded,
+             Frame.execute_tiered, Frame.execute_traced, Frame.execute_profiled):
+    sampling.sampled(loop)
+
+sampling.sampled(tiering.Tier.back_edge, index='pc', frame='frame')  # inside a recompiled loop
 
 
 class VirtualMachine:
     call_stack: list[Frame]
+    functions: dict[str, FunctionCode]  # defined by the program so far
+    pool: list[Frame]  # finished frames, ready for another call
+    allocated: int  # frames created, calls the pool could not serve included
+    memo: Memo  # results of pure functions
+    cache: dict[tuple[Hashable, int], tuple[Any, Any]]  # (kind, id of the code) -> (code, value)
+    engine: str
+    tracer: Optional[Tracer]
+    profile: Optional[Profile]
+    tiering: tiering.Tiering
+
+    def __init__(self, *, threshold: int = tiering.THRESHOLD, memo_size: int = 0) -> None:
+        '''`memo_size` results of pure functions are kept, 0 calls them every time.'''
 
-    def __init__(self) -> None:
         self.call_stack = []
+        self.functions = dict()
+        self.pool = []
+        self.allocated = 0
+        self.memo = Memo(memo_size)
+        self.cache = dict()
+        self.engine = 'match'
+        self.tracer = None
+        self.profile = None
+        self.tiering = tiering.Tiering(threshold)
+
+    def cached(self, kind: Hashable, code: list[Any] | CodeObject, compute: Callable[[Any], Any]) -> Any:
+        key = (kind, id(code))
+
+        if key not in self.cache:
+            self.cache[key] = (code, compute(code))  # the code is kept, its id stays unique
+
+        return self.cache[key][1]
+
+    def decoded(self, code: list[Any] | CodeObject, table: list[Any]) -> tuple[list[int], list[Any]]:
+        return self.cached(id(table), code, lambda code: decode(code, table))
+
+    def load(self, code: list[Any] | CodeObject, *, debug: bool = False, engine: str = 'match', tracer: Optional[Tracer] = None) -> None:
+        '''`debug` prints the stack before every instruction, `tracer` receives every event instead.'''
+
+        if engine not in engines:
+            raise ValueError(f'Unknown engine {engine}, expected one of: {", ".join(engines)}')
+
+        if not isinstance(code, CodeObject):  # a CodeObject is verified when assembled
+            for function in functions(code):
+                if not isinstance(function.code, CodeObject):
+                    analyze(function.code)
+
+            analyze(code)
+
+        self.engine = engine
+        self.tracer = StackPrinter() if debug and tracer is None else tracer
+        self.pool.clear()  # frames of another engine
+
+        self.call_stack.append(self.frame(code, PROGRAM))
+
+    def frame(self, code: list[Any] | CodeObject, name: str, size: int = 0) -> Frame:
+        self.allocated += 1
+
+        frame = Frame(self, dict(), code, engine=self.engine, tracer=self.tracer, name=name, size=size)
+
+        if self.profile is not None:
+            frame.execution = frame.execute_profiled(self.profile)
+
+        return frame
+
+    def define(self, function: FunctionCode) -> None:
+        self.functions[function.name] = function
+
+    def call(self, name: str, arguments: list[Any]) -> tuple[Optional[Frame], Any]:
+        '''The frame to run for a function of the program, its result comes later.
+        A builtin runs right away, (None, its result) is returned.'''
+
+        function = self.functions.get(name)
+
+        if function is None:
+            if name not in std.builtins:
+                raise NameError(f'Undefined function {name}')
+
+            return None, std.builtins[name](*arguments)
+
+        if len(arguments) != len(function.parameters):
+            raise TypeError(f'{name} takes {len(function.parameters)} arguments, {len(arguments)} given')
+
+        key = None
+
+        if function.pure and self.memo.size > 0:
+            key = self.memo.key(name, arguments)
+
+            if key is not None:
+                value = self.memo.lookup(key)
+
+                if value is not missing:
+                    return None, value
+
+        if len(self.pool) > 0:
+            frame = self.pool.pop()
+            frame.enter(function.code, name, function.n_locals)
+        else:
+            frame = self.frame(function.code, name, function.n_locals)
+
+        for parameter, value in zip(function.parameters, arguments):
+            if isinstance(parameter, int):
+                frame.locals[parameter] = value
+            else:
+                frame.context[parameter] = value
+
+        frame.memo = key
+
+        return frame, None
+
+    def run(self, *, profile: Optional[Profile] = None) -> Any:
+        '''With a `profile`, loaded frames & every frame called run instrumented instead of on their engine.'''
+
+        if profile is not None:
+            self.profile = profile
+            self.pool.clear()
+
+            for frame in self.call_stack:
+                frame.execution = frame.execute_profiled(profile)
+
+        value = None
 
-    def load(self, code: list[Any], *, debug: bool = False) -> None:
-        initial = Frame(
-            self, 
-            dict(), 
-            code,
-            debug=debug
-        )  # provide valid context etc.
-        
-        self.call_stack.append(initial)
-
-    def run(self) -> None:
         while len(self.call_stack) > 0:
             frame = self.call_stack[-1]
 
-            match next(frame.execution):
-                case (FrameState.CALL, function):
-                    pass
+            match frame.execution.send(value):
+                case (FrameState.CALL, callee):
+                    self.call_stack.append(callee)
+                    value = None
 
-                case (FrameState.FINISH, None):
+                case (FrameState.FINISH, value):  # sent to the caller, resumed next
                     self.call_stack.pop()
 
-                case (FrameState.FINISH, result):
-                    self.call_stack.pop()
-                    
-                    if len(self.call_stack) > 0:
-                        self.call_stack[-1].stack.append(result)
+                    if frame.memo is not None:
+                        self.memo.store(frame.memo, value)
+
+                    frame.clear()
+                    self.pool.append(frame)
 
-                    else:
-                        print(f'Process finished with result {result}')
+        if value is not None:
+            print(f'Process finished with result {value}')
 
+        return value
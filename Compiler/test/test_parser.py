@@ -64,3 +64,17 @@ class TestParser(unittest.TestCase):
     def test_sample_code_with_functions(self):
         self.process('data/sample_code_with_functions.txt')
 
+
+    def test_step_ranges(self):
+        parser = Parser()
+        parser.parse(self.lexer.tokenize('r = 1:2:7; s = 0:n+1;'))
+
+        stepped, unit = (action.right for action in parser.root.content.actions)
+
+        self.assertEqual((stepped.interval, stepped.step.value, stepped.end.value), ('step', 2, 7))
+        self.assertEqual(unit.interval, 'unit')
+
+    def test_chained_ranges_are_rejected(self):
+        for source in ('r = (1:3):10;', 'r = 1:2:3:4;', 'r = 1:(2:3);'):
+            with self.subTest(source=source), self.assertRaises(SyntaxError):
+                Parser().parse(self.lexer.tokenize(source))
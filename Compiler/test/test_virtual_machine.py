@@ -0,0 +1,1511 @@
+import unittest
+import sys
+import ast
+import json
+import signal
+import io
+import contextlib
+from typing import Any, Sequence
+
+sys.path.append('src')
+
+from parser import Parser
+from lexer import Lexer
+from virtual_machine.code_generator import compile, disassemble
+from virtual_machine.code_object import CodeObject, assemble, functions, frame_size, stack_size, line_table, line_at
+from virtual_machine.verifier import analyze
+from virtual_machine.virtual_machine import VirtualMachine, Frame, engines
+from virtual_machine.bytecode import Operation
+from virtual_machine.optimizer import optimize
+import virtual_machine.tiering as tiering
+from virtual_machine.tracing import Tracer, EventWriter
+from virtual_machine.profiling import Profile
+from virtual_machine.sampling import Sampler
+from virtual_machine.memoization import Memo, missing
+from syntax_tree.structure.nodes import Program, Identifier
+from syntax_tree.passes.folding import fold
+from syntax_tree.passes.inlining import inline
+from syntax_tree.passes.purity import pure
+import python_backend.lowering as lowering
+import virtual_machine.stdlib as std
+import virtual_machine.ndarrays as ndarrays
+import virtual_machine.compact as compact
+import virtual_machine.products as products
+from virtual_machine.slicing import whole
+from semantics.types import int32, float64, nothing
+
+
+def read_file(path: str) -> str:
+    with open(path, 'r') as file:
+        return file.read()
+
+
+def parse(source: str) -> Program:
+    parser = Parser()
+    parser.parse(Lexer().tokenize(source))
+    parser.root.structurize()
+
+    return parser.root
+
+
+def build(source: str, *, dynamic: bool = False, folded: bool = False, typed: bool = False, inlined: bool = False) -> list[Any]:
+    root = parse(source)
+
+    if inlined:
+        inline(root)
+
+    if folded:
+        fold(root)
+
+    if typed:
+        with contextlib.redirect_stdout(io.StringIO()):  # the checker reports as it goes
+            root.content.check_types()
+
+    return compile(root, dynamic=dynamic)
+
+
+def execute(source: str, engine: str, *, assembled: bool = False, dynamic: bool = False, folded: bool = False, typed: bool = False, inlined: bool = False, level: int = 0, threshold: int = tiering.THRESHOLD) -> Any:
+    code, _ = optimize(build(source, dynamic=dynamic, folded=folded, typed=typed, inlined=inlined), level)
+
+    if assembled:
+        code = assemble(code)
+
+    vm = VirtualMachine(threshold=threshold)
+    vm.load(code, engine=engine)
+
+    return vm.run()
+
+
+def lower_and_run(source: str, *, folded: bool = False, typed: bool = False) -> Any:
+    root = parse(source)
+
+    if folded:
+        fold(root)
+
+    if typed:
+        with contextlib.redirect_stdout(io.StringIO()):
+            root.content.check_types()
+
+    return lowering.run(root)
+
+
+def plain(value: Any) -> Any:
+    '''`value` with its vectors & matrices as nested lists, whatever their representation.'''
+
+    if isinstance(value, compact.Matrix) or (ndarrays.available and isinstance(value, ndarrays.ndarray)):
+        return value.tolist()
+
+    if isinstance(value, list):
+        return [plain(element) for element in value]
+
+    return value
+
+
+representations = ['compact', 'numpy'] if ndarrays.available else ['compact']
+
+
+class TestEngines(unittest.TestCase):
+    '''Every program has to give the same result on every engine.'''
+
+    def check(self, source: str, expected: Any) -> None:
+        variants = [
+            dict(),
+            dict(assembled=True),
+            dict(dynamic=True),
+            dict(level=2),
+            dict(folded=True),
+            dict(inlined=True),
+        ]
+
+        for engine in engines:
+            for options in variants:
+                with self.subTest(engine=engine, **options):
+                    self.assertEqual(execute(source, engine, **options), expected)
+
+        for options in variants:  # every loop recompiled at its first back-edge
+            with self.subTest(engine='tiered', threshold=1, **options):
+                self.assertEqual(execute(source, 'tiered', threshold=1, **options), expected)
+
+        for folded in (False, True):
+            with self.subTest(backend='python', folded=folded):
+                self.assertEqual(lower_and_run(source, folded=folded), expected)
+
+        for representation in representations:
+            std.use(representation)
+
+            try:
+                for engine in engines:
+                    with self.subTest(engine=engine, arrays=representation):
+                        self.assertEqual(plain(execute(source, engine)), expected)
+            finally:
+                std.use('list')
+
+    def test_operand_order(self):
+        self.check('a = 10 - 3; b = a / 2; return b;', 3.5)
+
+    def test_relational(self):
+        self.check('a = 2 < 3; return a;', True)
+
+    def test_while(self):
+        source = '''
+            i = 0;
+            s = 0;
+            while (i < 10) {
+                s += i;
+                i += 1;
+            }
+            return s;
+        '''
+
+        self.check(source, 45)
+
+    def test_while_break_continue(self):
+        source = '''
+            i = 0;
+            s = 0;
+            while (i < 100) {
+                i += 1;
+                if (i % 2 == 0)
+                    continue;
+                if (i > 10)
+                    break;
+                s += i;
+            }
+            return s;
+        '''
+
+        self.check(source, 25)
+
+    def test_if_else(self):
+        source = '''
+            a = 0;
+            b = 0;
+            if (a == 0) a = 1; else a = 2;
+            if (b != 0) b = 1; else b = 2;
+            return [a, b];
+        '''
+
+        self.check(source, [1, 2])
+
+    def test_for_break_continue(self):
+        source = '''
+            s = 0;
+            for (i in 1:100) {
+                if (i == 2)
+                    continue;
+                if (i > 5)
+                    break;
+                s += i;
+            }
+            return s;
+        '''
+
+        self.check(source, 13)
+
+    def test_for_step(self):
+        source = '''
+            n = 0;
+            for (i in 1:3:10)
+                n += 1;
+            down = 0;
+            for (i in 10:-2:0)
+                down += i;
+            for (i in 5:1)
+                down = -1;
+            return [n, down];
+        '''
+
+        self.check(source, [3, 30])  # 1, 4, 7 - the end is exclusive as in unit ranges
+
+    def test_loop_variable_reassigned(self):
+        source = '''
+            s = 0;
+            for (i in 0:3) {
+                s += i;
+                i = 100;
+            }
+            return [s, i];
+        '''
+
+        self.check(source, [3, 100])
+
+    def test_nested_for(self):
+        source = '''
+            s = 0;
+            for (i in 1:4)
+                for (j in i:4) {
+                    if (j == 3)
+                        break;
+                    s += 10 * i + j;
+                }
+            return s;
+        '''
+
+        self.check(source, 11 + 12 + 22)
+
+    def test_range_value(self):
+        source = '''
+            r = 0:2:7;
+            s = 0;
+            for (x in r)
+                s += x;
+            return s;
+        '''
+
+        self.check(source, 12)
+
+    def test_compound_subscript_assignment(self):
+        source = '''
+            v = [1, 2, 3];
+            v[2] += 10;
+            E = [ [1, 2, 3],
+                  [4, 5, 6] ];
+            E[1, 2] *= 5;
+            return [v, E];
+        '''
+
+        self.check(source, [[1, 12, 3], [[1, 2, 3], [20, 5, 6]]])
+
+    def test_broadcast(self):
+        source = '''
+            v = [1, 2, 3] .+ 1;
+            w = 2 .* v;
+            u = v .- w;
+            E = [ [1, 2],
+                  [3, 4] ] .* [ [2, 2],
+                                [1, 1] ];
+            return [v, w, u, E, -u];
+        '''
+
+        self.check(source, [[2, 3, 4], [4, 6, 8], [-2, -3, -4], [[2, 4], [3, 4]], [2, 3, 4]])
+
+    def test_subscription(self):
+        source = '''
+            E = [ [1, 2, 3],
+                  [4, 5, 6] ];
+            E[1, 2] = 0;
+            return E;
+        '''
+
+        self.check(source, [[1, 2, 3], [0, 5, 6]])
+
+    def test_example_loop(self):
+        self.check(read_file('data/example_loop.m'), 4)
+
+    def test_return_without_value(self):
+        self.check('a = 1; return; a = 2;', None)
+
+    def test_function_call(self):
+        source = '''
+            function add(x, y) {
+                z = x + y;
+                return z * 2;
+            }
+
+            a = add(1, 2);
+            return add(a, 1);
+        '''
+
+        self.check(source, 14)
+
+    def test_unused_parameters(self):
+        source = '''
+            function f(x) { return 1; }
+            function g(a, b) { return a; }
+            function h(x) { y = x; return 2; }
+
+            return f(2) + g(3, 4) + h(5);
+        '''
+
+        self.check(source, 6)
+
+    def test_recursion(self):
+        source = '''
+            s = 0;
+
+            for (n in 0:10)
+                s += fib(n);
+
+            function fib(n) {
+                if (n < 2)
+                    return n;
+
+                return fib(n - 1) + fib(n - 2);
+            }
+
+            return s;
+        '''
+
+        self.check(source, 88)
+
+    def test_constructors(self):
+        source = '''
+            n = 2;
+            A = zeros(2, 3);
+            A[2, 1] = 5;
+            return A, ones(n), eye(2), zeros(1);
+        '''
+
+        self.check(source, [[[0, 5, 0], [0, 0, 0]], [[1, 1], [1, 1]], [[1, 0], [0, 1]], [[0]]])
+
+    def test_transpose(self):
+        source = '''
+            A = [ [1, 2, 3],
+                  [4, 5, 6] ];
+            B = A';
+            B[1, 2] = 20;
+            return A, B, [1, 2]', B .+ 1;
+        '''
+
+        self.check(source, [[[1, 2, 3], [4, 5, 6]], [[1, 4], [20, 5], [3, 6]], [[1], [2]], [[2, 5], [21, 6], [4, 7]]])
+
+    def test_slices(self):
+        source = '''
+            A = [ [1, 2, 3, 4],
+                  [5, 6, 7, 8] ];
+            B = A[2:4, :];
+            B[1, 1] = 0;
+            A[1:3, 1] = [10, 20];
+            A[4, :] = 9;
+            v = [1, 2, 3, 4, 5];
+            v[1:2:6] = v[5:-2:0];
+            return A[2:4, 2], A[3, :], B, A, v;
+        '''
+
+        self.check(source, [[6, 7], [3, 7], [[0, 3], [6, 7]], [[10, 20, 3, 9], [5, 6, 7, 9]], [5, 2, 3, 4, 1]])
+
+    def test_function_without_result(self):
+        self.check('function f(x) { x += 1; } f(1); return f(2);', None)
+
+    def test_loop_exit_restores_stack(self):
+        source = '''
+            r = 0:10;
+            for (x in r)
+                for (y in 0:10)
+                    if (y == x)
+                        break;
+                    else if (x == 3)
+                        break;
+            while (1 < 2)
+                break;
+        '''
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                frame = Frame(VirtualMachine(), dict(), build(source), engine=engine)
+                next(frame.execution)
+
+                self.assertEqual(frame.stack, [])
+                self.assertEqual(frame.blocks, [])
+
+    def test_threaded_resolves_operators_on_load(self):
+        code = [(Operation.PUSH, 1), (Operation.PUSH, 2), (Operation.BINARY_OP, '**'), Operation.RETURN_VALUE]
+
+        with self.assertRaises(NotImplementedError):
+            VirtualMachine().load(code, engine='threaded')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            VirtualMachine().load([], engine='unknown')
+
+
+class TestFunctions(unittest.TestCase):
+    def test_deep_recursion_keeps_the_python_stack_flat(self):
+        source = '''
+            function depth(n) {
+                if (n == 0)
+                    return 0;
+
+                return depth(n - 1) + 1;
+            }
+
+            return depth(5000);
+        '''
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                self.assertEqual(execute(source, engine, assembled=True), 5000)
+
+    def test_frames_are_pooled(self):
+        source = '''
+            function square(x) { return x * x; }
+
+            s = 0;
+            for (i in 0:100)
+                s += square(i);
+            return s;
+        '''
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                vm = VirtualMachine()
+                vm.load(build(source), engine=engine)
+
+                self.assertEqual(vm.run(), sum(i * i for i in range(100)))
+                self.assertEqual(vm.allocated, 2)  # the program's frame & one recycled for every call
+
+    def test_builtin_print(self):
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(execute('print 1, 2; return 3;', 'dispatch'), 3)
+
+        self.assertTrue(output.getvalue().startswith('1\n2\n'))
+
+    def test_call_errors(self):
+        with self.assertRaises(NameError):
+            execute('return g(1);', 'dispatch')
+
+        with self.assertRaises(TypeError):
+            execute('function g(x) { return x; } return g(1, 2);', 'dispatch')
+
+    def test_profile_per_function(self):
+        profile = Profile()
+
+        vm = VirtualMachine()
+        vm.load(build('function g(x) { return x + 1; } s = 0; for (i in 0:5) s = g(s); return s;'))
+
+        self.assertEqual(vm.run(profile=profile), 5)
+        self.assertEqual(profile.functions['g'].counts, [5] * 4)
+        self.assertIn('program;g;', profile.collapsed())
+
+
+class TestInlining(unittest.TestCase):
+    source = '''
+        function square(x) { return x * x; }
+
+        function scale(x, y) {
+            z = x + y;
+            z *= 2;
+            return z;
+        }
+
+        function fib(n) {
+            if (n < 2)
+                return n;
+
+            return fib(n - 1) + fib(n - 2);
+        }
+
+        s = 0;
+        z = 100;
+
+        for (i in 0:10)
+            s += square(scale(i, z));
+
+        i = 0;
+        while (square(i) < 50)
+            i += 1;
+
+        return s + fib(5) + i + z;
+    '''
+
+    def test_small_functions_are_inlined(self):
+        root = parse(self.source)
+        report = inline(root)
+
+        self.assertEqual(report.inlined, { 'square': 1, 'scale': 1 })  # not in the while condition
+        self.assertEqual(report.rejected, { 'fib': 'recursive' })
+
+        calls = [command for command in compile(root) if command == (Operation.PUSH, 'square')]
+        self.assertEqual(len(calls), 1)
+
+    def test_locals_are_not_captured(self):
+        expected = execute(self.source, 'dispatch')
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                self.assertEqual(execute(self.source, engine, inlined=True), expected)
+
+        self.assertEqual(expected, sum((2 * (i + 100)) ** 2 for i in range(10)) + 5 + 8 + 100)
+
+    def test_budget(self):
+        report = inline(parse(self.source), budget=8)
+
+        self.assertEqual(report.inlined, dict())  # the only call of square passes it a call left in place
+        self.assertEqual(report.rejected['scale'], '12 nodes')
+
+    def test_calls_left_in_place_keep_their_order(self):
+        source = '''
+            function first(v) { v[1] = 2; return 0; }
+            function read(v) { return v[1]; }
+
+            v = [1];
+            a = first(v) + read(v);
+            return a;
+        '''
+
+        report = inline(parse(source), budget=8)  # first is too large, read must not move ahead of it
+
+        self.assertEqual(report.rejected, { 'first': '10 nodes' })
+        self.assertEqual(report.inlined, dict())
+        self.assertEqual(execute(source, 'dispatch', inlined=True), 2)
+
+    def test_stores_into_parameters_are_not_moved(self):
+        source = '''
+            function f(p) { p[1] = 100; return 1; }
+            function g(p) { q = p; q[2] += 10; return 1; }
+            function h(p) { q = [0, 0]; q[1] = p[1]; return q[1]; }
+
+            v = [1, 2, 3];
+            y = v[1] + f(v);
+            z = v[2] + g(v);
+            return y, z, h(v);
+        '''
+
+        report = inline(parse(source))
+
+        self.assertEqual(report.rejected, { 'f': 'writes into a parameter', 'g': 'writes into a parameter' })
+        self.assertEqual(report.inlined, { 'h': 1 })
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                self.assertEqual(execute(source, engine, inlined=True), [2, 3, 100])
+                self.assertEqual(execute(source, engine), [2, 3, 100])
+
+
+class TestMemoization(unittest.TestCase):
+    fib = '''
+        function fib(n) {
+            if (n < 2)
+                return n;
+
+            return fib(n - 1) + fib(n - 2);
+        }
+
+        return fib(20);
+    '''
+
+    def test_purity(self):
+        source = '''
+            function fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+            function twice(n) { return fib(n) * 2; }
+            function fresh(n) { v = [0, 0]; v[1] = n; return v[1]; }
+            function shout(n) { print n; return n; }
+            function caller(n) { return shout(n); }
+            function writes(v) { v[1] = 0; return 0; }
+            function alias(v) { w = v; w[1] = 0; return 0; }
+            function shadows(n) { total = n; return n; }  # assigns a variable of its own
+            function corner(n) { Z = eye(n); return Z[1, 1]; }
+
+            total = 0;
+            return twice(1) + fresh(2);
+        '''
+
+        self.assertEqual(pure(parse(source)), { 'fib', 'twice', 'fresh', 'shadows', 'corner' })
+
+    def test_results_are_reused(self):
+        for engine in engines:
+            with self.subTest(engine=engine):
+                vm = VirtualMachine(memo_size=64)
+                vm.load(build(self.fib), engine=engine)
+
+                self.assertEqual(vm.run(), 6765)
+                self.assertEqual(vm.memo.misses, 21)  # fib(0) to fib(20) computed once each
+                self.assertEqual(vm.memo.hits, 18)
+
+    def test_off_by_default(self):
+        vm = VirtualMachine()
+        vm.load(build(self.fib))
+
+        self.assertEqual(vm.run(), 6765)
+        self.assertEqual((vm.memo.hits, vm.memo.misses), (0, 0))
+
+    def test_least_recently_used_is_evicted(self):
+        memo = Memo(2)
+
+        for n in (1, 2, 1, 3):
+            if memo.lookup(memo.key('f', [n])) is missing:
+                memo.store(memo.key('f', [n]), n)
+
+        self.assertEqual((memo.hits, memo.misses, memo.evictions), (1, 3, 1))
+        self.assertIs(memo.lookup(memo.key('f', [2])), missing)
+        self.assertEqual(memo.lookup(memo.key('f', [1])), 1)
+
+    def test_only_scalars_are_memoized(self):
+        memo = Memo(8)
+
+        self.assertIsNone(memo.key('f', [[1, 2]]))
+        self.assertNotEqual(memo.key('f', [1]), memo.key('f', [1.0]))
+
+        memo.store(memo.key('f', [1]), [1])
+        self.assertEqual(len(memo.entries), 0)
+
+        source = '''
+            function first(v) { return v[1]; }
+
+            v = [1, 2];
+            s = first(v);
+            v[1] = 10;
+            return s + first(v);
+        '''
+
+        vm = VirtualMachine(memo_size=8)
+        vm.load(build(source))
+
+        self.assertEqual(vm.run(), 11)
+        self.assertEqual((vm.memo.hits, vm.memo.misses), (0, 0))
+
+
+class TestArrays(unittest.TestCase):
+    source = '''
+        v = [1, 2, 3] .+ 1;
+        E = [ [1, 2],
+              [3, 4] ] .* 2;
+        E[1, 2] = 7;
+        w = v ./ 2;
+        same = v == [2, 3, 4];
+        return E[1, 2] + E[2, 1] + v[3], same, w[1], E[2];
+    '''
+
+    def test_element_types(self):
+        self.assertEqual(ndarrays.element_type([1, 2]), int32)
+        self.assertEqual(ndarrays.element_type([[1, 2], [3, 4.5]]), float64)
+        self.assertIsNone(ndarrays.element_type([[1, 2], [3]]))  # ragged
+        self.assertIsNone(ndarrays.element_type([[1, 2], 3]))
+        self.assertIsNone(ndarrays.element_type(['a', 'b']))
+
+    def test_literals_are_typed(self):
+        code = build('v = [1, 2]; E = [ [1.5, 2.5] ]; return v;', typed=True)
+        arrays = [command[1] for command in code if isinstance(command, tuple) and command[0] == Operation.MAKE_ARRAY]
+
+        self.assertEqual(arrays, ['int32', 'float64'])
+
+    @unittest.skipIf(ndarrays.available, 'NumPy is installed')
+    def test_numpy_is_optional(self):
+        with self.assertRaises(ModuleNotFoundError):
+            std.use('numpy')
+
+        self.assertEqual(std.representation, 'list')
+
+    def results(self, representation: str) -> Sequence[tuple[str, bool, Any]]:
+        std.use(representation)
+
+        try:
+            for engine in engines:
+                for typed in (False, True):
+                    with self.subTest(engine=engine, typed=typed):
+                        total, same, half, row = execute(self.source, engine, typed=typed)
+
+                        self.assertEqual((total, same, half), (7 + 4 + 4, True, 1.0))
+                        self.assertIs(type(total), int)  # no NumPy scalar escapes a subscript
+
+                        yield engine, typed, row
+        finally:
+            std.use('list')
+
+    def test_compact(self):
+        for _, _, row in self.results('compact'):
+            self.assertIsInstance(row, compact.Matrix)
+            self.assertEqual(row, [7, 8])
+            self.assertEqual(row.buffer.typecode, 'q')
+
+    @unittest.skipUnless(ndarrays.available, 'NumPy is not installed')
+    def test_numpy(self):
+        for _, _, row in self.results('numpy'):
+            self.assertEqual(row.tolist(), [7, 8])
+            self.assertEqual(str(row.dtype), 'int32')
+
+    float_stores = [  # a float stored into integers keeps its value, as a nested list holds it
+        ('v = [2, 4]; v[1] = v[1] / 4; return v;', [0.5, 4]),
+        ('v = [2, 4]; v[1] /= 2; return v;', [1.0, 4]),
+        ('E = [ [1, 2], [3, 4] ]; E[:, 1] = [0.5, 1.5]; return E;', [[0.5, 1.5], [3, 4]]),
+        ('E = [ [1.5, 2.5], [3.5, 4.5] ]; E[:, 1] = [5, 6]; E[2, 2] = 7; return E;', [[5, 6], [3.5, 7]]),
+    ]
+
+    def stored(self, representation: str) -> Sequence[tuple[str, Any, Any]]:
+        std.use(representation)
+
+        try:
+            for source, expected in self.float_stores:
+                for typed in (False, True):
+                    with self.subTest(representation=representation, source=source, typed=typed):
+                        try:
+                            result = execute(source, 'match', typed=typed)
+                        except TypeError as error:
+                            result = error
+
+                        yield source, expected, result
+        finally:
+            std.use('list')
+
+    def test_float_stores(self):
+        for representation in ('list', 'compact'):
+            for _, expected, result in self.stored(representation):
+                self.assertEqual(result, expected)
+
+    @unittest.skipUnless(ndarrays.available, 'NumPy is not installed')
+    def test_float_stores_into_numpy(self):
+        for source, expected, result in self.stored('numpy'):
+            if source.startswith('E = [ [1.5'):  # stores into floats
+                self.assertEqual(result.tolist(), expected)
+            else:
+                self.assertIsInstance(result, TypeError)  # an int32 ndarray cannot hold a float, it is not truncated
+
+    def test_constants_are_copied_on_write(self):
+        source = '''
+            function filled(x) {
+                Z = zeros(2, 2);
+                Z[1, 1] = x;
+                return Z;
+            }
+
+            a = filled(1);
+            b = filled(2);
+            return a, b, zeros(2, 2);
+        '''
+
+        std.use('compact')
+
+        try:
+            code = assemble(build(source))
+            constants = [
+                value
+                for pool in (code.constants, functions(code)[0].code.constants)
+                for value in pool
+                if isinstance(value, compact.Matrix)
+            ]
+
+            for engine in engines:
+                with self.subTest(engine=engine):
+                    vm = VirtualMachine()
+                    vm.load(code, engine=engine)
+
+                    self.assertEqual(vm.run(), [[[1, 0], [0, 0]], [[2, 0], [0, 0]], [[0, 0], [0, 0]]])
+                    self.assertEqual(constants, [[[0, 0], [0, 0]]] * 2)  # one per call site, never written
+        finally:
+            std.use('list')
+
+    def test_constructors_are_folded_only_if_shared(self):
+        def folded(source: str) -> bool:
+            return any(isinstance(command, tuple) and isinstance(command[1], compact.Matrix) for command in build(source))
+
+        std.use('compact')
+
+        try:
+            self.assertTrue(folded('return eye(3);'))
+            self.assertFalse(folded('n = 3; return eye(n);'))
+            self.assertFalse(folded('return zeros(100, 100);'))  # too large for the pool
+        finally:
+            std.use('list')
+
+        self.assertFalse(any(command == (Operation.MAKE_ARRAY, None) for command in build('return eye(3);')))
+
+    def test_views(self):
+        A = compact.Matrix.of([[1, 2, 3], [4, 5, 6]])
+        row = A.read([1])  # an alias, taken before A is viewed
+        B = A.transpose()
+
+        self.assertIs(B.buffer, A.buffer)  # O(1), no element copied
+        self.assertEqual((B.shape, B.strides), ((3, 2), (1, 3)))
+        self.assertEqual(B, [[1, 4], [2, 5], [3, 6]])
+        self.assertEqual(B.read([2, 3]), 6)
+        self.assertEqual(list(B.read([2]).elements()), [2, 5])  # a strided row
+        self.assertEqual(compact.broadcast(lambda x, y: x * y, B, 10), [[10, 40], [20, 50], [30, 60]])
+
+        row.write([1], 10)  # copies, B keeps its elements
+        self.assertEqual(A, [[10, 2, 3], [4, 5, 6]])
+        self.assertEqual(B, [[1, 4], [2, 5], [3, 6]])
+
+        B.read([3]).write([2], 60)  # a row of B aliases B, not A
+        self.assertEqual(B, [[1, 4], [2, 5], [3, 60]])
+        self.assertEqual(A, [[10, 2, 3], [4, 5, 6]])
+        self.assertIsNot(B.buffer, A.buffer)
+
+        self.assertEqual(compact.Matrix.of([1, 2]).transpose(), [[1], [2]])
+        self.assertEqual(B.transpose().transpose(), B)
+
+    def test_slices_are_views(self):
+        A = compact.Matrix.of([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        column = A.select([2, whole])
+        block = A.select([slice(2, 4, 1), slice(1, 3, 1)])
+
+        self.assertIs(column.buffer, A.buffer)
+        self.assertEqual((column, column.strides), ([2, 5, 8], (3,)))
+        self.assertEqual(block, [[2, 3], [5, 6]])
+        self.assertEqual(A.select([slice(3, 0, -1), 1]), [3, 2, 1])
+
+        A.assign([whole, 3], [70, 80, 90])  # a bulk copy, the views keep their elements
+        A.assign([slice(1, 4, 2), whole], 0)
+        self.assertEqual(A, [[0, 2, 0], [0, 5, 0], [0, 80, 0]])
+        self.assertEqual(column, [2, 5, 8])
+
+        A.assign([whole, 1], A.select([whole, 3]))
+        self.assertEqual(A.read([1]), [0, 80, 0])
+
+        with self.assertRaises(ValueError):
+            A.assign([slice(1, 3, 1), 1], [1, 2, 3])
+
+        with self.assertRaises(IndexError):
+            A.select([slice(2, 5, 1), 1])
+
+    def test_slices_are_typed(self):
+        source = '''
+            A = [ [1.5, 2.5],
+                  [3.5, 4.5] ];
+            v = [1, 2, 3];
+            a = A[1:3, 1];
+            b = A[:, :];
+            c = A[1:2];
+            d = v[2:4];
+            return a;
+        '''
+
+        root = parse(source)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            root.content.check_types()
+
+        types = [action.right.type.name for action in root.content.actions[2:6]]
+        self.assertEqual(types, ['vector', 'matrix', 'matrix', 'vector'])
+
+    def test_compact_layout(self):
+        E = compact.Matrix.of([[1, 2, 3], [4, 5, 6]])
+
+        self.assertEqual((E.shape, E.strides, len(E.buffer)), ((2, 3), (3, 1), 6))
+        self.assertEqual(E.read([3, 2]), 6)  # column 3 of row 2
+
+        row = E.read([2])
+        row.write([1], 40)  # shares the buffer, as the row of a nested list would
+        self.assertEqual(E, [[1, 2, 3], [40, 5, 6]])
+
+        E.write([1], [7, 8, 9])
+        self.assertEqual(E.tolist(), [[7, 8, 9], [40, 5, 6]])
+
+        with self.assertRaises(IndexError):
+            E.read([4, 1])
+
+        E.write([1, 1], 0.5)  # promotes the buffer, the row shares it still
+        row.write([2], 50)
+        self.assertEqual(E.tolist(), [[0.5, 8, 9], [40, 50, 6]])
+        self.assertEqual(row.buffer.typecode, 'd')
+
+        with self.assertRaises(TypeError):
+            E.write([1, 1], 'a')
+
+        self.assertEqual(compact.Matrix.identity(3), [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+        self.assertEqual(compact.Matrix.filled((2,), 1.5).buffer.typecode, 'd')
+        self.assertEqual(compact.Matrix.of([[1, 2], [3]]), [[1, 2], [3]])  # ragged, left a list
+
+
+class TestProducts(unittest.TestCase):
+    source = '''
+        A = [ [1, 2, 3],
+              [4, 5, 6] ];
+        B = [ [1.5, 0.0],
+              [0.0, 2.0],
+              [1.0, 1.0] ];
+        C = [ [1, 1],
+              [0, 1] ];
+        C *= C;
+        return A * B, C;
+    '''
+
+    expected = [[[4.5, 7.0], [12.0, 16.0]], [[1, 2], [0, 1]]]
+
+    def test_typed_matrices_are_multiplied(self):
+        self.assertIn((Operation.BINARY_OP, '@'), build(self.source, typed=True))
+        self.assertNotIn((Operation.BINARY_OP, '@'), build(self.source))  # untyped, `*` decides at run time
+
+        for representation in ['list', *representations]:
+            std.use(representation)
+
+            try:
+                for engine in engines:
+                    for typed in (False, True):
+                        with self.subTest(representation=representation, engine=engine, typed=typed):
+                            self.assertEqual(plain(execute(self.source, engine, typed=typed)), self.expected)
+            finally:
+                std.use('list')
+
+        for typed in (False, True):
+            self.assertEqual(lower_and_run(self.source, typed=typed), self.expected)
+
+    def test_untyped_products_are_alike(self):
+        source = '''
+            function f(X, Y) { return X * Y; }
+
+            A = [ [1, 2],
+                  [3, 4] ];
+            return f(A, A), f(2, A), f(A, 0.5), f(3, 4);
+        '''
+
+        expected = [[[7, 10], [15, 22]], [[2, 4], [6, 8]], [[0.5, 1.0], [1.5, 2.0]], 12]
+
+        for representation in ['list', *representations]:
+            std.use(representation)
+
+            try:
+                for engine in engines:
+                    with self.subTest(representation=representation, engine=engine):
+                        self.assertEqual(plain(execute(source, engine, typed=True)), expected)
+
+                        with self.assertRaises(TypeError):  # a vector is no matrix
+                            execute('v = [1, 2]; w = v; return v * w;', engine)
+            finally:
+                std.use('list')
+
+        self.assertEqual(plain(lower_and_run(source, typed=True)), expected)
+
+    def test_kernels(self):
+        def naive(left: list[list[Any]], right: list[list[Any]]) -> list[list[Any]]:
+            return [[sum(a * b for a, b in zip(row, column)) for column in zip(*right)] for row in left]
+
+        left = [[(i * 7 + k * 3) % 11 for k in range(products.BLOCK + 5)] for i in range(3)]  # more than one tile
+        right = [[(k + j) % 5 - 2 for j in range(products.BLOCK + 2)] for k in range(products.BLOCK + 5)]
+        halves = [[value / 2 for value in row] for row in right]
+
+        row = compact.Matrix.of(left).read([2])
+        view = compact.Matrix(row.buffer, (1, 3), offset=row.offset)  # not at the start of its buffer
+
+        crossover = products.CROSSOVER
+
+        for kernel, threshold in [('blocked', float('inf')), ('numpy', 0)]:  # the blocked one with NumPy present too
+            with self.subTest(kernel=kernel):
+                products.CROSSOVER = threshold
+
+                try:
+                    self.assertEqual(products.product(left, right), naive(left, right))
+                    self.assertEqual(products.product(compact.Matrix.of(left), compact.Matrix.of(halves)), naive(left, halves))
+                    self.assertEqual(products.product([[1], [2]], view), naive([[1], [2]], [left[1][:3]]))
+
+                    with self.assertRaises(ValueError):
+                        products.product(left, left)
+                finally:
+                    products.CROSSOVER = crossover
+
+    def test_pure_python_kernel_without_numpy(self):
+        available = ndarrays.available
+        ndarrays.available = False
+
+        try:
+            result = products.product(compact.Matrix.of([[1, 2], [3, 4]]), compact.Matrix.of([[0, 1], [1, 0]]))
+        finally:
+            ndarrays.available = available
+
+        self.assertEqual(result, [[2, 1], [4, 3]])
+        self.assertEqual(result.buffer.typecode, 'q')
+
+
+class TestCodeObject(unittest.TestCase):
+    source = '''
+        a = 1;
+        b = 1.0;
+        c = a + b + 1;
+        while (a < 3)
+            a += 1;
+    '''
+
+    def test_round_trip(self):
+        code = build(self.source)
+        code_object = assemble(code)
+
+        self.assertEqual(code_object.instructions(), code)
+        self.assertEqual(len(code_object), len(code))
+        self.assertEqual(disassemble(code_object), disassemble(code))
+
+    def test_tables_are_deduplicated(self):
+        code_object = assemble(build(self.source, dynamic=True))
+
+        self.assertEqual(code_object.names, ['a', 'b', 'c'])
+        self.assertEqual(
+            [(type(c), c) for c in code_object.constants if isinstance(c, int | float)],
+            [(int, 1), (float, 1.0), (int, 3)]
+        )
+
+    def test_signed_zeros_are_kept_apart(self):
+        code_object = assemble(build('a = 0.0; b = -0.0; return a, b;', folded=True))
+        zeros = [c for c in code_object.constants if type(c) is float]
+
+        self.assertEqual([str(c) for c in zeros], ['0.0', '-0.0'])
+
+        vm = VirtualMachine()
+        vm.load(code_object)
+
+        self.assertEqual([str(c) for c in vm.run()], ['0.0', '-0.0'])
+
+    def test_operand_count_is_checked(self):
+        with self.assertRaises(ValueError):
+            assemble([(Operation.JUMP,)])
+
+
+class TestSlots(unittest.TestCase):
+    def test_variables_use_slots(self):
+        code = build(read_file('data/example_loop.m'))
+        ops = {command[0] for command in code if isinstance(command, tuple)}
+
+        self.assertIn(Operation.LOAD_FAST, ops)
+        self.assertNotIn(Operation.LOAD_NAME, ops)
+        self.assertNotIn(Operation.STORE_NAME, ops)
+
+    def test_frame_size(self):
+        code = build('a = 1; b = [a]; b[1] += a; for (i in 1:2) a = i;')
+
+        self.assertEqual(frame_size(code), 6)  # a, b, i, __local_index_0, __local_element, loop counter
+        self.assertEqual(frame_size(assemble(code)), 6)
+
+    def test_dynamic_uses_names(self):
+        code = build('a = 1; b = a;', dynamic=True)
+
+        self.assertEqual(code, [
+            (Operation.PUSH, 1),
+            (Operation.STORE_NAME, 'a'),
+            (Operation.LOAD_NAME, 'a'),
+            (Operation.STORE_NAME, 'b'),
+        ])
+
+
+class TestOptimizer(unittest.TestCase):
+    def test_push_pop(self):
+        code = [
+            (Operation.PUSH, 1),
+            Operation.POP,
+            (Operation.PUSH, 2),
+        ]
+
+        optimized, report = optimize(code)
+
+        self.assertEqual(optimized, [(Operation.PUSH, 2)])
+        self.assertEqual(report.removed['push_pop'], 2)
+
+    def test_jump_threading(self):
+        code = [
+            (Operation.PUSH, True),
+            (Operation.JUMP_IF_FALSE, 2),
+            (Operation.JUMP, 2),
+            (Operation.JUMP, 2),
+            (Operation.PUSH, 1),
+            Operation.RETURN_VALUE,
+        ]
+
+        optimized, report = optimize(code)
+
+        self.assertEqual(optimized, [
+            (Operation.PUSH, True),
+            (Operation.JUMP_IF_FALSE, 2),
+            (Operation.PUSH, 1),
+            Operation.RETURN_VALUE,
+        ])
+        self.assertEqual(report.rewritten['jump_threading'], 1)
+        self.assertEqual(report.removed['jump_to_next'] + report.removed['unreachable'], 2)
+
+    def test_jump_cycle(self):
+        code = [
+            (Operation.JUMP, 1),
+            (Operation.JUMP, -1),
+        ]
+
+        optimized, _ = optimize(code)
+
+        self.assertEqual(optimized, [(Operation.JUMP, 0)])  # still spins forever
+
+    def test_temporaries(self):
+        code = build('v = [1, 2]; v[2] += 3; return v;')
+        optimized, report = optimize(code, 2)
+
+        self.assertEqual(report.removed['store_swap'], 1)
+        self.assertEqual(report.after, len(optimized))
+        self.assertLess(len(optimized), len(code))
+
+    def test_level_zero(self):
+        code = build(read_file('data/example_loop.m'))
+        optimized, report = optimize(code, 0)
+
+        self.assertIs(optimized, code)
+        self.assertEqual(report.removed, dict())
+
+
+class TestFolding(unittest.TestCase):
+    def test_constant_expressions(self):
+        root = parse('x = 2 * 3 + 4; v = [1, 2, 3] .+ 1; y = -x;')
+        statistics = fold(root)
+
+        self.assertEqual(statistics.folded, 4)
+        self.assertNotIn((Operation.BINARY_OP, '+'), compile(root))
+        self.assertNotIn((Operation.BINARY_OP, '.+'), compile(root))
+
+    def test_propagation(self):
+        source = '''
+            n = 10;
+            k = n * 2;
+            m = 1;
+            m += k;
+            return m + n;
+        '''
+
+        root = parse(source)
+        statistics = fold(root)
+
+        self.assertEqual(statistics.propagated, 3)  # n twice, k once; m is assigned twice
+        self.assertEqual(root.content.actions[1].right.value, 20)
+
+    def test_nested_definition_is_not_propagated(self):
+        root = parse('a = 0; if (a == 1) b = 2; c = b;')
+        fold(root)
+
+        self.assertIsInstance(root.content.actions[2].right, Identifier)
+
+    def test_functions_keep_their_names(self):
+        for source, expected in [
+            ('N = 5; function f(x) { N = x; return N + x; } return f(1);', 2),
+            ('N = 5; function f(N) { return N * 2; } return f(1) + N;', 7),
+        ]:
+            with self.subTest(source=source):
+                self.assertEqual(execute(source, 'match', folded=True), expected)
+                self.assertEqual(lower_and_run(source, folded=True), expected)
+
+    def test_errors_are_left_to_runtime(self):
+        root = parse('x = 1 / 0;')
+
+        self.assertEqual(fold(root).folded, 0)
+
+
+class TestSpecialization(unittest.TestCase):
+    source = '''
+        i = 0;
+        s = 0;
+        x = 0.5;
+        while (i < 10) {
+            i += 1;
+            if (i % 3 == 0)
+                continue;
+            s += i * 2 - 1;
+            x *= 1.5;
+        }
+        return [s / 1, x / 2, i / 4];
+    '''
+
+    def test_typed_code_is_specialized(self):
+        code = build(self.source, typed=True)
+        operations = [command[0] if isinstance(command, tuple) else command for command in code]
+
+        self.assertNotIn(Operation.BINARY_OP, operations)
+        self.assertNotIn(Operation.JUMP_IF_FALSE, operations)
+
+        for op in (Operation.JUMP_UNLESS_LT_INT, Operation.JUMP_UNLESS_EQ_INT,
+                   Operation.BINARY_MODULO_INT, Operation.BINARY_MULTIPLY_FLOAT, Operation.BINARY_DIVIDE_FLOAT):
+            self.assertIn(op, operations)
+
+    def test_untyped_code_is_generic(self):
+        self.assertIn((Operation.BINARY_OP, '+'), build(self.source))
+
+    def test_results_match_generic(self):
+        expected = execute(self.source, 'match')
+
+        for engine in engines:
+            for options in (dict(), dict(assembled=True), dict(level=2), dict(folded=True)):
+                with self.subTest(engine=engine, **options):
+                    self.assertEqual(execute(self.source, engine, typed=True, **options), expected)
+
+    def test_broadcast_is_not_specialized(self):
+        code = build('v = [1, 2] .+ 1; return v;', typed=True)
+
+        self.assertIn((Operation.BINARY_OP, '.+'), code)
+
+    def test_call_results_are_untyped(self):
+        source = 'function f(x) { return x; } a = f(1); return a + 1;'
+
+        self.assertIn((Operation.BINARY_OP, '+'), build(source, typed=True))  # `a` is unknown, not `nothing`
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                self.assertEqual(execute(source, engine, typed=True), 2)
+
+    def test_return_types(self):
+        types = []
+
+        for source in ('return 1;', 'return;', 'return 1, 2.5;'):
+            root = parse(source)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                root.content.check_types()
+
+            types.append(root.content.actions[0].type)
+
+        self.assertEqual(types, [int32, nothing, None])  # several values are left untyped
+
+    def test_ranges_bounded_by_calls(self):
+        source = '''
+            function f(x) { return x; }
+            s = 0;
+            for (i in 1:f(4))
+                if (i <= 5 / 2)
+                    s += i;
+            return s;
+        '''
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                self.assertEqual(execute(source, engine, typed=True), 3)
+
+        self.assertEqual(lower_and_run(source, typed=True), 3)
+
+
+class TestVerifier(unittest.TestCase):
+    def test_stack_size(self):
+        code = build('a = 1 + 2 * 3; v = [a, [a, a]];')
+
+        self.assertEqual(stack_size(code), 3)  # 1, 2, 3 - and the outer list, the inner one, a
+        self.assertEqual(stack_size(assemble(code)), 3)
+        self.assertEqual(stack_size(build(read_file('data/example_loop.m'))), 3)
+
+    def test_underflow(self):
+        with self.assertRaises(ValueError):
+            analyze([(Operation.PUSH, 1), (Operation.BINARY_OP, '+')])
+
+        with self.assertRaises(ValueError):
+            VirtualMachine().load([Operation.POP])
+
+    def test_jump_out_of_range(self):
+        with self.assertRaises(ValueError):
+            analyze([(Operation.PUSH, True), (Operation.JUMP_IF_FALSE, 5)])
+
+        with self.assertRaises(ValueError):
+            assemble([(Operation.JUMP, -1)])
+
+    def test_inconsistent_depth(self):
+        code = [
+            (Operation.PUSH, True),
+            (Operation.JUMP_IF_FALSE, 2),
+            (Operation.PUSH, 1),
+            (Operation.PUSH, 2),
+        ]
+
+        with self.assertRaises(ValueError):
+            analyze(code)
+
+    def test_loop_blocks(self):
+        code = build('r = 0:3; for (x in r) if (x == 1) break;')
+
+        self.assertEqual(stack_size(code), 3)  # iterator, x, 1
+        self.assertEqual(analyze([Operation.SETUP_LOOP, (Operation.PUSH, 1), Operation.CLEAR_LOOP]), 1)
+
+        with self.assertRaises(ValueError):
+            analyze([Operation.CLEAR_LOOP])
+
+
+class TestPythonBackend(unittest.TestCase):
+    def test_indices_are_one_based(self):
+        module, _ = lowering.lower(parse('v = [1, 2, 3]; i = 2; v[i] = v[3]; return v;'))
+        source = ast.unparse(module)
+
+        self.assertIn('v_v[v_i - 1] = v_v[2]', source)
+        self.assertEqual(lower_and_run('v = [1, 2, 3]; i = 2; v[i] = v[3]; return v;'), [1, 3, 3])
+
+    def test_compound_subscript_evaluates_index_once(self):
+        module, _ = lowering.lower(parse('v = [1, 2]; i = 0; v[i + 1] += 5;'))
+
+        self.assertIn('__temporary_0 = v_i + 1', ast.unparse(module))
+        self.assertEqual(lower_and_run('v = [1, 2]; i = 0; v[i + 1] += 5; return v;'), [6, 2])
+
+    def test_broadcasts_call_stdlib(self):
+        module, functions = lowering.lower(parse('v = [1, 2] .* 3;'))
+
+        self.assertEqual(list(functions.values()), [std.binary_ops['.*']])
+        self.assertEqual(lower_and_run('return [1, 2] .* 3;'), [3, 6])
+
+    def test_results_match_vm_when_typed(self):
+        source = TestSpecialization.source
+
+        self.assertEqual(lower_and_run(source, typed=True), execute(source, 'match'))
+
+
+class TestTiering(unittest.TestCase):
+    source = '''
+        s = 0;
+        for (i in 0:10) {
+            j = 0;
+            while (j < i)
+                j += 1;
+            s += j;
+        }
+        return s;
+    '''
+
+    def run_tiered(self, threshold: int) -> tuple[Any, tiering.Tiering]:
+        vm = VirtualMachine(threshold=threshold)
+        vm.load(build(self.source), engine='tiered')
+
+        return vm.run(), vm.tiering
+
+    def test_cold_loops_stay_interpreted(self):
+        result, statistics = self.run_tiered(threshold=1000)
+
+        self.assertEqual(result, 45)
+        self.assertEqual(statistics.compiled, [])
+        self.assertEqual(sorted(statistics.counters.values()), [9, 45])  # for steps, while iterations
+
+    def test_hot_loops_switch_mid_loop(self):
+        result, statistics = self.run_tiered(threshold=5)
+
+        self.assertEqual(result, 45)
+        self.assertEqual(len(statistics.compiled), 2)  # the inner loop, then the outer one around it
+
+        (_, *inner), (_, *outer) = statistics.compiled
+        self.assertTrue(outer[0] < inner[0] and inner[1] < outer[1])
+        self.assertTrue(all(count <= 5 for count in statistics.counters.values()))
+
+    def test_report(self):
+        _, statistics = self.run_tiered(threshold=5)
+        lines = str(statistics).splitlines()
+
+        self.assertEqual(lines[0], 'tiering, threshold of 5 back-edges: 2 loop(s) recompiled')
+        self.assertEqual(sum(line.endswith('recompiled') for line in lines[1:]), 2)
+
+
+class TestTracing(unittest.TestCase):
+    source = 's = 0; for (i in 0:3) s += i; return s;'
+
+    def test_events_are_streamed(self):
+        file = io.StringIO()
+
+        vm = VirtualMachine()
+        vm.load(build(self.source), tracer=EventWriter(file))
+
+        self.assertEqual(vm.run(), 3)
+
+        events = [json.loads(line) for line in file.getvalue().splitlines()]
+        kinds = [event['event'] for event in events]
+
+        self.assertEqual(kinds.count('loop_iteration'), 2)  # three iterations, two back-edges
+        self.assertEqual(events[-1], { 'event': 'finish', 'frame': events[0]['frame'], 'result': 3 })
+        self.assertEqual(events[0]['op'], 'PUSH')
+
+    def test_tracing_is_independent_of_the_engine(self):
+        class Counter(Tracer):
+            def __init__(self) -> None:
+                self.instructions = 0
+
+            def on_instruction(self, frame, i, op, argument) -> None:
+                self.instructions += 1
+
+        counts = set()
+
+        for engine in engines:
+            with self.subTest(engine=engine):
+                counter = Counter()
+
+                vm = VirtualMachine()
+                vm.load(build(self.source), engine=engine, tracer=counter)
+
+                self.assertEqual(vm.run(), 3)
+                counts.add(counter.instructions)
+
+        self.assertEqual(len(counts), 1)
+
+    def test_debug_prints_the_stack(self):
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output):
+            vm = VirtualMachine()
+            vm.load([(Operation.PUSH, 7), Operation.RETURN_VALUE], debug=True)
+            vm.run()
+
+        self.assertIn('[7]\n\nRETURN_VALUE', output.getvalue())
+
+
+class TestProfiling(unittest.TestCase):
+    source = 's = 0; for (i in 0:3) s += i; return s;'
+
+    def profiled(self) -> tuple[list[Any], Profile]:
+        code = build(self.source)
+        profile = Profile()
+
+        vm = VirtualMachine()
+        vm.load(code)
+
+        self.assertEqual(vm.run(profile=profile), 3)
+
+        return code, profile
+
+    def test_counts(self):
+        code, profile = self.profiled()
+        steps = code.index(next(command for command in code if command[0] == Operation.FOR_RANGE_STEP))
+
+        self.assertEqual(profile.counts[steps], 3)
+        self.assertEqual(profile.counts[-1], 1)
+        self.assertEqual(profile.by_opcode()[Operation.FOR_RANGE_STEP][0], 3)
+        self.assertTrue(all(time >= 0 for time in profile.times))
+
+    def test_exports(self):
+        code, profile = self.profiled()
+
+        exported = json.loads(profile.to_json())
+        self.assertEqual(len(exported['instructions']), len(code))
+        self.assertEqual(exported['opcodes']['FOR_RANGE_STEP']['count'], 3)
+
+        for line in profile.collapsed().splitlines():
+            stack, time = line.rsplit(' ', 1)
+            self.assertEqual(stack.split(';')[0], 'program')
+            self.assertGreater(int(time), 0)
+
+    def test_annotated_listing(self):
+        code, profile = self.profiled()
+        lines = disassemble(code, profile).splitlines()
+
+        self.assertEqual(len(lines), len(code))
+        self.assertTrue(lines[-1].split()[0] == '1' and lines[-1].endswith('RETURN_VALUE'))
+
+
+class TestLines(unittest.TestCase):
+    source = '''s = 0;
+for (i in 0:3) {
+    s += i;
+}
+return s;
+'''
+
+    def test_table(self):
+        table = line_table([1, 1, 2, None, None, 2])
+
+        self.assertEqual(table, [(0, 2, 1), (2, 3, 2), (3, 5, None), (5, 6, 2)])
+        self.assertEqual([line_at(table, i) for i in range(7)], [1, 1, 2, None, None, 2, None])
+
+    def test_statements_are_located(self):
+        lines = []
+        code = compile(parse(self.source), lines=lines)
+
+        self.assertEqual(len(lines), len(code))
+        self.assertEqual(set(lines), { 1, 2, 3, 5 })
+
+        step = next(k for k, command in enumerate(code) if command[0] == Operation.FOR_RANGE_STEP)
+        self.assertEqual(lines[step], 2)  # the back-edge belongs to the loop
+        self.assertEqual(lines[-1], 5)
+
+    def test_lines_survive_optimization_and_assembly(self):
+        lines = []
+        code, _ = optimize(compile(parse(self.source), lines=lines), 2, lines=lines)
+        code_object = assemble(code, lines)
+
+        self.assertEqual(len(lines), len(code))
+        self.assertEqual([code_object.line(i) for i in range(len(code))], lines)
+
+        with self.assertRaises(ValueError):
+            assemble(code, lines[1:])
+
+
+@unittest.skipUnless(hasattr(signal, 'setitimer'), 'needs POSIX interval timers')
+class TestSampling(unittest.TestCase):
+    source = '''s = 0;
+for (i in 0:100000) {
+    v = [i, i, i];
+    s += v[2];
+}
+return s;
+'''
+
+    def test_hot_lines(self):
+        lines = []
+        code = assemble(compile(parse(self.source), lines=lines), lines)
+
+        vm = VirtualMachine()
+        vm.load(code, engine='dispatch')
+
+        with Sampler(0.0005) as sampler:
+            self.assertEqual(vm.run(), sum(range(100000)))
+
+        hot = dict(sampler.hot_lines())
+
+        self.assertGreater(sum(hot.values()), 0)
+        self.assertTrue(set(hot) <= { 1, 2, 3, 4, 6 })
+        self.assertIn('s += v[2];', sampler.report(self.source))